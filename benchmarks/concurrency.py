@@ -0,0 +1,76 @@
+"""
+Пропускная способность одного event loop при конкурентных запросах к базе:
+синхронная сессия внутри `async def` (как было с fastapi_sqlalchemy) против асинхронной сессии.
+
+Каждый "запрос" выполняет `users_info_query` и дополнительно ждет `--latency` секунд в Postgres,
+имитируя медленный запрос. Синхронная сессия блокирует весь loop, асинхронная - нет.
+
+Запуск:
+    DB_DSN=postgresql://postgres@localhost:5432/postgres python -m benchmarks.concurrency --concurrency 20
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from settings import get_settings
+from userdata_api.models.session import db, dispose_engine, init_engine
+from userdata_api.utils.catalog import catalog_cache
+from userdata_api.utils.user import users_info_query
+
+
+def slow_query(latency: float):
+    return select(func.pg_sleep(latency))
+
+
+async def blocking(requests: int, concurrency: int, latency: float) -> float:
+    engine = create_engine(str(get_settings().DB_DSN), pool_size=concurrency, isolation_level="AUTOCOMMIT")
+    Session = sessionmaker(bind=engine)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def handler(user_id: int):
+        async with semaphore:
+            with Session() as session:
+                session.execute(slow_query(latency))
+                session.execute(users_info_query(catalog_cache.get(session), [user_id], None, [])).all()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return elapsed
+
+
+async def non_blocking(requests: int, concurrency: int, latency: float) -> float:
+    init_engine(pool_size=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def handler(user_id: int):
+        async with semaphore, db():
+            await db.session.execute(slow_query(latency))
+            catalog = await catalog_cache.aget(db.session)
+            (await db.session.execute(users_info_query(catalog, [user_id], None, []))).all()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    await dispose_engine()
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02, help="Искусственная задержка запроса, секунды")
+    args = parser.parse_args()
+    for name, fn in (("sync session", blocking), ("async session", non_blocking)):
+        elapsed = await fn(args.requests, args.concurrency, args.latency)
+        print(f"{name:14} {args.requests / elapsed:8.1f} req/s  total={elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+"""
+Сравнение чтения пользовательских данных: старый цикл по всем `Info` в Python
+против выбора "выигравших" значений внутри Postgres (`users_info_query`).
+
+Запуск:
+    DB_DSN=postgresql://postgres@localhost:5432/postgres python -m benchmarks.get_users_info --users 300
+"""
+
+import argparse
+import random
+import time
+from statistics import median
+
+from sqlalchemy import create_engine, delete, not_
+from sqlalchemy.orm import Session, joinedload, sessionmaker
+
+from settings import get_settings
+from userdata_api.models.db import Category, Info, Param, Source, ViewType
+from userdata_api.utils.catalog import catalog_cache
+from userdata_api.utils.user import users_info_query
+from userdata_api.utils.utils import random_string
+
+
+def legacy_loop(session: Session, user_ids: list[int], category_ids: list[int]) -> tuple[int, int]:
+    """Старый алгоритм `get_users_info`: загрузить все строки и выбрать значение в Python"""
+    infos: list[Info] = (
+        Info.query(session=session)
+        .options(joinedload(Info.param), joinedload(Info.source))
+        .join(Param)
+        .join(Category)
+        .filter(
+            Info.owner_id.in_(user_ids),
+            Param.category_id.in_(category_ids),
+            not_(Param.is_deleted),
+            not_(Category.is_deleted),
+            Param.visible_in_user_response,
+        )
+        .all()
+    )
+    param_dict: dict[Param, dict[int, list[Info] | Info | None]] = {}
+    for info in infos:
+        owners = param_dict.setdefault(info.param, {})
+        if info.param.type == ViewType.ALL:
+            owners.setdefault(info.owner_id, []).append(info)
+            continue
+        current = owners.get(info.owner_id)
+        if (
+            current is None
+            or (info.param.type == ViewType.LAST and info.create_ts > current.create_ts)
+            or (
+                info.param.type == ViewType.MOST_TRUSTED
+                and (
+                    current.source.trust_level < info.source.trust_level
+                    or (current.source.trust_level <= info.source.trust_level and info.create_ts > current.create_ts)
+                )
+            )
+        ):
+            owners[info.owner_id] = info
+    result = sum(len(v) if isinstance(v, list) else 1 for owners in param_dict.values() for v in owners.values())
+    return len(infos), result
+
+
+def sql_ranked(session: Session, user_ids: list[int], category_ids: list[int]) -> tuple[int, int]:
+    rows = session.execute(users_info_query(catalog_cache.get(session), user_ids, category_ids, [])).all()
+    return len(rows), sum(len(row.values) for row in rows)
+
+
+def seed(
+    session: Session, users: int, params: int, sources: int, values: int
+) -> tuple[dict[type, list[int]], list[int]]:
+    created = [Source(name=f"bench{random_string()}", trust_level=i + 1) for i in range(sources)]
+    category = Category(name=f"bench{random_string()}")
+    session.add_all([*created, category])
+    session.flush()
+    types = [ViewType.ALL, ViewType.LAST, ViewType.MOST_TRUSTED]
+    created_params = [
+        Param(name=f"bench{random_string()}", category_id=category.id, type=types[i % 3], is_required=False)
+        for i in range(params)
+    ]
+    session.add_all(created_params)
+    session.flush()
+    # Действующей может быть только одна запись на (пользователь, параметр, источник), остальные - удаленная история
+    infos = [
+        {
+            "owner_id": owner_id,
+            "param_id": param.id,
+            "source_id": source.id,
+            "value": random_string(),
+            "is_deleted": i < values - 1,
+        }
+        for owner_id in range(users)
+        for param in created_params
+        for source in created
+        for i in range(values)
+    ]
+    session.execute(Info.__table__.insert(), infos)
+    session.commit()
+    ids = {Category: [category.id], Param: [p.id for p in created_params], Source: [s.id for s in created]}
+    return ids, [category.id]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--params", type=int, default=9)
+    parser.add_argument("--sources", type=int, default=4)
+    parser.add_argument(
+        "--values", type=int, default=2, help="Записей на (пользователь, параметр, источник), включая удаленные"
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    engine = create_engine(str(get_settings().DB_DSN))
+    session = sessionmaker(bind=engine)()
+    created, category_ids = seed(session, args.users, args.params, args.sources, args.values)
+    user_ids = list(range(args.users))
+    try:
+        for name, fn in (("python loop", legacy_loop), ("sql ranked", sql_ranked)):
+            timings = []
+            for _ in range(args.repeat):
+                random.shuffle(user_ids)
+                session.expunge_all()
+                start = time.perf_counter()
+                transferred, values = fn(session, user_ids, category_ids)
+                timings.append(time.perf_counter() - start)
+            print(f"{name:12} rows transferred={transferred:7} values={values:7} median={median(timings) * 1000:.1f}ms")
+    finally:
+        session.rollback()
+        session.execute(delete(Info).where(Info.param_id.in_(created[Param])))
+        for model in (Param, Source, Category):
+            session.execute(delete(model).where(model.id.in_(created[model])))
+        session.commit()
+
+
+if __name__ == "__main__":
+    main()
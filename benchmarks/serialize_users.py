@@ -0,0 +1,59 @@
+"""
+Время сериализации ответа `GET /user` на каждые 10 тысяч строк без базы.
+
+Сравнивает прежний путь (модель из словарей, повторный `model_validate` в ручке, проверка и `jsonable_encoder`
+через `response_model` в FastAPI, `json.dumps` в `JSONResponse`) с `FastJSONResponse`, который пишет проверенные
+словари сразу в байты через orjson, а также NDJSON поток.
+
+Запуск:
+    python -m benchmarks.serialize_users --rows 100000
+"""
+
+import argparse
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from userdata_api.schemas.user import UsersInfoGet
+from userdata_api.utils.response import FastJSONResponse, ndjson_lines
+
+
+def _rows(count: int) -> list[dict]:
+    return [
+        {"user_id": i // 10, "category": f"category{i % 3}", "param": f"param{i % 10}", "value": f"значение {i}"}
+        for i in range(count)
+    ]
+
+
+def _old(rows: list[dict]) -> bytes:
+    result = UsersInfoGet.model_validate(UsersInfoGet(items=rows))
+    validated = UsersInfoGet.model_validate(result.model_dump(exclude_unset=True))
+    return JSONResponse(jsonable_encoder(validated, exclude_unset=True)).body
+
+
+def _new(rows: list[dict]) -> bytes:
+    return FastJSONResponse({"items": rows}).body
+
+
+def _ndjson(rows: list[dict]) -> bytes:
+    return ndjson_lines(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    rows = _rows(args.rows)
+    for name, run in (("pydantic + response_model", _old), ("FastJSONResponse", _new), ("NDJSON", _ndjson)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            run(rows)
+            best = min(best, time.perf_counter() - start)
+        print(f"{name:26} {best / args.rows * 10000 * 1000:8.2f} ms per 10k rows")
+
+
+if __name__ == "__main__":
+    main()
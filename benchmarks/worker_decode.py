@@ -0,0 +1,93 @@
+"""
+Пропускная способность разбора сообщений воркера без базы и брокера.
+
+Сравнивает прежний путь `json.loads` -> `model_validate` с `EventDecoder`, который проверяет схему прямо из байт.
+Сообщения берутся из записанного NDJSON файла в формате `FileSource` / dead letter (`--file`) или генерируются.
+
+Запуск:
+    python -m benchmarks.worker_decode --messages 100000
+    python -m benchmarks.worker_decode --file recorded.ndjson --codec json
+"""
+
+import argparse
+import json
+import random
+import time
+
+from event_schema.auth import UserLogin, UserLoginKey
+
+from worker.codec import EventDecoder, make_codec
+
+
+def _generate(count: int) -> list[tuple[bytes, bytes]]:
+    messages = []
+    for i in range(count):
+        items = [
+            {"category": f"category{random.randrange(5)}", "param": f"param{j}", "value": f"value{i}"}
+            for j in range(random.randint(1, 10))
+        ]
+        key = json.dumps({"user_id": random.randrange(100000)}).encode()
+        messages.append((key, json.dumps({"items": items, "source": "dwh"}).encode()))
+    return messages
+
+
+def _read(path: str) -> list[tuple[bytes, bytes]]:
+    messages = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                message = json.loads(line)
+                messages.append((json.dumps(message["key"]).encode(), json.dumps(message["value"]).encode()))
+    return messages
+
+
+def _encode(messages: list[tuple[bytes, bytes]], codec: str) -> list[tuple[bytes, bytes]]:
+    if codec == "json":
+        return messages
+    import msgpack
+
+    return [(msgpack.packb(json.loads(key)), msgpack.packb(json.loads(value))) for key, value in messages]
+
+
+def _old(messages: list[tuple[bytes, bytes]]) -> None:
+    for key, value in messages:
+        UserLoginKey.model_validate(json.loads(key)), UserLogin.model_validate(json.loads(value))
+
+
+def _new(decoder: EventDecoder):
+    def run(messages: list[tuple[bytes, bytes]]) -> None:
+        for key, value in messages:
+            decoder.decode(key, value)
+
+    return run
+
+
+def _measure(name: str, run, messages: list[tuple[bytes, bytes]], repeat: int) -> None:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(messages)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:24} {len(messages) / best:10.0f} msg/s  best of {repeat}: {best:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--file", help="NDJSON с записанными сообщениями {\"key\": ..., \"value\": ...}")
+    parser.add_argument("--codec", default="json", choices=["json", "msgpack"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    messages = _read(args.file) if args.file else _generate(args.messages)
+    if args.codec == "json":
+        _measure("json.loads + validate", _old, messages, args.repeat)
+    _measure(
+        f"EventDecoder[{args.codec}]",
+        _new(EventDecoder(make_codec(args.codec))),
+        _encode(messages, args.codec),
+        args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Пропускная способность пути обработки сообщений воркера без брокера:
+`decode_events` -> `coalesce_events` -> `patch_user_info` на повторе NDJSON файла через `FileSource`.
+
+Сообщения генерируются для `--users` пользователей, каждое меняет случайные параметры тестовой категории,
+поэтому часть изменений схлопывается внутри пачки. Число потоков задается переменной окружения `WORKER_THREADS`.
+
+Запуск:
+    DB_DSN=postgresql://postgres@localhost:5432/postgres python -m benchmarks.worker_replay --events 20000
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import sessionmaker
+
+from settings import get_settings
+from userdata_api.models.db import Category, Info, Param, Source
+from userdata_api.utils.utils import random_string
+from worker.consumer import process
+from worker.source import FileSource
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--params", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=get_settings().KAFKA_BATCH_SIZE)
+    args = parser.parse_args()
+    settings = get_settings()
+    settings.KAFKA_BATCH_SIZE = args.batch_size
+    settings.WORKER_METRICS_PORT = None
+
+    Session = sessionmaker(bind=create_engine(str(settings.DB_DSN)))
+    with Session() as session:
+        category = Category(name=f"bench{random_string()}")
+        source = Source(name=f"bench{random_string()}", trust_level=5)
+        session.add_all([category, source])
+        session.flush()
+        params = [
+            Param(name=f"bench{i}", category_id=category.id, type="last", changeable=True, is_required=False)
+            for i in range(args.params)
+        ]
+        session.add_all(params)
+        session.commit()
+        try:
+            with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as file:
+                for i in range(args.events):
+                    user_id = random.randrange(args.users)
+                    items = [
+                        {"category": category.name, "param": param.name, "value": f"value{i}"}
+                        for param in random.sample(params, k=random.randint(1, args.params))
+                    ]
+                    message = {"key": {"user_id": user_id}, "value": {"items": items, "source": source.name}}
+                    file.write(json.dumps(message) + "\n")
+                file.flush()
+                start = time.perf_counter()
+                process(FileSource(file.name))
+                elapsed = time.perf_counter() - start
+            print(
+                f"events={args.events} users={args.users} batch={args.batch_size} threads={settings.WORKER_THREADS}"
+                f"  {args.events / elapsed:8.1f} events/s  total={elapsed:.2f}s"
+            )
+        finally:
+            session.execute(delete(Info).where(Info.source_id == source.id))
+            session.execute(delete(Param).where(Param.category_id == category.id))
+            session.execute(delete(Category).where(Category.id == category.id))
+            session.execute(delete(Source).where(Source.id == source.id))
+            session.commit()
+
+
+if __name__ == "__main__":
+    main()
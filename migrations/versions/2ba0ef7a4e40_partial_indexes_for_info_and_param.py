@@ -0,0 +1,52 @@
+"""Partial indexes for Info and Param lookups
+
+Revision ID: 2ba0ef7a4e40
+Revises: fc911d58459b
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '2ba0ef7a4e40'
+down_revision = 'fc911d58459b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_info_owner_id_param_id_source_id',
+            'info',
+            ['owner_id', 'param_id', 'source_id'],
+            postgresql_where=sa.text('NOT is_deleted'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_param_category_id_name',
+            'param',
+            ['category_id', 'name'],
+            postgresql_where=sa.text('NOT is_deleted'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_category_name',
+            'category',
+            ['name'],
+            postgresql_where=sa.text('NOT is_deleted'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_category_name', 'category', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_param_category_id_name', 'param', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_info_owner_id_param_id_source_id', 'info', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,101 @@
+"""Unique live Info per owner, param and source
+
+Revision ID: 7c3e1d9a5b21
+Revises: 2ba0ef7a4e40
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '7c3e1d9a5b21'
+down_revision = '2ba0ef7a4e40'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+# Старые АПИ и воркер работают во время миграции и могут успеть создать новые дубли до построения индекса
+ATTEMPTS = 3
+INDEX = 'uq_info_owner_id_param_id_source_id'
+
+# Из дублей оставляем ту запись, которую сейчас показывает GET /user (самую новую), остальные мягко удаляем.
+# Ранжирование выполняется один раз, дальше удаляем пачками по айди из временной таблицы
+RANK_DUPLICATES = sa.text("""
+    INSERT INTO info_duplicates
+    SELECT id FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY owner_id, param_id, source_id ORDER BY create_ts DESC, id DESC
+        ) AS rank
+        FROM info
+        WHERE NOT is_deleted
+    ) ranked
+    WHERE rank > 1
+    """)
+NEXT_BATCH = sa.text("SELECT id FROM info_duplicates WHERE id > :after ORDER BY id LIMIT :batch_size")
+DELETE_BATCH = sa.text(
+    "UPDATE info SET is_deleted = true, modify_ts = timezone('utc', now()) WHERE id = ANY(:ids) AND NOT is_deleted"
+)
+INDEX_IS_VALID = sa.text(
+    "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+)
+
+
+def deduplicate(conn) -> None:
+    conn.execute(sa.text("CREATE TEMPORARY TABLE IF NOT EXISTS info_duplicates (id integer PRIMARY KEY)"))
+    conn.execute(sa.text("TRUNCATE info_duplicates"))
+    conn.execute(RANK_DUPLICATES)
+    after = 0
+    while ids := conn.execute(NEXT_BATCH, {"after": after, "batch_size": BATCH_SIZE}).scalars().all():
+        conn.execute(DELETE_BATCH, {"ids": ids})
+        after = ids[-1]
+    conn.execute(sa.text("DROP TABLE info_duplicates"))
+
+
+def index_is_valid(conn) -> bool | None:
+    """True - индекс построен, False - остался невалидным после неудачного CREATE INDEX CONCURRENTLY, None - его нет"""
+    return conn.execute(INDEX_IS_VALID, {"name": INDEX}).scalar()
+
+
+def upgrade():
+    # Каждая пачка фиксируется отдельно, чтобы не держать блокировки на всей таблице,
+    # CREATE INDEX CONCURRENTLY не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        for attempt in range(1, ATTEMPTS + 1):
+            valid = index_is_valid(conn)
+            if valid:
+                break
+            if valid is False:
+                # Невалидный индекс не проверяет уникальность и не подходит для ON CONFLICT, строим заново
+                op.drop_index(INDEX, 'info', postgresql_concurrently=True)
+            deduplicate(conn)
+            try:
+                op.create_index(
+                    INDEX,
+                    'info',
+                    ['owner_id', 'param_id', 'source_id'],
+                    unique=True,
+                    postgresql_where=sa.text('NOT is_deleted'),
+                    postgresql_concurrently=True,
+                )
+            except sa.exc.IntegrityError:
+                if attempt == ATTEMPTS:
+                    raise
+        if not index_is_valid(conn):
+            raise RuntimeError(f"Index {INDEX} is not valid, the old index is kept")
+        op.drop_index('ix_info_owner_id_param_id_source_id', 'info', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_info_owner_id_param_id_source_id',
+            'info',
+            ['owner_id', 'param_id', 'source_id'],
+            postgresql_where=sa.text('NOT is_deleted'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(INDEX, 'info', postgresql_concurrently=True, if_exists=True)
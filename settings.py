@@ -9,12 +9,67 @@ class Settings(BaseSettings):
     """Application settings"""
 
     DB_DSN: PostgresDsn = 'postgresql://postgres@localhost:5432/postgres'
+    # Бросать исключение при неявной ленивой загрузке связей, по умолчанию включено вне продакшена
+    DB_RAISE_ON_LAZY_LOAD: bool = os.getenv("APP_VERSION", "dev") == "dev"
+    # Как часто процесс сверяет кэш категорий/параметров/источников с базой, секунды
+    CATALOG_CACHE_TTL: float = 5.0
+    # Сколько секунд клиенты и прокси могут не перепроверять ответ GET /category
+    CATALOG_HTTP_MAX_AGE: int = 0
+    # Кэш сессий авторизации по токену: размер, время жизни сессии и невалидного токена в секундах, 0 - не кэшировать
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: float = 30.0
+    AUTH_CACHE_NEGATIVE_TTL: float = 5.0
+    # Сколько секунд ждать ответа сервиса авторизации, не дождавшись - отклонить запрос без кэширования
+    AUTH_TIMEOUT: float = 5.0
+    # Ограничение времени проверки значения регулярным выражением из Param.validation, секунды
+    VALIDATION_REGEX_TIMEOUT: float = 0.05
+    # Сколько строк за раз читает из базы потоковая выгрузка GET /user (Accept: application/x-ndjson)
+    USERS_STREAM_WINDOW: int = 1000
+    # Прогрев процесса перед приемом трафика (/ready): сколько соединений пула открыть заранее
+    # (не больше размера пула) и через сколько секунд повторить неудавшийся прогрев
+    WARMUP_DB_CONNECTIONS: int = 5
+    WARMUP_RETRY_DELAY: float = 1.0
+
+    # Запуск АПИ через `python -m userdata_api start --instance api`, значения для образа заданы в Dockerfile
+    API_HOST: str = '127.0.0.1'
+    API_PORT: int = 8000
+    # Число процессов, больше одного - процессы под управлением gunicorn
+    API_WORKERS: int = 1
+    # Импортировать приложение в главном процессе до fork, пулы соединений с БД все равно создаются в каждом процессе
+    API_PRELOAD: bool = True
+    # Очередь ожидающих соединений, сколько секунд держать простаивающее keep-alive соединение
+    # и сколько одновременных соединений принимает процесс, прежде чем отвечать 503 (None - без ограничения)
+    API_BACKLOG: int = 2048
+    API_KEEPALIVE: int = 5
+    API_LIMIT_CONCURRENCY: int | None = None
+    # Реализации event loop и HTTP парсера uvicorn: auto выбирает uvloop и httptools, если они установлены
+    API_LOOP: str = 'auto'
+    API_HTTP: str = 'auto'
+    # Файл конфигурации логирования, например logging_prod.conf
+    API_LOG_CONFIG: str | None = None
 
     KAFKA_DSN: str | None = None
     KAFKA_LOGIN: str | None = None
     KAFKA_PASSWORD: str | None = None
     KAFKA_TOPICS: list[str] | None = None
     KAFKA_GROUP_ID: str | None = None
+    # Воркер применяет сообщения пачками до KAFKA_BATCH_SIZE штук одной транзакцией,
+    # пачка собирается не дольше KAFKA_BATCH_LINGER секунд после первого сообщения
+    KAFKA_BATCH_SIZE: int = 500
+    KAFKA_BATCH_LINGER: float = 0.2
+    # Сколько потоков воркера применяют пачку параллельно, события одного пользователя всегда в одном потоке
+    WORKER_THREADS: int = 1
+    # Порт HTTP ручки /metrics воркера в формате Prometheus, None - не поднимать
+    WORKER_METRICS_PORT: int | None = 8001
+    # Куда воркер складывает сообщения, которые не смог обработать: file:<путь> или topic:<топик>, None - только в лог
+    WORKER_DEAD_LETTER: str | None = None
+    # Повторы применения пачки: задержка удваивается от BASE до MAX секунд,
+    # ошибки, не связанные с доступностью базы, повторяются не больше WORKER_RETRY_ATTEMPTS раз
+    WORKER_RETRY_ATTEMPTS: int = 3
+    WORKER_RETRY_BASE_DELAY: float = 0.5
+    WORKER_RETRY_MAX_DELAY: float = 30.0
+    # Формат сообщений в топике: json или msgpack (нужен пакет msgpack)
+    WORKER_CODEC: str = "json"
 
     ROOT_PATH: str = '/' + os.getenv("APP_NAME", "")
 
@@ -1,3 +1,5 @@
+import time
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -6,12 +8,24 @@ from sqlalchemy.orm import sessionmaker
 from settings import get_settings
 from userdata_api.models.db import *
 from userdata_api.routes.base import app
+from userdata_api.utils.catalog import catalog_cache
 from userdata_api.utils.utils import random_string
 
 
+@pytest.fixture(autouse=True)
+def catalog_no_ttl(monkeypatch):
+    """Тесты меняют справочники напрямую через dbsession, поэтому кэш сверяется с базой при каждом обращении"""
+    monkeypatch.setattr(catalog_cache, "ttl", 0)
+
+
 @pytest.fixture
 def client(auth_mock):
-    yield TestClient(app)
+    """Клиент прогретого приложения: прогрев на старте не выполняет запросов параллельно с тестом"""
+    with TestClient(app) as client:
+        deadline = time.monotonic() + 10
+        while client.get("/ready").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        yield client
 
 
 @pytest.fixture(scope='session')
@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import selectinload
+
+from userdata_api.models.base import RaiseOnLazyLoadSession
+from userdata_api.models.db import Category
+
+
+@pytest.fixture
+def strict_session(dbsession):
+    session = RaiseOnLazyLoadSession(bind=dbsession.get_bind())
+    yield session
+    session.close()
+
+
+def test_unplanned_lazy_load_raises(strict_session, param):
+    _param = param()
+    category = Category.get(_param.category_id, session=strict_session)
+    with pytest.raises(InvalidRequestError):
+        category.params
+
+
+def test_planned_load(strict_session, param):
+    _param = param()
+    category = Category.get(_param.category_id, options=[selectinload(Category.params)], session=strict_session)
+    assert [p.id for p in category.params] == [_param.id]
+
+
+@pytest.mark.authenticated()
+def test_category_with_params(client, param):
+    _param = param()
+    response = client.get("/category", params={"query": "param"})
+    assert response.status_code == 200
+    category = next(c for c in response.json() if c["id"] == _param.category_id)
+    assert [p["id"] for p in category["params"]] == [_param.id]
+    response = client.get(f"/category/{_param.category_id}")
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()["params"]] == [_param.id]
@@ -0,0 +1,117 @@
+import json
+import re
+from contextlib import contextmanager
+
+import pytest
+from event_schema.auth import UserLogin
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from userdata_api.models.db import Info
+from userdata_api.utils.catalog import catalog_cache
+from worker.user import patch_user_info
+
+
+@contextmanager
+def captured_statements():
+    """Собирает все SELECT/UPDATE/DELETE, которые код отправляет в базу"""
+    statements = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(" ", 1)[0].upper() in ("SELECT", "UPDATE", "DELETE") and not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(Engine, "before_cursor_execute", _capture)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", _capture)
+
+
+def explain(connection, statement: str, parameters) -> dict:
+    """EXPLAIN для запроса в формате psycopg2 или asyncpg (с плейсхолдерами $1, $2, ...)"""
+    if isinstance(parameters, dict) or not parameters:
+        plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters or None).scalar()
+    else:
+        connection.exec_driver_sql(f"PREPARE plan_check AS {statement}")
+        try:
+            placeholders = ", ".join(["%s"] * len(parameters))
+            plan = connection.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) EXECUTE plan_check({placeholders})", tuple(parameters)
+            ).scalar()
+        finally:
+            connection.exec_driver_sql("DEALLOCATE plan_check")
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+# Через какой индекс и по какому столбцу горячие запросы должны читать каждую таблицу.
+# При выключенном seqscan без нужного индекса планировщик читает таблицу целиком по первичному ключу,
+# поэтому проверяется не отсутствие Seq Scan, а конкретный индекс и условие по нему
+EXPECTED_INDEXES = {
+    "info": ("uq_info_owner_id_param_id_source_id", "owner_id"),
+    "source": ("source_pkey", "id"),
+}
+
+
+def table_reads(plan: dict, relation: str | None = None) -> list[tuple[str, str | None, str | None]]:
+    """(таблица, индекс, условие по индексу) для каждого чтения таблицы в плане"""
+    found = []
+    if plan["Node Type"] == "Bitmap Heap Scan":
+        relation = plan["Relation Name"]
+    elif plan["Node Type"] == "Bitmap Index Scan":
+        found.append((relation, plan["Index Name"], plan.get("Index Cond")))
+    elif "Scan" in plan["Node Type"] and "Relation Name" in plan:
+        found.append((plan["Relation Name"], plan.get("Index Name"), plan.get("Index Cond")))
+    for child in plan.get("Plans", []):
+        found.extend(table_reads(child, relation))
+    return found
+
+
+def unexpected_reads(plan: dict) -> list[tuple[str, str | None, str | None]]:
+    unexpected = []
+    for relation, index, condition in table_reads(plan):
+        expected_index, column = EXPECTED_INDEXES.get(relation, (None, None))
+        if index is None or index != expected_index or not re.search(rf"\b{column} = ", condition or ""):
+            unexpected.append((relation, index, condition))
+    return unexpected
+
+
+@pytest.mark.authenticated("userdata.info.admin", user_id=0)
+def test_hot_queries_use_indexes(client, dbsession, info_no_scopes, admin_source, monkeypatch):
+    info = info_no_scopes()
+    param, source = info.param, info.source
+    item = {"category": param.category.name, "param": param.name}
+    # Справочники читаются целиком и кэшируются, в горячем пути их запросов нет
+    catalog_cache.invalidate()
+    catalog_cache.get(dbsession)
+    monkeypatch.setattr(catalog_cache, "ttl", 3600)
+    with captured_statements() as statements:
+        assert client.get(f"/user/{info.owner_id}").status_code == 200
+        response = client.get("/user", params={"users": [info.owner_id], "categories": [param.category_id]})
+        assert response.status_code == 200
+        for value in ("created", "updated", None):
+            response = client.post(
+                f"/user/{info.owner_id}", json={"source": admin_source.name, "items": [item | {"value": value}]}
+            )
+            assert response.status_code == 200
+        for value in ("updated", None):
+            patch_user_info(
+                UserLogin.model_validate({"items": [item | {"value": value}], "source": source.name}),
+                info.owner_id,
+                session=dbsession,
+            )
+    dbsession.rollback()
+    assert statements
+    connection = dbsession.connection()
+    connection.execute(text("SET enable_seqscan = off"))
+    try:
+        for statement, parameters in statements:
+            plan = explain(connection, statement, parameters)
+            assert table_reads(plan), statement
+            assert not unexpected_reads(plan), statement
+    finally:
+        dbsession.rollback()
+        dbsession.query(Info).filter(Info.param_id == param.id, Info.id != info.id).delete()
+        dbsession.commit()
@@ -68,6 +68,29 @@ def test_get_all(client, dbsession, category):
     } in response.json()
 
 
+def test_get_all_not_modified(client, dbsession, param):
+    param1 = param()
+    response = client.get("/category", params={"query": "param"})
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"].startswith("public")
+    etag = response.headers["ETag"]
+    (category,) = [category for category in response.json() if category["id"] == param1.category_id]
+    assert [_param["name"] for _param in category["params"]] == [param1.name]
+    assert "validation" not in category["params"][0]
+    assert client.get("/category", headers={"If-None-Match": etag}).status_code == 200
+    response = client.get("/category", params={"query": "param"}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert not response.content
+
+    param1.name = f"test{random_string()}"
+    dbsession.commit()
+    response = client.get("/category", params={"query": "param"}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    (category,) = [category for category in response.json() if category["id"] == param1.category_id]
+    assert [_param["name"] for _param in category["params"]] == [param1.name]
+
+
 @pytest.mark.authenticated("userdata.category.update")
 def test_update(client, dbsession, category):
     _category = category()
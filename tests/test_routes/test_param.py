@@ -89,6 +89,24 @@ def test_create_with_uncompilable_validation(client, category):
     assert response.status_code == 422
 
 
+@pytest.mark.authenticated("userdata.param.create")
+@pytest.mark.parametrize("validation", ["^(a+)+$", "^(\\w+\\s?)*$", "(a*b?)+c"])
+def test_create_with_backtracking_validation(client, category, validation):
+    _category = category()
+    response = client.post(
+        f"/category/{_category.id}/param",
+        json={
+            "name": f"test{random_string()}",
+            "category_id": _category.id,
+            "type": "last",
+            "changeable": "true",
+            "is_required": "true",
+            "validation": validation,
+        },
+    )
+    assert response.status_code == 422
+
+
 @pytest.mark.authenticated()
 def test_get(client, dbsession, param):
     _param = param()
@@ -0,0 +1,119 @@
+import json
+from itertools import product
+
+import pytest
+
+from userdata_api.models.db import Info, Param
+from userdata_api.utils.utils import random_string
+
+OWNER, OTHER, HIDDEN, MISSING = 100, 101, 102, 103
+SCOPE_A, SCOPE_B = "test.matrix.a", "test.matrix.b"
+
+
+@pytest.fixture
+def matrix(dbsession, category, category_no_scopes, source):
+    """
+    Категории без скоупа, со скоупом A и со скоупом B, в каждой публичный и непубличный параметр.
+    У OWNER и OTHER есть значения всех параметров, у HIDDEN - только непубличного параметра категории A
+    """
+    source = source()
+    categories = [category_no_scopes(), category(), category()]
+    categories[1].read_scope, categories[2].read_scope = SCOPE_A, SCOPE_B
+    params = [
+        Param(
+            name=f"test{random_string()}",
+            category_id=_category.id,
+            type="all",
+            changeable=True,
+            is_required=False,
+            is_public=is_public,
+        )
+        for _category, is_public in product(categories, (False, True))
+    ]
+    dbsession.add_all(params)
+    dbsession.flush()
+    infos = [
+        Info(value=f"test{random_string()}", source_id=source.id, param_id=_param.id, owner_id=owner_id)
+        for owner_id, _param in product((OWNER, OTHER), params)
+    ]
+    infos.append(Info(value=f"test{random_string()}", source_id=source.id, param_id=params[2].id, owner_id=HIDDEN))
+    dbsession.add_all(infos)
+    dbsession.commit()
+    yield categories, params, infos
+    for row in infos + params:
+        dbsession.delete(row)
+    dbsession.commit()
+
+
+def python_filter(infos, params, categories, scopes, caller_id, *, is_single_user):
+    """Проверка прав на чтение в том виде, в котором она была сделана на Python после выборки"""
+    params = {_param.id: _param for _param in params}
+    categories = {_category.id: _category for _category in categories}
+    for info in infos:
+        _param = params[info.param_id]
+        _category = categories[_param.category_id]
+        if (
+            _category.read_scope
+            and _category.read_scope not in scopes
+            and (not is_single_user or info.owner_id != caller_id)
+            and not _param.is_public
+        ):
+            continue
+        yield {"user_id": info.owner_id, "category": _category.name, "param": _param.name, "value": info.value}
+
+
+def _key(item):
+    return item["user_id"], item["category"], item["param"], item["value"]
+
+
+SCOPES = [(), (SCOPE_A,), (SCOPE_B,), (SCOPE_A, SCOPE_B)]
+CASES = [
+    pytest.param(scopes, caller_id, marks=pytest.mark.authenticated("userdata.info.admin", *scopes, user_id=caller_id))
+    for scopes, caller_id in product(SCOPES, (OWNER, 999))
+]
+
+
+@pytest.mark.parametrize("scopes, caller_id", CASES)
+def test_single_user_matches_python_filter(client, matrix, scopes, caller_id):
+    categories, params, infos = matrix
+    names = {_category.name for _category in categories}
+    for owner_id in (OWNER, OTHER, HIDDEN):
+        response = client.get(f"/user/{owner_id}")
+        assert response.status_code == 200
+        owner_infos = [info for info in infos if info.owner_id == owner_id]
+        expected = python_filter(owner_infos, params, categories, scopes, caller_id, is_single_user=True)
+        expected = sorted(({**item, "user_id": owner_id} for item in expected), key=_key)
+        items = [{**item, "user_id": owner_id} for item in response.json()["items"] if item["category"] in names]
+        assert sorted(items, key=_key) == expected
+    assert client.get(f"/user/{MISSING}").status_code == 404
+
+
+@pytest.mark.parametrize("scopes, caller_id", CASES)
+def test_batch_matches_python_filter(client, matrix, scopes, caller_id):
+    categories, params, infos = matrix
+    expected = sorted(python_filter(infos, params, categories, scopes, caller_id, is_single_user=False), key=_key)
+    users, category_ids = [OWNER, OTHER, HIDDEN], [_category.id for _category in categories]
+
+    response = client.get("/user", params={"users": users, "categories": category_ids})
+    assert response.status_code == 200
+    assert sorted(response.json()["items"], key=_key) == expected
+
+    response = client.get(
+        "/user", params={"users": users, "categories": category_ids}, headers={"Accept": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    assert sorted((json.loads(line) for line in response.text.splitlines()), key=_key) == expected
+
+    response = client.post("/user/query", json={"users": users, "categories": category_ids})
+    assert response.status_code == 200
+    assert sorted(response.json()["items"], key=_key) == expected
+
+    hidden_only = {"users": [HIDDEN], "categories": [categories[1].id]}
+    hidden_expected = [item for item in expected if item["user_id"] == HIDDEN]
+    response = client.get("/user", params=hidden_only)
+    assert response.status_code == 200
+    assert response.json()["items"] == hidden_expected
+    response = client.get("/user", params=hidden_only, headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert [json.loads(line) for line in response.text.splitlines()] == hidden_expected
+    assert client.get("/user", params={"users": [MISSING], "categories": category_ids}).status_code == 404
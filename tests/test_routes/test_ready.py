@@ -0,0 +1,51 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from starlette.datastructures import State
+
+import userdata_api.routes.base
+from userdata_api.models.session import get_engine
+from userdata_api.utils import warmup
+from userdata_api.utils.catalog import catalog_cache
+
+
+def test_live(client):
+    response = client.get("/live")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_ready_after_warmup(client, param, source):
+    param()
+    source()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+    assert catalog_cache._snapshot is not None
+    pool = get_engine().pool
+    assert pool.checkedin() >= min(5, pool.size())
+
+
+def test_not_ready_while_warming_up(monkeypatch, auth_mock):
+    async def never_ready(state, connections, retry_delay):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(userdata_api.routes.base, "warm_up_until_ready", never_ready)
+    with TestClient(userdata_api.routes.base.app) as client:
+        assert client.get("/ready").status_code == 503
+        assert client.get("/live").status_code == 200
+
+
+def test_warmup_retries(monkeypatch):
+    attempts = []
+
+    async def flaky(connections):
+        attempts.append(connections)
+        if len(attempts) < 3:
+            raise ConnectionError("db is down")
+
+    monkeypatch.setattr(warmup, "warm_up", flaky)
+    state = State()
+    asyncio.run(warmup.warm_up_until_ready(state, 3, 0))
+    assert attempts == [3, 3, 3]
+    assert state.ready is True
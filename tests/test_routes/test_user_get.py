@@ -93,6 +93,7 @@ def test_get_a_few(client, dbsession, category_no_scopes, source):
 def test_get_a_few_with_trust_level(client, dbsession, category_no_scopes, source):
     source1 = source()
     source2 = source()
+    source3 = source()
     category1 = category_no_scopes()
     category2 = category_no_scopes()
     category3 = category_no_scopes()
@@ -115,7 +116,7 @@ def test_get_a_few_with_trust_level(client, dbsession, category_no_scopes, sourc
 
     info1 = Info(value=f"test{random_string()}", source_id=source1.id, param_id=param1.id, owner_id=0)
     info2 = Info(value=f"test{random_string()}", source_id=source2.id, param_id=param1.id, owner_id=0)
-    info3 = Info(value=f"test{random_string()}", source_id=source1.id, param_id=param1.id, owner_id=0)
+    info3 = Info(value=f"test{random_string()}", source_id=source3.id, param_id=param1.id, owner_id=0)
 
     info4 = Info(value=f"test{random_string()}", source_id=source1.id, param_id=param2.id, owner_id=0)
 
@@ -123,11 +124,11 @@ def test_get_a_few_with_trust_level(client, dbsession, category_no_scopes, sourc
     info6 = Info(value=f"test{random_string()}", source_id=source2.id, param_id=param3.id, owner_id=0)
     dbsession.add_all([info1, info2, info3, info4, info5, info6])
     dbsession.commit()
-    info7 = Info(value=f"test{random_string()}", source_id=source1.id, param_id=param3.id, owner_id=0)
+    info7 = Info(value=f"test{random_string()}", source_id=source3.id, param_id=param3.id, owner_id=0)
 
     info8 = Info(value=f"test{random_string()}", source_id=source1.id, param_id=param4.id, owner_id=0)
     info9 = Info(value=f"test{random_string()}", source_id=source2.id, param_id=param4.id, owner_id=0)
-    info10 = Info(value=f"test{random_string()}", source_id=source1.id, param_id=param4.id, owner_id=0)
+    info10 = Info(value=f"test{random_string()}", source_id=source3.id, param_id=param4.id, owner_id=0)
     dbsession.add_all([info7, info8, info9, info10])
     dbsession.commit()
     response = client.get(f"/user/{info1.owner_id}")
@@ -178,6 +179,10 @@ def test_get_last_most_trusted(client, dbsession, category_no_scopes, source):
     dbsession.add_all([info1, info2])
     dbsession.commit()
     sleep(0.1)
+    # У источника одно неудаленное значение параметра, старые значения остаются удаленными
+    info1.is_deleted = True
+    info2.is_deleted = True
+    dbsession.flush()
     info3 = Info(value=f"test{random_string()}", source_id=source1.id, param_id=param1.id, owner_id=0)
     info4 = Info(value=f"test{random_string()}", source_id=source2.id, param_id=param1.id, owner_id=0)
     dbsession.add_all([info3, info4])
@@ -195,3 +200,29 @@ def test_get_last_most_trusted(client, dbsession, category_no_scopes, source):
     dbsession.flush()
     dbsession.delete(category1)
     dbsession.commit()
+
+
+@pytest.mark.authenticated(user_id=0)
+def test_get_not_modified(client, dbsession, source, info_no_scopes):
+    info1: Info = info_no_scopes()
+    response = client.get("/user/0")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    response = client.get("/user/0", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert not response.content
+    assert client.get("/user/0", headers={"If-None-Match": f'"other", {etag}'}).status_code == 304
+    assert client.get("/user/1", headers={"If-None-Match": etag}).status_code != 304
+    info1.value = f"test{random_string()}"
+    dbsession.commit()
+    response = client.get("/user/0", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["items"][0]["value"] == info1.value
+    etag = response.headers["ETag"]
+    info1.is_deleted = True
+    dbsession.commit()
+    assert client.get("/user/0", headers={"If-None-Match": etag}).status_code != 304
+    dbsession.delete(info1)
+    dbsession.commit()
@@ -1,6 +1,10 @@
 import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, IntegrityError
 
+import userdata_api.utils.user
 from userdata_api.models.db import *
+from userdata_api.utils.catalog import catalog_cache
 from userdata_api.utils.utils import random_string
 
 
@@ -440,3 +444,114 @@ def test_delete_forbidden_by_category_scope(dbsession, client, param, admin_sour
     assert response.status_code == 403
     assert not info1.is_deleted
     dbsession.delete(info1)
+
+
+@pytest.mark.authenticated("test.cat_update.first", "userdata.info.admin", user_id=1)
+def test_batch_applied_atomically(dbsession, client, param, admin_source):
+    param1, param2, param3 = param(), param(), param()
+    param3.validation = "^[0-9]+$"
+    for _param in (param1, param2, param3):
+        _param.category.update_scope = "test.cat_update.first"
+    info1 = Info(value="old", source_id=admin_source.id, param_id=param1.id, owner_id=0)
+    info2 = Info(value="to_delete", source_id=admin_source.id, param_id=param2.id, owner_id=0)
+    dbsession.add_all([info1, info2])
+    dbsession.commit()
+    items = [
+        {"category": param1.category.name, "param": param1.name, "value": "new"},
+        {"category": param2.category.name, "param": param2.name, "value": None},
+        {"category": param3.category.name, "param": param3.name, "value": "not a number"},
+    ]
+    response = client.post("/user/0", json={"source": "admin", "items": items})
+    assert response.status_code == 422
+    dbsession.expire_all()
+    assert info1.value == "old"
+    assert not info2.is_deleted
+    assert not dbsession.query(Info).filter(Info.param_id == param3.id).all()
+
+    items[2]["value"] = "42"
+    response = client.post("/user/0", json={"source": "admin", "items": items})
+    assert response.status_code == 200
+    dbsession.expire_all()
+    assert info1.value == "new"
+    assert info1.modify_ts > info1.create_ts
+    assert info2.is_deleted
+    info3 = dbsession.query(Info).filter(Info.param_id == param3.id, Info.is_deleted == False).one()
+    assert info3.value == "42"
+    assert info3.source_id == admin_source.id
+    for info in (info1, info2, info3):
+        dbsession.delete(info)
+    dbsession.commit()
+
+
+@pytest.mark.authenticated("test.cat_update.first", "userdata.info.admin", user_id=1)
+def test_batch_rolled_back_on_write_error(dbsession, client, param, admin_source, monkeypatch):
+    param1, param2 = param(), param()
+    for _param in (param1, param2):
+        _param.category.update_scope = "test.cat_update.first"
+    info2 = Info(value="to_delete", source_id=admin_source.id, param_id=param2.id, owner_id=0)
+    dbsession.add(info2)
+    dbsession.commit()
+    # Удаление выполняется после записи значений и падает
+    monkeypatch.setattr(userdata_api.utils.user, "delete_info_stmt", lambda *args: text("SELECT 1 / 0"))
+    items = [
+        {"category": param1.category.name, "param": param1.name, "value": "new"},
+        {"category": param2.category.name, "param": param2.name, "value": None},
+    ]
+    with pytest.raises(DBAPIError):
+        client.post("/user/0", json={"source": "admin", "items": items})
+    dbsession.expire_all()
+    assert not dbsession.query(Info).filter(Info.param_id == param1.id).all()
+    assert not info2.is_deleted
+    dbsession.delete(info2)
+    dbsession.commit()
+
+
+@pytest.mark.authenticated("test.cat_update.first", "userdata.info.admin", user_id=1)
+def test_upsert_keeps_single_live_value(dbsession, client, param, admin_source):
+    param1, param2 = param(), param()
+    param2.changeable = False
+    for _param in (param1, param2):
+        _param.category.update_scope = "test.cat_update.first"
+    dbsession.commit()
+    items = [
+        {"category": param1.category.name, "param": param1.name, "value": "first"},
+        {"category": param2.category.name, "param": param2.name, "value": "first"},
+    ]
+    assert client.post("/user/0", json={"source": "admin", "items": items}).status_code == 200
+    info1 = dbsession.query(Info).filter(Info.param_id == param1.id, Info.is_deleted == False).one()
+    info2 = dbsession.query(Info).filter(Info.param_id == param2.id, Info.is_deleted == False).one()
+
+    items[1]["value"] = "second"
+    assert client.post("/user/0", json={"source": "admin", "items": items}).status_code == 403
+    items[0]["value"] = "second"
+    assert client.post("/user/0", json={"source": "admin", "items": items[:1]}).status_code == 200
+    dbsession.expire_all()
+    infos = dbsession.query(Info).filter(Info.param_id.in_([param1.id, param2.id])).all()
+    assert sorted(info.id for info in infos) == sorted([info1.id, info2.id])
+    assert info1.value == "second"
+    assert info2.value == "first"
+
+    dbsession.add(Info(value="duplicate", source_id=admin_source.id, param_id=param1.id, owner_id=0))
+    with pytest.raises(IntegrityError):
+        dbsession.commit()
+    dbsession.rollback()
+    for info in (info1, info2):
+        dbsession.delete(info)
+    dbsession.commit()
+
+
+@pytest.mark.authenticated("userdata.info.admin", user_id=1)
+def test_param_created_in_other_process(dbsession, client, param, admin_source, monkeypatch):
+    # Справочник процесса закэширован надолго, параметр создан в обход этого процесса
+    monkeypatch.setattr(catalog_cache, "ttl", 3600)
+    catalog_cache.invalidate()
+    catalog_cache.get(dbsession)
+    _param = param()
+    _param.category.update_scope = None
+    dbsession.commit()
+    item = {"category": _param.category.name, "param": _param.name, "value": "new"}
+    response = client.post("/user/0", json={"source": admin_source.name, "items": [item]})
+    assert response.status_code == 200
+    assert dbsession.query(Info.value).filter(Info.param_id == _param.id, Info.is_deleted == False).scalar() == "new"
+    dbsession.query(Info).filter(Info.param_id == _param.id).delete()
+    dbsession.commit()
@@ -1,5 +1,9 @@
+import json
+from time import sleep
+
 import pytest
 
+from settings import get_settings
 from userdata_api.models.db import Info, Param
 from userdata_api.utils.utils import random_string
 
@@ -152,3 +156,148 @@ def test_get_some_categories(client, dbsession, category_no_scopes, source):
     dbsession.delete(category2)
     dbsession.delete(category3)
     dbsession.commit()
+
+
+@pytest.mark.authenticated("userdata.info.admin")
+def test_get_view_types(client, dbsession, category_no_scopes, source):
+    source1 = source()
+    source2 = source()
+    source2.trust_level = 9
+    category1 = category_no_scopes()
+    param1 = Param(
+        name=f"test{random_string()}", category_id=category1.id, type="all", changeable=True, is_required=True
+    )
+    param2 = Param(
+        name=f"test{random_string()}", category_id=category1.id, type="last", changeable=True, is_required=True
+    )
+    param3 = Param(
+        name=f"test{random_string()}", category_id=category1.id, type="most_trusted", changeable=True, is_required=True
+    )
+    dbsession.add_all([param1, param2, param3])
+    dbsession.flush()
+    old, new = {}, {}
+    for owner_id in (1, 2):
+        old[owner_id] = [
+            Info(value=f"test{random_string()}", source_id=source1.id, param_id=param1.id, owner_id=owner_id),
+            Info(value=f"test{random_string()}", source_id=source2.id, param_id=param1.id, owner_id=owner_id),
+            Info(value=f"test{random_string()}", source_id=source2.id, param_id=param2.id, owner_id=owner_id),
+            Info(value=f"test{random_string()}", source_id=source2.id, param_id=param3.id, owner_id=owner_id),
+        ]
+        dbsession.add_all(old[owner_id])
+    dbsession.commit()
+    sleep(0.1)
+    for owner_id in (1, 2):
+        new[owner_id] = [
+            Info(value=f"test{random_string()}", source_id=source1.id, param_id=param2.id, owner_id=owner_id),
+            Info(value=f"test{random_string()}", source_id=source1.id, param_id=param3.id, owner_id=owner_id),
+        ]
+        dbsession.add_all(new[owner_id])
+    dbsession.commit()
+    response = client.get(f"/user", params={"users": [1, 2], "categories": [category1.id]})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert len(items) == 8
+    for owner_id in (1, 2):
+        all1, all2, _, most_trusted = old[owner_id]
+        last, _ = new[owner_id]
+        assert {"user_id": owner_id, "category": category1.name, "param": param1.name, "value": all1.value} in items
+        assert {"user_id": owner_id, "category": category1.name, "param": param1.name, "value": all2.value} in items
+        assert {"user_id": owner_id, "category": category1.name, "param": param2.name, "value": last.value} in items
+        assert {
+            "user_id": owner_id,
+            "category": category1.name,
+            "param": param3.name,
+            "value": most_trusted.value,
+        } in items
+    for info in old[1] + old[2] + new[1] + new[2]:
+        dbsession.delete(info)
+    dbsession.flush()
+    dbsession.delete(param1)
+    dbsession.delete(param2)
+    dbsession.delete(param3)
+    dbsession.flush()
+    dbsession.delete(category1)
+    dbsession.commit()
+
+
+@pytest.mark.authenticated("userdata.info.admin")
+def test_get_ndjson(client, dbsession, category_no_scopes, category, source, monkeypatch):
+    monkeypatch.setattr(get_settings(), "USERS_STREAM_WINDOW", 2)
+    source = source()
+    category1 = category_no_scopes()
+    category2 = category()
+    params = [
+        Param(name=f"test{random_string()}", category_id=_category.id, type="last", changeable=True, is_required=True)
+        for _category in (category1, category1, category2)
+    ]
+    dbsession.add_all(params)
+    dbsession.flush()
+    infos = [
+        Info(value=f"test{random_string()}", source_id=source.id, param_id=_param.id, owner_id=owner_id)
+        for owner_id in range(3)
+        for _param in params
+    ]
+    dbsession.add_all(infos)
+    dbsession.commit()
+    query = {"users": [0, 1, 2], "categories": [category1.id, category2.id]}
+    response = client.get("/user", params=query, headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert len(items) == 6
+    assert items == sorted(items, key=lambda item: item["user_id"])
+    key = lambda item: (item["user_id"], item["param"])
+    assert sorted(items, key=key) == sorted(client.get("/user", params=query).json()["items"], key=key)
+    assert {item["category"] for item in items} == {category1.name}
+    response = client.get(
+        "/user", params={"users": [-1], "categories": [category1.id]}, headers={"Accept": "application/x-ndjson"}
+    )
+    assert response.status_code == 404
+    for info in infos:
+        dbsession.delete(info)
+    dbsession.flush()
+    for _param in params:
+        dbsession.delete(_param)
+    dbsession.commit()
+
+
+@pytest.mark.authenticated("userdata.info.admin")
+def test_query_pages(client, dbsession, category_no_scopes, category, source):
+    source = source()
+    category1 = category_no_scopes()
+    category2 = category()
+    params = [
+        Param(name=f"test{random_string()}", category_id=_category.id, type="last", changeable=True, is_required=True)
+        for _category in (category1, category2)
+    ]
+    dbsession.add_all(params)
+    dbsession.flush()
+    infos = [
+        Info(value=f"test{random_string()}", source_id=source.id, param_id=_param.id, owner_id=owner_id)
+        for owner_id in range(5)
+        for _param in params
+    ]
+    dbsession.add_all(infos)
+    dbsession.commit()
+    body = {"users": [4, 3, 2, 1, 0, 2, 100], "categories": [category1.id, category2.id], "limit": 2}
+    pages, cursor = [], None
+    while True:
+        response = client.post("/user/query", json=body | {"cursor": cursor})
+        assert response.status_code == 200
+        pages.append(response.json()["items"])
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            break
+    assert [[item["user_id"] for item in page] for page in pages] == [[0, 1], [2, 3], [4]]
+    assert {item["category"] for page in pages for item in page} == {category1.name}
+    key = lambda item: (item["user_id"], item["param"])
+    expected = client.get("/user", params={"users": body["users"], "categories": body["categories"]}).json()["items"]
+    assert sorted((item for page in pages for item in page), key=key) == sorted(expected, key=key)
+    assert client.post("/user/query", json=body | {"cursor": "not a cursor"}).status_code == 422
+    assert client.post("/user/query", json=body | {"limit": 0}).status_code == 422
+    for info in infos:
+        dbsession.delete(info)
+    dbsession.flush()
+    for _param in params:
+        dbsession.delete(_param)
+    dbsession.commit()
@@ -0,0 +1,35 @@
+import uvicorn
+
+from settings import Settings
+from userdata_api import server
+from userdata_api.routes.base import app
+
+
+def test_options():
+    settings = Settings(API_WORKERS=4, API_PORT=80, API_BACKLOG=100, API_KEEPALIVE=75, API_LIMIT_CONCURRENCY=500)
+    assert server.uvicorn_options(settings) == {
+        "loop": "auto",
+        "http": "auto",
+        "backlog": 100,
+        "timeout_keep_alive": 75,
+        "limit_concurrency": 500,
+    }
+    assert server.gunicorn_options(settings) == {
+        "bind": "127.0.0.1:80",
+        "workers": 4,
+        "preload_app": True,
+        "backlog": 100,
+        "keepalive": 75,
+    }
+    assert server.gunicorn_options(Settings(API_LOG_CONFIG="logging_prod.conf"))["logconfig"] == "logging_prod.conf"
+
+
+def test_single_process(monkeypatch):
+    calls = []
+    monkeypatch.setattr(uvicorn, "run", lambda *args, **kwargs: calls.append((args, kwargs)))
+    server.run(Settings(API_KEEPALIVE=30))
+    [(args, kwargs)] = calls
+    assert args == (app,)
+    assert kwargs["host"] == "127.0.0.1" and kwargs["port"] == 8000
+    assert kwargs["timeout_keep_alive"] == 30 and kwargs["loop"] == "auto"
+    assert "log_config" not in kwargs
@@ -0,0 +1,130 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import sleep
+
+import pytest
+from auth_lib.fastapi import UnionAuth
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from settings import get_settings
+from userdata_api.utils.auth import CachedUnionAuth, SessionCache, session_cache
+
+
+@pytest.fixture
+def auth_server(monkeypatch):
+    """
+    Локальная замена сервиса авторизации: токен `valid` - сессия пользователя 1,
+    `status-<код>` - ответ с этим кодом, `slow` - ответ через секунду, остальные - 401
+    """
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            calls.append(self.headers["Authorization"])
+            if self.headers["Authorization"] == "slow":
+                sleep(1)
+            if self.headers["Authorization"] != "valid":
+                status = self.headers["Authorization"].removeprefix("status-")
+                self.send_response(int(status) if status.isdigit() else 401)
+                self.end_headers()
+                return
+            body = json.dumps({"id": 1, "session_scopes": [{"id": 1, "name": "test.scope"}], "user_scopes": []})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(UnionAuth.settings, "AUTH_URL", f"http://127.0.0.1:{server.server_port}/")
+    session_cache.clear()
+    yield calls
+    server.shutdown()
+    session_cache.clear()
+
+
+@pytest.fixture
+def auth_client(auth_server):
+    app = FastAPI()
+
+    @app.get("/me")
+    def me(user=Depends(CachedUnionAuth(scopes=["test.scope"], allow_none=False, auto_error=True))):
+        return user
+
+    @app.get("/admin")
+    def admin(user=Depends(CachedUnionAuth(scopes=["test.admin"], allow_none=False, auto_error=True))):
+        return user
+
+    return TestClient(app)
+
+
+def _cache_metric(result):
+    return REGISTRY.get_sample_value("userdata_api_auth_cache_total", {"result": result}) or 0
+
+
+def test_session_cached(auth_client, auth_server):
+    hits = _cache_metric("hit")
+    for _ in range(3):
+        response = auth_client.get("/me", headers={"Authorization": "valid"})
+        assert response.status_code == 200
+        assert response.json() == {"id": 1, "session_scopes": [{"id": 1, "name": "test.scope"}]}
+    assert auth_client.get("/admin", headers={"Authorization": "valid"}).status_code == 401
+    assert auth_server == ["valid"]
+    assert _cache_metric("hit") == hits + 3
+
+
+def test_invalid_token_cached(auth_client, auth_server):
+    negative_hits = _cache_metric("negative_hit")
+    for _ in range(2):
+        assert auth_client.get("/me", headers={"Authorization": "invalid"}).status_code == 403
+    assert auth_client.get("/me").status_code == 403
+    assert auth_server == ["invalid"]
+    assert _cache_metric("negative_hit") == negative_hits + 1
+
+
+def test_session_cache_expiry_and_eviction(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr("userdata_api.utils.auth.monotonic", lambda: now)
+    cache = SessionCache(maxsize=2, ttl=10, negative_ttl=1)
+    cache.put("a", {"id": 1, "session_scopes": [], "user_scopes": []})
+    cache.put("invalid", None)
+    assert cache.get("invalid") == (True, None)
+    assert cache.get("a") == (True, {"id": 1, "session_scopes": []})
+    cache.put("b", {"id": 2, "session_scopes": []})
+    assert cache.get("a")[0]
+    assert not cache.get("invalid")[0]
+    now = 105.0
+    assert cache.get("b")[0]
+    now = 111.0
+    assert not cache.get("a")[0]
+
+
+@pytest.mark.parametrize("status", [500, 503, 429])
+def test_service_errors_not_cached(auth_client, auth_server, status):
+    unavailable = _cache_metric("unavailable")
+    token = f"status-{status}"
+    for _ in range(2):
+        assert auth_client.get("/me", headers={"Authorization": token}).status_code == 403
+    assert auth_server == [token, token]
+    assert _cache_metric("unavailable") == unavailable + 2
+
+
+def test_forbidden_token_cached(auth_client, auth_server):
+    for _ in range(2):
+        assert auth_client.get("/me", headers={"Authorization": "status-403"}).status_code == 403
+    assert auth_server == ["status-403"]
+
+
+def test_timeout_not_cached(auth_client, auth_server, monkeypatch):
+    monkeypatch.setattr(get_settings(), "AUTH_TIMEOUT", 0.1)
+    unavailable = _cache_metric("unavailable")
+    for _ in range(2):
+        assert auth_client.get("/me", headers={"Authorization": "slow"}).status_code == 403
+    assert auth_server == ["slow", "slow"]
+    assert _cache_metric("unavailable") == unavailable + 2
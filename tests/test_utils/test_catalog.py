@@ -0,0 +1,44 @@
+from userdata_api.utils.catalog import CatalogCache
+
+
+def test_lookup(dbsession, param, source):
+    _param = param()
+    _source = source()
+    catalog = CatalogCache(ttl=0).get(dbsession)
+    assert catalog.param(_param.category.name, _param.name).id == _param.id
+    assert catalog.params[_param.id].category.update_scope == _param.category.update_scope
+    assert catalog.sources[_source.name].trust_level == _source.trust_level
+
+
+def test_version_changes(dbsession, param):
+    cache = CatalogCache(ttl=0)
+    _param = param()
+    before = cache.get(dbsession)
+    assert cache.get(dbsession) is before
+    _param.category.read_scope = "test.changed"
+    dbsession.commit()
+    after = cache.get(dbsession)
+    assert after.version != before.version
+    assert after.params[_param.id].category.read_scope == "test.changed"
+
+
+def test_ttl(dbsession, param):
+    cache = CatalogCache(ttl=3600)
+    before = cache.get(dbsession)
+    _param = param()
+    assert cache.get(dbsession) is before
+    assert cache.get(dbsession).param(_param.category.name, _param.name) is None
+    cache.invalidate()
+    assert cache.get(dbsession).param(_param.category.name, _param.name).id == _param.id
+
+
+def test_name_miss_refreshes(dbsession, param, source):
+    cache = CatalogCache(ttl=3600)
+    before = cache.get(dbsession)
+    _param, _source = param(), source()
+    key = (_param.category.name, _param.name)
+    assert cache.get(dbsession, sources=[_source.name]).sources[_source.name].id == _source.id
+    assert cache.get(dbsession, params=[key]).param(*key).id == _param.id
+    assert cache.get(dbsession) is not before
+    # Неизвестное название перечитывает только отпечаток, снимок остается тем же
+    assert cache.get(dbsession, sources=["test.missing"]) is cache.get(dbsession)
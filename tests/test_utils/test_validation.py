@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from re import error as ReError
+
+import pytest
+
+from userdata_api.models.db import ViewType
+from userdata_api.utils.catalog import CatalogCategory, CatalogParam
+from userdata_api.utils.validation import UnsafeRegex, ValidatorCache, check_pattern
+
+
+def _param(validation: str | None, modify_ts: datetime) -> CatalogParam:
+    return CatalogParam(
+        id=1,
+        name="test",
+        category=CatalogCategory(id=1, name="test", read_scope=None, update_scope=None),
+        type=ViewType.LAST,
+        validation=validation,
+        changeable=True,
+        is_required=False,
+        is_public=False,
+        visible_in_user_response=True,
+        modify_ts=modify_ts,
+    )
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        "^test_[0-9]{3}$",
+        r"^[\w.]+@(\w+\.)+\w+$",
+        r"^(\d{2}-)+\d{2}$",
+        "^a*b+$",
+        r"^(?P<year>\d{4})-(?P=year)$",
+        r"^([(+*]\w+)+$",
+        r"^(?i)(?#comment)(a{2,}b)+$",
+        "^(a+){1}$",
+        r"^\p{L}+(?:\s\p{L}+)*$",
+        r"^(?>\w+)+$",
+        r"^(\x41+\.)+$",
+        "(?x) ^ [ #]+ $  # пробелы и решетка в классе",
+        "(?x:(a+ )\n b)+",
+        "(?x)a#[",
+    ],
+)
+def test_safe_patterns(pattern):
+    assert check_pattern(pattern)
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        "^(a+)+$",
+        r"^(\w+\s?)*$",
+        "(a*)*",
+        "((ab)*c?)+d",
+        "^(?:x+x+)+y$",
+        "^(?P<word>a{1,}){2,}$",
+        r"^(?=x)(?:[a-z]+)+$",
+        "^x|(a+)*$",
+        "^(?>(a+)+)$",
+        r"^(\x41+\x42?)+$",
+        "(?x)(a+ # )\n)+",
+        "^(a+)(?#comment)+$",
+        "(?x)(a + )+",
+        "(?x:(a+ # )\n))+",
+    ],
+)
+def test_unsafe_patterns(pattern):
+    with pytest.raises(UnsafeRegex):
+        check_pattern(pattern)
+
+
+def test_invalid_pattern():
+    with pytest.raises(ReError):
+        check_pattern("[][")
+
+
+def test_recompile_on_change():
+    cache = ValidatorCache(timeout=1)
+    now = datetime.utcnow()
+    assert cache.match(_param("^[0-9]+$", now), "123")
+    # Выражение изменилось без изменения modify_ts, используется новое
+    assert cache.match(_param("^[a-z]+$", now), "abc")
+    assert not cache.match(_param("^[a-z]+$", now), "123")
+    assert cache.compile(1, "^[a-z]+$") is cache.compile(1, "^[a-z]+$")
+    assert cache.match(_param(None, now + timedelta(seconds=2)), "anything")
+
+
+def test_timeout_is_invalid():
+    cache = ValidatorCache(timeout=0.01)
+    # Перекрывающиеся ветки статическая проверка не ловит, от перебора защищает ограничение по времени
+    assert check_pattern("^(a|aa)+$")
+    assert not cache.match(_param("^(a|aa)+$", datetime.utcnow()), "a" * 60 + "b")
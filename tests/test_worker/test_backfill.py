@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+from userdata_api.models.db import Info
+from worker.backfill import run
+from worker.source import MemorySource
+
+
+def test_backfill_follows_worker_semantics(dbsession, param, source):
+    param1, param2, param3 = param(), param(), param()
+    source1, source2 = source(), source()
+    kept = Info(value="kept", source_id=source2.id, param_id=param1.id, owner_id=1)
+    deleted = Info(value="deleted", source_id=source1.id, param_id=param2.id, owner_id=1)
+    dbsession.add_all([kept, deleted])
+    dbsession.commit()
+
+    def event(user_id, source_, *items):
+        values = [{"category": p.category.name, "param": p.name, "value": value} for p, value in items]
+        return {"user_id": user_id}, {"items": values, "source": source_.name}
+
+    messages = [
+        event(1, source1, (param1, "first"), (param3, "tab\tand\\backslash\nnewline")),
+        event(1, source1, (param1, "second"), (param2, None)),
+        (b'{"user_id": 2}', b'{"items": [], "source": "' + source1.name.encode() + b'"'),
+        event(2, source1, (param1, "other")),
+        ({"user_id": 2}, {"items": [{"category": "unknown", "param": "unknown", "value": "x"}], "source": "test"}),
+        event(1, source1, (param1, "last")),
+    ]
+    stats = run(MemorySource(messages), chunk_size=2)
+    assert (stats.events, stats.skipped, stats.rows) == (5, 1, 6)
+    infos = dbsession.query(Info).filter(Info.param_id.in_([param1.id, param2.id, param3.id])).all()
+    live = {(info.owner_id, info.param_id, info.source_id): info.value for info in infos if not info.is_deleted}
+    assert live == {
+        (1, param1.id, source1.id): "last",
+        (1, param1.id, source2.id): "kept",
+        (1, param3.id, source1.id): "tab\tand\\backslash\nnewline",
+        (2, param1.id, source1.id): "other",
+    }
+    dbsession.refresh(deleted)
+    assert deleted.is_deleted
+
+    run(MemorySource(messages), chunk_size=10)
+    assert len(dbsession.query(Info).filter(Info.param_id.in_([param1.id, param2.id, param3.id])).all()) == len(infos)
+    for info in infos:
+        dbsession.delete(info)
+    dbsession.commit()
+
+
+def test_backfill_does_not_start_consumer():
+    # Модуль воркера при импорте создает движок, сессию и пул потоков, которые загрузке не нужны
+    code = "import sys, worker.backfill; assert 'worker.consumer' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
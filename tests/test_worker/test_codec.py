@@ -0,0 +1,33 @@
+import pydantic
+import pytest
+from event_schema.auth import UserLogin
+
+from worker.codec import VALUE_ADAPTER, DecodeError, EventDecoder, JsonCodec, make_codec
+
+
+def test_json_codec():
+    codec = JsonCodec()
+    value = codec.decode(b'{"items": [{"category": "c", "param": "p", "value": null}], "source": "s"}', VALUE_ADAPTER)
+    assert isinstance(value, UserLogin)
+    assert value.items[0].value is None
+    with pytest.raises(DecodeError) as e:
+        codec.decode(b'{"items": [', VALUE_ADAPTER)
+    assert e.value.reason == "json"
+    with pytest.raises(pydantic.ValidationError):
+        codec.decode(b'{"items": 1, "source": "s"}', VALUE_ADAPTER)
+
+
+def test_decoder_accepts_raw_and_parsed():
+    decoder = EventDecoder(JsonCodec())
+    from_bytes = decoder.decode(b'{"user_id": 1}', b'{"items": [], "source": "s"}')
+    from_str = decoder.decode('{"user_id": 1}', '{"items": [], "source": "s"}')
+    from_dict = decoder.decode({"user_id": 1}, {"items": [], "source": "s"})
+    assert from_bytes == from_str == from_dict == (1, UserLogin(items=[], source="s"))
+    with pytest.raises(DecodeError):
+        decoder.decode(None, b'{"items": [], "source": "s"}')
+
+
+def test_make_codec():
+    assert isinstance(make_codec("json"), JsonCodec)
+    with pytest.raises(ValueError):
+        make_codec("xml")
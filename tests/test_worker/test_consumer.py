@@ -0,0 +1,249 @@
+import json
+
+import pytest
+from confluent_kafka import TopicPartition
+from prometheus_client import REGISTRY
+from sqlalchemy.exc import OperationalError
+
+import worker.codec
+import worker.consumer
+from settings import get_settings
+from userdata_api.models.db import Info
+from userdata_api.utils.catalog import catalog_cache
+from worker.codec import decode_events
+from worker.consumer import apply_with_retries, process
+from worker.dead_letter import FileDeadLetter
+from worker.kafka import KafkaConsumer
+from worker.source import FileSource, MemorySource, make_source
+
+
+@pytest.fixture(autouse=True)
+def no_metrics_server(monkeypatch):
+    monkeypatch.setattr(get_settings(), "WORKER_METRICS_PORT", None)
+
+
+def test_memory_source_batches():
+    source = MemorySource(((i, i) for i in range(7)))
+    assert [len(batch) for batch in source.listen_batches(3, 0)] == [3, 3, 1]
+
+
+def test_make_source(tmp_path):
+    path = tmp_path / "events.ndjson"
+    path.touch()
+    assert isinstance(make_source(f"file:{path}"), FileSource)
+    with pytest.raises(ValueError):
+        make_source("unknown")
+
+
+def test_process_file(tmp_path, param, source, dbsession):
+    param, source = param(), source()
+
+    def message(user_id, value):
+        items = [{"category": param.category.name, "param": param.name, "value": value}]
+        return json.dumps({"key": {"user_id": user_id}, "value": {"items": items, "source": source.name}})
+
+    invalid_before = REGISTRY.get_sample_value("userdata_worker_invalid_messages_total", {"reason": "json"}) or 0
+    path = tmp_path / "events.ndjson"
+    path.write_text(
+        "\n".join(
+            [
+                message(1, "first"),
+                "{not json",
+                json.dumps({"key": {"user_id": 1}, "value": {"items": "not a list"}}),
+                message(2, "other"),
+                message(1, "last"),
+            ]
+        )
+    )
+    process(FileSource(str(path)))
+    values = dict(
+        dbsession.query(Info.owner_id, Info.value).filter(Info.param_id == param.id, Info.is_deleted == False)
+    )
+    assert values == {1: "last", 2: "other"}
+    assert REGISTRY.get_sample_value("userdata_worker_invalid_messages_total", {"reason": "json"}) == invalid_before + 1
+    dbsession.query(Info).filter(Info.param_id == param.id).delete()
+    dbsession.commit()
+
+
+def test_new_param_not_skipped(param, source, dbsession, monkeypatch):
+    # Справочник закэширован надолго до того, как другой процесс создал параметр и источник
+    monkeypatch.setattr(catalog_cache, "ttl", 3600)
+    catalog_cache.invalidate()
+    catalog_cache.get(dbsession)
+    param, source = param(), source()
+    items = [{"category": param.category.name, "param": param.name, "value": "new"}]
+    process(MemorySource([({"user_id": 1}, {"items": items, "source": source.name})]))
+    assert dbsession.query(Info.value).filter(Info.param_id == param.id, Info.is_deleted == False).scalar() == "new"
+    dbsession.query(Info).filter(Info.param_id == param.id).delete()
+    dbsession.commit()
+
+
+class RecordingSource(MemorySource):
+    def __init__(self, messages):
+        super().__init__(messages)
+        self.calls = []
+
+    def pause(self):
+        self.calls.append("pause")
+
+    def resume(self):
+        self.calls.append("resume")
+
+    def wait(self, seconds):
+        self.calls.append(seconds)
+
+
+@pytest.fixture
+def dead_letter(tmp_path, monkeypatch):
+    sink = FileDeadLetter(str(tmp_path / "dead.ndjson"))
+    monkeypatch.setattr(worker.consumer, "get_dead_letter", lambda: sink)
+    monkeypatch.setattr(worker.codec, "get_dead_letter", lambda: sink)
+    monkeypatch.setattr(get_settings(), "WORKER_RETRY_BASE_DELAY", 0.1)
+    monkeypatch.setattr(get_settings(), "WORKER_RETRY_MAX_DELAY", 0.3)
+    yield tmp_path / "dead.ndjson"
+    sink.close()
+
+
+def _messages(*user_ids):
+    return [({"user_id": user_id}, {"items": [], "source": "test"}) for user_id in user_ids]
+
+
+def test_transient_error_pauses_source(dead_letter, monkeypatch):
+    applied = []
+
+    def apply_batch(events):
+        if len(applied) < 3:
+            applied.append(None)
+            raise OperationalError("select 1", {}, Exception("connection refused"))
+        applied.append(events)
+
+    monkeypatch.setattr(worker.consumer, "apply_batch", apply_batch)
+    source = RecordingSource(_messages(1, 2))
+    process(source)
+    assert [user_id for user_id, _ in applied[-1]] == [1, 2]
+    assert source.calls == ["pause", 0.1, "pause", 0.2, "pause", 0.3, "resume"]
+    assert not dead_letter.read_text()
+
+
+def test_poison_message_dead_lettered(dead_letter, monkeypatch):
+    applied = []
+
+    def apply_batch(events):
+        if any(user_id == 13 for user_id, _ in events):
+            raise ValueError("poison")
+        applied.extend(user_id for user_id, _ in events)
+
+    monkeypatch.setattr(worker.consumer, "apply_batch", apply_batch)
+    source = RecordingSource(_messages(12, 13, 14) + [({"user_id": "not an id"}, {})])
+    process(source)
+    assert applied == [12, 14]
+    assert source.calls == [0.1, 0.2, 0.3, "resume"]
+    dead = [json.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert [(line["key"], line["reason"]) for line in dead] == [
+        ({"user_id": "not an id"}, "schema"),
+        ({"user_id": 13}, "apply"),
+    ]
+
+
+def test_poison_message_dead_lettered_once(dead_letter, monkeypatch):
+    applied = []
+    outages = [OperationalError("select 1", {}, Exception("connection refused"))]
+
+    def apply_batch(events):
+        if any(user_id == 13 for user_id, _ in events):
+            raise ValueError("poison")
+        if len(events) == 1 and events[0][0] == 14 and outages:
+            raise outages.pop()
+        applied.extend(user_id for user_id, _ in events)
+
+    monkeypatch.setattr(worker.consumer, "apply_batch", apply_batch)
+    process(RecordingSource(_messages(12, 13, 14)))
+    assert applied == [12, 14]
+    dead = [json.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert [(line["key"], line["reason"]) for line in dead] == [({"user_id": 13}, "apply")]
+
+
+def test_raw_messages_decoded(dead_letter, monkeypatch):
+    applied = []
+    monkeypatch.setattr(worker.consumer, "apply_batch", applied.extend)
+    source = RecordingSource(
+        [
+            (b'{"user_id": 1}', b'{"items": [], "source": "test"}'),
+            (b'{"user_id": 2', b'{"items": [], "source": "test"}'),
+            (b'{"user_id": 3}', b'{"items": "not a list", "source": "test"}'),
+            (None, b'{"items": [], "source": "test"}'),
+        ]
+    )
+    process(source)
+    assert [user_id for user_id, _ in applied] == [1]
+    dead = [json.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert [(line["key"], line["reason"]) for line in dead] == [
+        ('{"user_id": 2', "json"),
+        ('{"user_id": 3}', "schema"),
+        (None, "json"),
+    ]
+
+
+class StubMessage:
+    def __init__(self, partition, offset):
+        self._partition, self._offset = partition, offset
+
+    def error(self):
+        return None
+
+    def topic(self):
+        return "test"
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def key(self):
+        return json.dumps({"user_id": self._offset}).encode()
+
+    def value(self):
+        return b'{"items": [], "source": "test"}'
+
+
+class StubConsumer:
+    """Консьюмер confluent_kafka с двумя партициями по одному сообщению, учитывает паузы и перемотку"""
+
+    def __init__(self):
+        self.partitions = {0: [StubMessage(0, 13)], 1: [StubMessage(1, 14)]}
+        self.positions = {0: 0, 1: 0}
+        self.paused = set()
+
+    def assignment(self):
+        return [TopicPartition("test", partition) for partition in self.partitions]
+
+    def consume(self, num_messages, timeout):
+        messages = []
+        for partition, queue in self.partitions.items():
+            if partition not in self.paused and self.positions[partition] < len(queue):
+                messages.append(queue[self.positions[partition]])
+                self.positions[partition] += 1
+        return messages[:num_messages]
+
+    def seek(self, tp):
+        self.positions[tp.partition] = [m.offset() for m in self.partitions[tp.partition]].index(tp.offset)
+
+    def pause(self, partitions):
+        self.paused.update(tp.partition for tp in partitions)
+
+    def resume(self, partitions):
+        self.paused.difference_update(tp.partition for tp in partitions)
+
+
+def test_kafka_partitions_resumed_after_retries(dead_letter, monkeypatch):
+    # Ошибка не связана с базой: между попытками `wait` читает сообщения и приостанавливает их партиции без `pause`
+    monkeypatch.setattr(worker.consumer, "apply_batch", lambda events: (_ for _ in ()).throw(ValueError("poison")))
+    source = KafkaConsumer.__new__(KafkaConsumer)
+    source._paused = False
+    source._consumer = StubConsumer()
+    decoded = decode_events([(StubMessage(0, 12).key(), StubMessage(0, 12).value())])
+    apply_with_retries(decoded, source)
+    assert source._consumer.paused == set()
+    # Прочитанные во время ожидания сообщения не потеряны: после возобновления они прочитаются снова
+    assert source._consumer.positions == {0: 0, 1: 0}
@@ -0,0 +1,30 @@
+import json
+
+from prometheus_client import REGISTRY, generate_latest
+
+from worker.metrics import observe_kafka_stats
+
+
+def test_consumer_lag_from_stats():
+    stats = {
+        "name": "rdkafka#consumer-1",
+        "topics": {
+            "test-topic": {
+                "partitions": {
+                    "0": {"consumer_lag": 12},
+                    "1": {"consumer_lag": -1},
+                    "-1": {"consumer_lag": 0},
+                }
+            }
+        },
+    }
+    observe_kafka_stats(json.dumps(stats))
+    labels = {"topic": "test-topic", "partition": "0"}
+    assert REGISTRY.get_sample_value("userdata_worker_consumer_lag", labels) == 12
+    assert REGISTRY.get_sample_value("userdata_worker_consumer_lag", labels | {"partition": "1"}) is None
+    assert REGISTRY.get_sample_value("userdata_worker_consumer_lag", labels | {"partition": "-1"}) is None
+
+    stats["topics"]["test-topic"]["partitions"] = {"1": {"consumer_lag": 3}}
+    observe_kafka_stats(json.dumps(stats))
+    assert REGISTRY.get_sample_value("userdata_worker_consumer_lag", labels) is None
+    assert b'userdata_worker_consumer_lag{partition="1",topic="test-topic"} 3.0' in generate_latest()
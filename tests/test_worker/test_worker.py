@@ -1,10 +1,15 @@
 import pytest
 import sqlalchemy.exc
 from event_schema.auth import UserLogin
+from prometheus_client import REGISTRY
+from sqlalchemy.orm import sessionmaker
 
+import worker.user
 from userdata_api.models.db import Category, Info, Param, Source
+from userdata_api.utils.catalog import catalog_cache
 from userdata_api.utils.utils import random_string
-from worker.user import patch_user_info
+from worker.parallel import ParallelApplier
+from worker.user import coalesce_events, patch_user_info
 
 
 @pytest.fixture()
@@ -108,3 +113,87 @@ def test_delete(info, dbsession):
 
     dbsession.expire(info)
     assert info.is_deleted is True
+
+
+def test_event_applied_atomically(info, dbsession):
+    patch_user_info(
+        UserLogin.model_validate(
+            {
+                "items": [
+                    {"category": info.category.name, "param": info.param.name, "value": "updated"},
+                    {"category": info.category.name, "param": f"test{random_string()}", "value": "missing"},
+                ],
+                "source": info.source.name,
+            }
+        ),
+        1,
+        session=dbsession,
+    )
+
+    dbsession.expire(info)
+    assert info.value != "updated"
+
+
+def test_coalesce_events(info, dbsession):
+    def event(*items, source=info.source.name):
+        return UserLogin.model_validate(
+            {"items": [{"category": c, "param": p, "value": v} for c, p, v in items], "source": source}
+        )
+
+    category, param = info.category.name, info.param.name
+    coalesced_before = REGISTRY.get_sample_value("userdata_worker_coalesced_items_total")
+    events = [
+        (1, event((category, param, "first"))),
+        (2, event((category, param, "other user"))),
+        (1, event((category, param, "second"))),
+        (1, event((category, param, "unknown param"), (category, f"test{random_string()}", "value"))),
+        (1, event((category, param, "unknown source"), source=f"test{random_string()}")),
+        (1, event((category, param, "last"))),
+    ]
+    result = coalesce_events(events, catalog_cache.get(dbsession))
+    assert [(user_id, [item.value for item in event.items]) for user_id, event in result] == [
+        (1, ["last"]),
+        (2, ["other user"]),
+    ]
+    assert REGISTRY.get_sample_value("userdata_worker_coalesced_items_total") - coalesced_before == 2
+    for user_id, _event in result:
+        patch_user_info(_event, user_id, session=dbsession)
+    dbsession.expire(info)
+    assert info.value == "last"
+    other = dbsession.query(Info).filter(Info.owner_id == 2, Info.param_id == info.param_id).one()
+    dbsession.delete(other)
+    dbsession.commit()
+
+
+def test_parallel_applier(param, source, dbsession, monkeypatch):
+    def event(value):
+        return UserLogin.model_validate(
+            {"items": [{"category": param.category.name, "param": param.name, "value": value}], "source": source.name}
+        )
+
+    applier = ParallelApplier(3, sessionmaker(bind=dbsession.get_bind()))
+    try:
+        applier.apply([(user_id, event(f"value{user_id}")) for user_id in range(10, 16)])
+        values = dict(
+            dbsession.query(Info.owner_id, Info.value).filter(Info.param_id == param.id, Info.source_id == source.id)
+        )
+        assert values == {user_id: f"value{user_id}" for user_id in range(10, 16)}
+
+        def failing(new, user_id, *, session):
+            if user_id == 10:
+                raise RuntimeError("failed")
+            return patch_user_info(new, user_id, session=session)
+
+        monkeypatch.setattr(worker.user, "patch_user_info", failing)
+        with pytest.raises(RuntimeError):
+            applier.apply([(user_id, event("updated")) for user_id in (10, 11)])
+        dbsession.expire_all()
+        values = dict(
+            dbsession.query(Info.owner_id, Info.value).filter(Info.param_id == param.id, Info.source_id == source.id)
+        )
+        assert values[10] == "value10"
+        assert values[11] == "updated"
+    finally:
+        applier.close()
+        dbsession.query(Info).filter(Info.param_id == param.id).delete()
+        dbsession.commit()
@@ -1,7 +1,5 @@
 import argparse
 
-import uvicorn
-
 
 def get_args():
     parser = argparse.ArgumentParser()
@@ -9,18 +7,37 @@ def get_args():
 
     start = subparsers.add_parser("start")
     start.add_argument('--instance', type=str, required=True)
+    start.add_argument(
+        '--source', type=str, default="kafka", help="Источник сообщений воркера: kafka или file:<путь к NDJSON>"
+    )
+
+    backfill = subparsers.add_parser("backfill", help="Загрузить исторические события в обход воркера")
+    backfill.add_argument(
+        '--source',
+        type=str,
+        required=True,
+        help="file:<путь к NDJSON> или topic:<топик>[:<смещение>] - топик со смещения до текущего конца",
+    )
+    backfill.add_argument('--chunk-size', type=int, default=100000, help="Сообщений на одну транзакцию")
 
     return parser.parse_args()
 
 
 if __name__ == '__main__':
     args = get_args()
+    if args.command == "backfill":
+        from worker.backfill import run
+        from worker.source import make_source
+
+        print(run(make_source(args.source), args.chunk_size))
+        exit(0)
     match args.instance:
         case "api":
-            from userdata_api.routes.base import app
+            from userdata_api.server import run
 
-            uvicorn.run(app)
+            run()
         case "worker":
             from worker.consumer import process
+            from worker.source import make_source
 
-            process()
+            process(make_source(args.source))
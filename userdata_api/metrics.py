@@ -0,0 +1,8 @@
+from prometheus_client import Counter
+
+AUTH_CACHE = Counter(
+    "userdata_api_auth_cache",
+    "Обращения к кэшу сессий авторизации: hit, negative_hit (невалидный токен) или miss (запрос в сервис авторизации), "
+    "unavailable - сервис авторизации ответил ошибкой, ответ не закэширован",
+    ["result"],
+)
@@ -1,10 +1,22 @@
 from __future__ import annotations
 
 import re
+from typing import Sequence
 
-from sqlalchemy import Integer, not_
+from sqlalchemy import Integer, Select, event, not_, select
 from sqlalchemy.exc import NoResultFound
-from sqlalchemy.orm import Mapped, Query, Session, as_declarative, declared_attr, mapped_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import (
+    Mapped,
+    ORMExecuteState,
+    Query,
+    Session,
+    as_declarative,
+    declared_attr,
+    mapped_column,
+    raiseload,
+)
+from sqlalchemy.sql.base import ExecutableOption
 
 from userdata_api.exceptions import ObjectNotFound
 
@@ -48,9 +60,14 @@ class BaseDbModel(Base):
         return objs
 
     @classmethod
-    def get(cls, id: int, *, with_deleted=False, session: Session) -> BaseDbModel:
-        """Get object with soft deletes"""
-        objs = session.query(cls)
+    def get(
+        cls, id: int, *, with_deleted=False, options: Sequence[ExecutableOption] = (), session: Session
+    ) -> BaseDbModel:
+        """Get object with soft deletes
+
+        Связи не загружаются, если их явно не запросить через `options`, например `selectinload(Category.params)`
+        """
+        objs = session.query(cls).options(*options)
         if not with_deleted and hasattr(cls, "is_deleted"):
             objs = objs.filter(not_(cls.is_deleted))
         try:
@@ -76,6 +93,49 @@ class BaseDbModel(Base):
             session.delete(obj)
         session.flush()
 
+    @classmethod
+    def select(cls, *, with_deleted: bool = False) -> Select:
+        """Создает запрос с софт делитами для асинхронной сессии, возвращает Select"""
+        stmt = select(cls)
+        if not with_deleted and hasattr(cls, "is_deleted"):
+            stmt = stmt.where(not_(cls.is_deleted))
+        return stmt
+
+    @classmethod
+    async def acreate(cls, *, session: AsyncSession, **kwargs) -> BaseDbModel:
+        obj = cls(**kwargs)
+        session.add(obj)
+        await session.flush()
+        return obj
+
+    @classmethod
+    async def aget(
+        cls, id: int, *, with_deleted=False, options: Sequence[ExecutableOption] = (), session: AsyncSession
+    ) -> BaseDbModel:
+        """Get object with soft deletes, асинхронная версия `get`"""
+        obj = await session.scalar(cls.select(with_deleted=with_deleted).options(*options).where(cls.id == id))
+        if obj is None:
+            raise ObjectNotFound(cls, id)
+        return obj
+
+    @classmethod
+    async def aupdate(cls, id: int, *, session: AsyncSession, **kwargs) -> BaseDbModel:
+        obj = await cls.aget(id, session=session)
+        for k, v in kwargs.items():
+            setattr(obj, k, v)
+        await session.flush()
+        return obj
+
+    @classmethod
+    async def adelete(cls, id: int, *, session: AsyncSession) -> None:
+        """Soft delete object if possible, else hard delete"""
+        obj = await cls.aget(id, session=session)
+        if hasattr(obj, "is_deleted"):
+            obj.is_deleted = True
+        else:
+            await session.delete(obj)
+        await session.flush()
+
     @property
     def _col_names(self):
         return list(self.__table__.columns.keys())
@@ -87,3 +147,17 @@ class BaseDbModel(Base):
                 continue
             res[attr_name] = getattr(self, attr_name)
         return res
+
+
+class RaiseOnLazyLoadSession(Session):
+    """
+    Сессия для разработки и тестов: любая связь, которую не загрузили явно
+    через `selectinload`/`joinedload`/`contains_eager`, при обращении бросает исключение
+    вместо того, чтобы незаметно сходить в базу.
+    """
+
+
+@event.listens_for(RaiseOnLazyLoadSession, "do_orm_execute")
+def _raise_on_lazy_load(orm_execute_state: ORMExecuteState) -> None:
+    if orm_execute_state.is_select and not orm_execute_state.is_column_load:
+        orm_execute_state.statement = orm_execute_state.statement.options(raiseload("*"))
@@ -6,7 +6,7 @@ from typing import Final
 
 from sqlalchemy import Boolean, DateTime
 from sqlalchemy import Enum as DbEnum
-from sqlalchemy import ForeignKey, Integer, String
+from sqlalchemy import ForeignKey, Index, Integer, String, text
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -33,6 +33,8 @@ class Category(BaseDbModel):
     то категорией, их объединяющей, может быть "студенческая информация" или "документы"
     """
 
+    __table_args__ = (Index("ix_category_name", "name", postgresql_where=text("NOT is_deleted")),)
+
     name: Mapped[str] = mapped_column(String)
     read_scope: Mapped[str] = mapped_column(String, nullable=True)
     update_scope: Mapped[str] = mapped_column(String, nullable=True)
@@ -45,7 +47,6 @@ class Category(BaseDbModel):
         foreign_keys="Param.category_id",
         back_populates="category",
         primaryjoin="and_(Category.id==Param.category_id, not_(Param.is_deleted))",
-        lazy="joined",
     )
 
 
@@ -57,6 +58,10 @@ class Param(BaseDbModel):
     а параметры эти могут лежать в категории "контакты"
     """
 
+    __table_args__ = (
+        Index("ix_param_category_id_name", "category_id", "name", postgresql_where=text("NOT is_deleted")),
+    )
+
     is_public: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     visible_in_user_response: Mapped[bool] = mapped_column(Boolean, default=True)
     name: Mapped[str] = mapped_column(String)
@@ -74,7 +79,6 @@ class Param(BaseDbModel):
         foreign_keys="Param.category_id",
         back_populates="params",
         primaryjoin="and_(Param.category_id==Category.id, not_(Category.is_deleted))",
-        lazy="joined",
     )
 
     values: Mapped[list[Info]] = relationship(
@@ -82,7 +86,6 @@ class Param(BaseDbModel):
         foreign_keys="Info.param_id",
         back_populates="param",
         primaryjoin="and_(Param.id==Info.param_id, not_(Info.is_deleted))",
-        lazy="joined",
     )
 
     @property
@@ -104,12 +107,11 @@ class Source(BaseDbModel):
     modify_ts: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_deleted: Mapped[bool] = mapped_column(Boolean, default=False)
 
-    values: Mapped[Info] = relationship(
+    values: Mapped[list[Info]] = relationship(
         "Info",
         foreign_keys="Info.source_id",
         back_populates="source",
         primaryjoin="and_(Source.id==Info.source_id, not_(Info.is_deleted))",
-        lazy="joined",
     )
 
 
@@ -120,6 +122,18 @@ class Info(BaseDbModel):
     польщзователя(owner_id) - объекта изменения пользовательских данных
     """
 
+    __table_args__ = (
+        # У источника не больше одного неудаленного значения параметра пользователя, на индекс опирается upsert
+        Index(
+            "uq_info_owner_id_param_id_source_id",
+            "owner_id",
+            "param_id",
+            "source_id",
+            unique=True,
+            postgresql_where=text("NOT is_deleted"),
+        ),
+    )
+
     param_id: Mapped[int] = mapped_column(Integer, ForeignKey(Param.id))
     source_id: Mapped[int] = mapped_column(Integer, ForeignKey(Source.id))
     owner_id: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -133,7 +147,6 @@ class Info(BaseDbModel):
         foreign_keys="Info.param_id",
         back_populates="values",
         primaryjoin="and_(Info.param_id==Param.id, not_(Param.is_deleted))",
-        lazy="joined",
     )
 
     source: Mapped[Source] = relationship(
@@ -141,7 +154,6 @@ class Info(BaseDbModel):
         foreign_keys="Info.source_id",
         back_populates="values",
         primaryjoin="and_(Info.source_id==Source.id, not_(Source.is_deleted))",
-        lazy="joined",
     )
 
     @hybrid_property
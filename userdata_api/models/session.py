@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from contextvars import ContextVar, Token
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from settings import get_settings
+
+from .base import RaiseOnLazyLoadSession
+
+_engine: AsyncEngine | None = None
+_Session: async_sessionmaker[AsyncSession] | None = None
+_session: ContextVar[AsyncSession | None] = ContextVar("_session", default=None)
+
+
+class SessionNotInitialisedError(Exception):
+    def __init__(self):
+        super().__init__("Database engine is not initialised, call init_engine() on application startup")
+
+
+class MissingSessionError(Exception):
+    def __init__(self):
+        super().__init__("No session found, use DBSessionMiddleware or `async with db():`")
+
+
+def async_dsn(dsn: str) -> str:
+    """Перевести DSN вида `postgresql://...` на асинхронный драйвер asyncpg"""
+    scheme, rest = dsn.split("://", 1)
+    return f"{scheme.split('+', 1)[0]}+asyncpg://{rest}"
+
+
+def init_engine(dsn: str | None = None, **engine_args) -> AsyncEngine:
+    """
+    Создать асинхронный движок и фабрику сессий.
+
+    Вызывается на старте приложения (а значит, в каждом процессе после fork),
+    пул соединений не переживает перезапуск event loop.
+    """
+    global _engine, _Session
+    settings = get_settings()
+    engine_args = {"pool_pre_ping": True, "isolation_level": "AUTOCOMMIT"} | engine_args
+    _engine = create_async_engine(async_dsn(dsn or str(settings.DB_DSN)), **engine_args)
+    _Session = async_sessionmaker(
+        _engine,
+        expire_on_commit=False,
+        sync_session_class=RaiseOnLazyLoadSession if settings.DB_RAISE_ON_LAZY_LOAD else Session,
+    )
+    return _engine
+
+
+async def dispose_engine() -> None:
+    global _engine, _Session
+    if _engine is not None:
+        await _engine.dispose()
+    _engine, _Session = None, None
+
+
+def get_engine() -> AsyncEngine:
+    if _engine is None:
+        raise SessionNotInitialisedError()
+    return _engine
+
+
+class DBSessionMeta(type):
+    @property
+    def session(cls) -> AsyncSession:
+        """Сессия текущего запроса"""
+        if _Session is None:
+            raise SessionNotInitialisedError()
+        session = _session.get()
+        if session is None:
+            raise MissingSessionError()
+        return session
+
+
+class db(metaclass=DBSessionMeta):
+    """
+    Доступ к асинхронной сессии текущего контекста: `await db.session.execute(...)`
+
+    Сессия открывается на время `async with db():`, для HTTP запросов это делает `DBSessionMiddleware`
+    """
+
+    _token: Token | None = None
+
+    async def __aenter__(self) -> type[db]:
+        if _Session is None:
+            raise SessionNotInitialisedError()
+        self._token = _session.set(_Session())
+        return type(self)
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        session = _session.get()
+        try:
+            if exc_type is not None:
+                await session.rollback()
+        finally:
+            await session.close()
+            _session.reset(self._token)
+
+
+class DBSessionMiddleware:
+    """Открывает асинхронную сессию на время обработки каждого запроса"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        async with db():
+            await self.app(scope, receive, send)
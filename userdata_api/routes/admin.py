@@ -1,11 +1,11 @@
 from typing import Any
 
-from auth_lib.fastapi import UnionAuth
 from fastapi import APIRouter, Depends
 
 from userdata_api.schemas.admin import UserCardGet, UserCardUpdate
 from userdata_api.schemas.response_model import StatusResponseModel
 from userdata_api.utils.admin import get_user_info, patch_user_info
+from userdata_api.utils.auth import CachedUnionAuth
 
 admin = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -13,7 +13,7 @@ admin = APIRouter(prefix="/admin", tags=["Admin"])
 @admin.get("/user/{user_id}", response_model=UserCardGet)
 async def get_user_card(
     user_id: int,
-    user: dict[str, Any] = Depends(UnionAuth(scopes=["userdata.info.admin"], allow_none=False, auto_error=True)),
+    user: dict[str, Any] = Depends(CachedUnionAuth(scopes=["userdata.info.admin"], allow_none=False, auto_error=True)),
 ):
     """
     Получает профсоюзную информацию пользователя.
@@ -28,7 +28,7 @@ async def get_user_card(
 async def update_user_card(
     new_info: UserCardUpdate,
     user_id: int,
-    user: dict[str, Any] = Depends(UnionAuth(scopes=["userdata.info.admin"], allow_none=False, auto_error=True)),
+    user: dict[str, Any] = Depends(CachedUnionAuth(scopes=["userdata.info.admin"], allow_none=False, auto_error=True)),
 ) -> StatusResponseModel:
     """
     Обновить данные в профсоюзной информации пользователя.
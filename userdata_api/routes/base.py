@@ -1,9 +1,15 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_sqlalchemy import DBSessionMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from settings import get_settings
 from userdata_api import __version__
+from userdata_api.models.session import DBSessionMiddleware, dispose_engine, init_engine
+from userdata_api.utils.response import FastJSONResponse
+from userdata_api.utils.warmup import warm_up_until_ready
 
 from .admin import admin
 from .category import category
@@ -12,6 +18,22 @@ from .source import source
 from .user import user
 
 settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Пул соединений создается внутри event loop воркера, а не при импорте
+    init_engine()
+    app.state.ready = False
+    warmup = asyncio.create_task(
+        warm_up_until_ready(app.state, settings.WARMUP_DB_CONNECTIONS, settings.WARMUP_RETRY_DELAY)
+    )
+    yield
+    warmup.cancel()
+    await asyncio.gather(warmup, return_exceptions=True)
+    await dispose_engine()
+
+
 app = FastAPI(
     title='Сервис пользовательских данных',
     description='Серверная часть сервиса хранения и управления информации о пользователе',
@@ -20,14 +42,11 @@ app = FastAPI(
     root_path=settings.ROOT_PATH if __version__ != 'dev' else '',
     docs_url=None if __version__ != 'dev' else '/docs',
     redoc_url=None,
+    lifespan=lifespan,
 )
 
 
-app.add_middleware(
-    DBSessionMiddleware,
-    db_url=str(settings.DB_DSN),
-    engine_args={"pool_pre_ping": True, "isolation_level": "AUTOCOMMIT"},
-)
+app.add_middleware(DBSessionMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -42,3 +61,23 @@ app.include_router(category)
 app.include_router(param)
 app.include_router(user)
 app.include_router(admin)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    """Метрики процесса в формате Prometheus"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/live", include_in_schema=False)
+def live() -> Response:
+    """Процесс жив и обрабатывает запросы"""
+    return FastJSONResponse({"status": "ok"})
+
+
+@app.get("/ready", include_in_schema=False)
+def ready(request: Request) -> Response:
+    """Процесс прогрет и готов принимать трафик, до окончания прогрева - 503"""
+    if not getattr(request.app.state, "ready", False):
+        return FastJSONResponse({"status": "warming up"}, status_code=503)
+    return FastJSONResponse({"status": "ok"})
@@ -1,17 +1,26 @@
 from typing import Literal
 
-from auth_lib.fastapi import UnionAuth
-from fastapi import APIRouter, Depends, Query, Request
-from fastapi_sqlalchemy import db
+from fastapi import APIRouter, Depends, Query, Request, Response
 from pydantic.type_adapter import TypeAdapter
+from sqlalchemy.orm import selectinload
 
+from settings import get_settings
 from userdata_api.exceptions import AlreadyExists
 from userdata_api.models.db import Category
+from userdata_api.models.session import db
 from userdata_api.schemas.category import CategoryGet, CategoryPatch, CategoryPost
 from userdata_api.schemas.response_model import StatusResponseModel
+from userdata_api.utils.auth import CachedUnionAuth
+from userdata_api.utils.catalog import Catalog, catalog_cache
+from userdata_api.utils.response import FastJSONResponse
+from userdata_api.utils.utils import etag_matches
 
 category = APIRouter(prefix="/category", tags=["Category"])
 
+_categories_adapter = TypeAdapter(list[CategoryGet])
+# Сериализованные ответы GET /category для текущей версии справочников: (версия, с параметрами) -> тело
+_categories_bodies: dict[tuple[tuple, bool], bytes] = {}
+
 
 @category.post(
     "",
@@ -20,7 +29,9 @@ category = APIRouter(prefix="/category", tags=["Category"])
 async def create_category(
     request: Request,
     category_inp: CategoryPost,
-    _: dict[str, str] = Depends(UnionAuth(scopes=["userdata.category.create"], allow_none=False, auto_error=True)),
+    _: dict[str, str] = Depends(
+        CachedUnionAuth(scopes=["userdata.category.create"], allow_none=False, auto_error=True)
+    ),
 ) -> CategoryGet:
     """
     Создать категорию пользовательских данных. Получить категорию можно будет со скоупами, имена которых в category_inp.scopes
@@ -33,9 +44,10 @@ async def create_category(
     :param _: Аутентификация
     :return: CategoryGet
     """
-    if Category.query(session=db.session).filter(Category.name == category_inp.name).all():
+    if (await db.session.scalars(Category.select().where(Category.name == category_inp.name))).all():
         raise AlreadyExists(Category, category_inp.name)
-    category = Category.create(session=db.session, **category_inp.dict())
+    category = await Category.acreate(session=db.session, **category_inp.dict(), params=[])
+    catalog_cache.invalidate()
     return CategoryGet.model_validate(category)
 
 
@@ -48,14 +60,61 @@ async def get_category(id: int) -> CategoryGet:
     :param _: Аутентфикация
     :return: Категорию со списком скоупов, которые нужны для получения пользовательских данных этой категории
     """
-    category = Category.get(id, session=db.session)
+    category = await Category.aget(id, options=[selectinload(Category.params)], session=db.session)
     return CategoryGet.model_validate(category)
 
 
-@category.get("", response_model=list[CategoryGet], response_model_exclude_none=True)
-async def get_categories(query: list[Literal["param"]] = Query(default=[])) -> list[CategoryGet]:
+def _categories_body(catalog: Catalog, with_params: bool) -> bytes:
+    """Тело ответа `GET /category` для снимка справочников, сериализуется один раз на версию снимка"""
+    key = (catalog.version, with_params)
+    body = _categories_bodies.get(key)
+    if body is not None:
+        return body
+    result = {
+        category.id: {
+            "id": category.id,
+            "name": category.name,
+            "read_scope": category.read_scope,
+            "update_scope": category.update_scope,
+        }
+        | ({"params": []} if with_params else {})
+        for category in sorted(catalog.categories.values(), key=lambda category: category.id)
+    }
+    if with_params:
+        for param in sorted(catalog.params.values(), key=lambda param: param.id):
+            result[param.category_id]["params"].append(
+                {
+                    "id": param.id,
+                    "category_id": param.category_id,
+                    "name": param.name,
+                    "is_public": param.is_public,
+                    "visible_in_user_response": param.visible_in_user_response,
+                    "is_required": param.is_required,
+                    "changeable": param.changeable,
+                    "type": param.type,
+                    "validation": param.validation,
+                }
+            )
+    body = _categories_adapter.dump_json(_categories_adapter.validate_python(list(result.values())), exclude_none=True)
+    if any(version != catalog.version for version, _ in _categories_bodies):
+        _categories_bodies.clear()
+    _categories_bodies[key] = body
+    return body
+
+
+@category.get(
+    "",
+    response_model=list[CategoryGet],
+    response_model_exclude_none=True,
+    responses={304: {"description": "Not Modified"}},
+)
+async def get_categories(request: Request, query: list[Literal["param"]] = Query(default=[])) -> Response:
     """
     Получить все категории
+
+    Ответ собирается из кэша справочников и сериализуется один раз на версию справочников.
+    `ETag` меняется при любом изменении категорий, параметров или источников, при совпадении с `If-None-Match`
+    возвращается 304 без тела
     \f
     :param query: Лист query параметров.
     Если ничего не указано то вернет просто список категорий
@@ -63,17 +122,13 @@ async def get_categories(query: list[Literal["param"]] = Query(default=[])) -> l
     :param _: Аутентифиуация
     :return: Список категорий. В каждой ноде списка - информация о скоупах, которые нужны для получения пользовательских данных этой категории
     """
-    result = []
-    for category in Category.query(session=db.session).all():
-        to_append = category.dict()
-        if "param" in query:
-            to_append["params"] = []
-            for param in category.params:
-                to_append["params"].append(param.dict())
-        result.append(to_append)
-
-    type_adapter = TypeAdapter(list[CategoryGet])
-    return type_adapter.validate_python(result)
+    catalog = await catalog_cache.aget(db.session)
+    with_params = "param" in query
+    etag = f'"{catalog.etag}-{int(with_params)}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={get_settings().CATALOG_HTTP_MAX_AGE}, must-revalidate"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(_categories_body(catalog, with_params), headers=headers)
 
 
 @category.patch("/{id}", response_model=CategoryGet)
@@ -81,7 +136,9 @@ async def patch_category(
     request: Request,
     id: int,
     category_inp: CategoryPatch,
-    _: dict[str, str] = Depends(UnionAuth(scopes=["userdata.category.update"], allow_none=False, auto_error=True)),
+    _: dict[str, str] = Depends(
+        CachedUnionAuth(scopes=["userdata.category.update"], allow_none=False, auto_error=True)
+    ),
 ) -> CategoryGet:
     """
     Обновить категорию
@@ -94,15 +151,19 @@ async def patch_category(
     :param _: Аутентификация
     :return: CategoryGet - обновленную категорию
     """
-    category: Category = Category.get(id, session=db.session)
-    return CategoryGet.model_validate(Category.update(id, session=db.session, **category_inp.dict(exclude_unset=True)))
+    category: Category = await Category.aget(id, options=[selectinload(Category.params)], session=db.session)
+    category = await Category.aupdate(id, session=db.session, **category_inp.dict(exclude_unset=True))
+    catalog_cache.invalidate()
+    return CategoryGet.model_validate(category)
 
 
 @category.delete("/{id}", response_model=StatusResponseModel)
 async def delete_category(
     request: Request,
     id: int,
-    _: dict[str, str] = Depends(UnionAuth(scopes=["userdata.category.delete"], allow_none=False, auto_error=True)),
+    _: dict[str, str] = Depends(
+        CachedUnionAuth(scopes=["userdata.category.delete"], allow_none=False, auto_error=True)
+    ),
 ) -> StatusResponseModel:
     """
     Удалить категорию
@@ -114,6 +175,7 @@ async def delete_category(
     :param _: Аутентификация
     :return: None
     """
-    _: Category = Category.get(id, session=db.session)
-    Category.delete(id, session=db.session)
+    _: Category = await Category.aget(id, session=db.session)
+    await Category.adelete(id, session=db.session)
+    catalog_cache.invalidate()
     return StatusResponseModel(status="Success", message="Category deleted", ru="Категория удалена")
@@ -1,26 +1,30 @@
-from re import compile
 from re import error as ReError
 from typing import Any
 
-from auth_lib.fastapi import UnionAuth
 from fastapi import APIRouter, Depends, Request
-from fastapi_sqlalchemy import db
 from pydantic.type_adapter import TypeAdapter
 
 from userdata_api.exceptions import AlreadyExists, InvalidRegex, ObjectNotFound
 from userdata_api.models.db import Category, Param
+from userdata_api.models.session import db
 from userdata_api.schemas.param import ParamGet, ParamPatch, ParamPost
 from userdata_api.schemas.response_model import StatusResponseModel
+from userdata_api.utils.auth import CachedUnionAuth
+from userdata_api.utils.catalog import catalog_cache
+from userdata_api.utils.response import FastJSONResponse
+from userdata_api.utils.validation import UnsafeRegex, check_pattern, validators
 
 param = APIRouter(prefix="/category/{category_id}/param", tags=["Param"])
 
+_params_adapter = TypeAdapter(list[ParamGet])
+
 
 @param.post("", response_model=ParamGet)
 async def create_param(
     request: Request,
     category_id: int,
     param_inp: ParamPost,
-    _: dict[str, Any] = Depends(UnionAuth(scopes=["userdata.param.create"], allow_none=False, auto_error=True)),
+    _: dict[str, Any] = Depends(CachedUnionAuth(scopes=["userdata.param.create"], allow_none=False, auto_error=True)),
 ) -> ParamGet:
     """
     Создать поле внутри категории. Ответ на пользовательские данные будет такой {..., category: {...,param: '', ...}}
@@ -33,15 +37,20 @@ async def create_param(
     :param _: Аутентификация
     :return: ParamGet - созданный параметр
     """
-    Category.get(category_id, session=db.session)
-    if Param.query(session=db.session).filter(Param.category_id == category_id, Param.name == param_inp.name).all():
+    await Category.aget(category_id, session=db.session)
+    if (
+        await db.session.scalars(Param.select().where(Param.category_id == category_id, Param.name == param_inp.name))
+    ).all():
         raise AlreadyExists(Param, param_inp.name)
     if param_inp.validation:
         try:
-            compile(param_inp.validation)
-        except ReError:
+            check_pattern(param_inp.validation)
+        except (ReError, UnsafeRegex):
             raise InvalidRegex(Param, "validation")
-    return ParamGet.model_validate(Param.create(session=db.session, **param_inp.dict(), category_id=category_id))
+    res = await Param.acreate(session=db.session, **param_inp.dict(), category_id=category_id)
+    validators.compile(res.id, res.validation)
+    catalog_cache.invalidate()
+    return ParamGet.model_validate(res)
 
 
 @param.get("/{id}", response_model=ParamGet)
@@ -53,22 +62,22 @@ async def get_param(id: int, category_id: int) -> ParamGet:
     :param category_id: айди категории в которой этот параметр находиится
     :return: ParamGet - полученный параметр
     """
-    res = Param.query(session=db.session).filter(Param.id == id, Param.category_id == category_id).one_or_none()
+    res = await db.session.scalar(Param.select().where(Param.id == id, Param.category_id == category_id))
     if not res:
         raise ObjectNotFound(Param, id)
     return ParamGet.model_validate(res)
 
 
 @param.get("", response_model=list[ParamGet])
-async def get_params(category_id: int) -> list[ParamGet]:
+async def get_params(category_id: int) -> FastJSONResponse:
     """
     Получить все параметры категории
     \f
     :param category_id: Айди категории
     :return: list[ParamGet] - список полученных параметров
     """
-    type_adapter = TypeAdapter(list[ParamGet])
-    return type_adapter.validate_python(Param.query(session=db.session).filter(Param.category_id == category_id).all())
+    params = (await db.session.scalars(Param.select().where(Param.category_id == category_id))).all()
+    return FastJSONResponse(_params_adapter.dump_json(_params_adapter.validate_python(params)))
 
 
 @param.patch("/{id}", response_model=ParamGet)
@@ -77,7 +86,7 @@ async def patch_param(
     id: int,
     category_id: int,
     param_inp: ParamPatch,
-    _: dict[str, Any] = Depends(UnionAuth(scopes=["userdata.param.update"], allow_none=False, auto_error=True)),
+    _: dict[str, Any] = Depends(CachedUnionAuth(scopes=["userdata.param.update"], allow_none=False, auto_error=True)),
 ) -> ParamGet:
     """
     Обновить параметр внутри категории
@@ -92,17 +101,19 @@ async def patch_param(
     :return: ParamGet - Обновленный параметр
     """
     if category_id:
-        Category.get(category_id, session=db.session)
+        await Category.aget(category_id, session=db.session)
     if param_inp.validation:
         try:
-            compile(param_inp.validation)
-        except ReError:
+            check_pattern(param_inp.validation)
+        except (ReError, UnsafeRegex):
             raise InvalidRegex(Param, "validation")
     if category_id:
-        return ParamGet.from_orm(
-            Param.update(id, session=db.session, **param_inp.dict(exclude_unset=True), category_id=category_id)
-        )
-    return ParamGet.model_validate(Param.update(id, session=db.session, **param_inp.dict(exclude_unset=True)))
+        res = await Param.aupdate(id, session=db.session, **param_inp.dict(exclude_unset=True), category_id=category_id)
+    else:
+        res = await Param.aupdate(id, session=db.session, **param_inp.dict(exclude_unset=True))
+    validators.compile(res.id, res.validation)
+    catalog_cache.invalidate()
+    return ParamGet.model_validate(res)
 
 
 @param.delete("/{id}", response_model=StatusResponseModel)
@@ -110,7 +121,7 @@ async def delete_param(
     request: Request,
     id: int,
     category_id: int,
-    _: dict[str, Any] = Depends(UnionAuth(scopes=["userdata.param.delete"], allow_none=False, auto_error=True)),
+    _: dict[str, Any] = Depends(CachedUnionAuth(scopes=["userdata.param.delete"], allow_none=False, auto_error=True)),
 ) -> StatusResponseModel:
     """
     Удалить параметр внутри категории
@@ -123,9 +134,10 @@ async def delete_param(
     :param _: Аутентификация
     :return: None
     """
-    res: Param = Param.query(session=db.session).filter(Param.id == id, Param.category_id == category_id).one_or_none()
+    res: Param = await db.session.scalar(Param.select().where(Param.id == id, Param.category_id == category_id))
     if not res:
         raise ObjectNotFound(Param, id)
     res.is_deleted = True
-    db.session.commit()
+    await db.session.commit()
+    catalog_cache.invalidate()
     return StatusResponseModel(status="Success", message="Param deleted", ru="Параметр удален")
@@ -1,23 +1,27 @@
 from typing import Any
 
-from auth_lib.fastapi import UnionAuth
 from fastapi import APIRouter, Depends, Request
-from fastapi_sqlalchemy import db
 from pydantic.type_adapter import TypeAdapter
 
 from userdata_api.exceptions import AlreadyExists
 from userdata_api.models.db import Source
+from userdata_api.models.session import db
 from userdata_api.schemas.response_model import StatusResponseModel
 from userdata_api.schemas.source import SourceGet, SourcePatch, SourcePost
+from userdata_api.utils.auth import CachedUnionAuth
+from userdata_api.utils.catalog import catalog_cache
+from userdata_api.utils.response import FastJSONResponse
 
 source = APIRouter(prefix="/source", tags=["Source"])
 
+_sources_adapter = TypeAdapter(list[SourceGet])
+
 
 @source.post("", response_model=SourceGet)
 async def create_source(
     request: Request,
     source_inp: SourcePost,
-    _: dict[str, Any] = Depends(UnionAuth(scopes=["userdata.source.create"], allow_none=False, auto_error=True)),
+    _: dict[str, Any] = Depends(CachedUnionAuth(scopes=["userdata.source.create"], allow_none=False, auto_error=True)),
 ) -> SourceGet:
     """
     Создать источник данных
@@ -29,10 +33,12 @@ async def create_source(
     :param _: Аутентификация
     :return: SourceGet - созданный источник
     """
-    source = Source.query(session=db.session).filter(Source.name == source_inp.name).all()
+    source = (await db.session.scalars(Source.select().where(Source.name == source_inp.name))).all()
     if source:
         raise AlreadyExists(Source, source_inp.name)
-    return SourceGet.model_validate(Source.create(session=db.session, **source_inp.dict()))
+    source = await Source.acreate(session=db.session, **source_inp.dict())
+    catalog_cache.invalidate()
+    return SourceGet.model_validate(source)
 
 
 @source.get("/{id}", response_model=SourceGet)
@@ -43,18 +49,18 @@ async def get_source(id: int) -> SourceGet:
     :param id: Айди источника
     :return: SourceGet - полученный источник
     """
-    return SourceGet.model_validate(Source.get(id, session=db.session))
+    return SourceGet.model_validate(await Source.aget(id, session=db.session))
 
 
 @source.get("", response_model=list[SourceGet])
-async def get_sources() -> list[SourceGet]:
+async def get_sources() -> FastJSONResponse:
     """
     Получить все источники данных
     \f
     :return: list[SourceGet] - список источников данных
     """
-    type_adapter = TypeAdapter(list[SourceGet])
-    return type_adapter.validate_python(Source.query(session=db.session).all())
+    sources = (await db.session.scalars(Source.select())).all()
+    return FastJSONResponse(_sources_adapter.dump_json(_sources_adapter.validate_python(sources)))
 
 
 @source.patch("/{id}", response_model=SourceGet)
@@ -62,7 +68,7 @@ async def patch_source(
     request: Request,
     id: int,
     source_inp: SourcePatch,
-    _: dict[str, Any] = Depends(UnionAuth(scopes=["userdata.source.update"], allow_none=False, auto_error=True)),
+    _: dict[str, Any] = Depends(CachedUnionAuth(scopes=["userdata.source.update"], allow_none=False, auto_error=True)),
 ) -> SourceGet:
     """
     Обновить источник данных
@@ -75,14 +81,16 @@ async def patch_source(
     :param _: Аутентификация
     :return: SourceGet - обновленный источник данных
     """
-    return SourceGet.model_validate(Source.update(id, session=db.session, **source_inp.dict(exclude_unset=True)))
+    source = await Source.aupdate(id, session=db.session, **source_inp.dict(exclude_unset=True))
+    catalog_cache.invalidate()
+    return SourceGet.model_validate(source)
 
 
 @source.delete("/{id}", response_model=StatusResponseModel)
 async def delete_source(
     request: Request,
     id: int,
-    _: dict[str, Any] = Depends(UnionAuth(scopes=["userdata.source.delete"], allow_none=False, auto_error=True)),
+    _: dict[str, Any] = Depends(CachedUnionAuth(scopes=["userdata.source.delete"], allow_none=False, auto_error=True)),
 ) -> StatusResponseModel:
     """
     Удалить источник данных
@@ -94,5 +102,6 @@ async def delete_source(
     :param _: Аутентфиикация
     :return: None
     """
-    Source.delete(id, session=db.session)
+    await Source.adelete(id, session=db.session)
+    catalog_cache.invalidate()
     return StatusResponseModel(status="Success", message="Source deleted", ru="Источник удален")
@@ -1,24 +1,54 @@
+from collections.abc import AsyncIterator
 from typing import Any
 
-from auth_lib.fastapi import UnionAuth
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 
 from userdata_api.schemas.response_model import StatusResponseModel
-from userdata_api.schemas.user import UserInfoGet, UserInfoUpdate, UsersInfoGet
+from userdata_api.schemas.user import UserInfoGet, UserInfoUpdate, UsersInfoGet, UsersInfoPage, UsersInfoQuery
+from userdata_api.utils.auth import CachedUnionAuth
+from userdata_api.utils.response import FastJSONResponse, ndjson_lines
 from userdata_api.utils.user import get_user_info as get
+from userdata_api.utils.user import get_user_info_etag as get_etag
 from userdata_api.utils.user import get_users_info_batch as get_users
+from userdata_api.utils.user import get_users_info_page as get_users_page
 from userdata_api.utils.user import patch_user_info as patch
+from userdata_api.utils.user import stream_users_info as stream_users
+from userdata_api.utils.utils import etag_matches
 
 user = APIRouter(prefix="/user", tags=["User"])
 
+NDJSON = "application/x-ndjson"
 
-@user.get("/{id}", response_model=UserInfoGet)
+
+# Должна быть зарегистрирована раньше POST /user/{id}, иначе путь /user/query уйдет туда
+@user.post("/query", response_model=UsersInfoPage)
+async def query_users_info(
+    query: UsersInfoQuery,
+    user: dict[str, Any] = Depends(CachedUnionAuth(scopes=["userdata.info.admin"], allow_none=False, auto_error=True)),
+) -> FastJSONResponse:
+    """
+    Получить информацию о пользователях постранично, списки передаются в теле запроса.
+
+    Для получения следующей страницы повторить запрос с тем же телом и `cursor` из `next_cursor` ответа.
+    Последняя страница возвращает `next_cursor: null`
+    \f
+    :param query: Списки пользователей, категорий, невидимых по умолчанию параметров, размер страницы и токен
+    :return: Данные о пользователях страницы и токен следующей страницы
+    """
+    return FastJSONResponse(await get_users_page(query, user))
+
+
+@user.get("/{id}", response_model=UserInfoGet, responses={304: {"description": "Not Modified"}})
 async def get_user_info(
     id: int,
-    user: dict[str, Any] = Depends(UnionAuth(scopes=[], allow_none=False, auto_error=True)),
-) -> UserInfoGet:
+    request: Request,
+    user: dict[str, Any] = Depends(CachedUnionAuth(scopes=[], allow_none=False, auto_error=True)),
+) -> Response:
     """
     Получить информацию о пользователе
+
+    Ответ содержит `ETag`, при совпадении с `If-None-Match` возвращается 304 без тела
     \f
     :param id: Айди овнера информации(пользователя)
     :additional_data: список невидимых по дефолту параметров
@@ -33,14 +63,18 @@ async def get_user_info(
     }
     """
 
-    return UserInfoGet.model_validate(await get(id, user))
+    etag = await get_etag(id, user)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(await get(id, user), headers=headers)
 
 
 @user.post("/{id}", response_model=StatusResponseModel)
 async def update_user(
     new_info: UserInfoUpdate,
     id: int,
-    user: dict[str, Any] = Depends(UnionAuth(scopes=[], allow_none=False, auto_error=True)),
+    user: dict[str, Any] = Depends(CachedUnionAuth(scopes=[], allow_none=False, auto_error=True)),
 ) -> StatusResponseModel:
     """
     Обновить информацию о пользователе.
@@ -69,17 +103,34 @@ async def update_user(
     return StatusResponseModel(status="Success", message="User patch succeeded", ru="Изменение успешно")
 
 
-@user.get("", response_model=UsersInfoGet, response_model_exclude_unset=True)
+@user.get(
+    "",
+    response_model=UsersInfoGet,
+    response_model_exclude_unset=True,
+    responses={200: {"content": {NDJSON: {}}}},
+)
 async def get_users_info(
+    request: Request,
     users: list[int] = Query(),
     categories: list[int] = Query(),
-    user: dict[str, Any] = Depends(UnionAuth(scopes=["userdata.info.admin"], allow_none=False, auto_error=True)),
+    user: dict[str, Any] = Depends(CachedUnionAuth(scopes=["userdata.info.admin"], allow_none=False, auto_error=True)),
     additional_data: list[int] = Query(default=[]),
-) -> UsersInfoGet:
+) -> FastJSONResponse | StreamingResponse:
     """
     Получить информацию о пользователях.
+
+    С заголовком `Accept: application/x-ndjson` ответ отдается потоком, по одному объекту `ExtendedUserInfo` на строку
+    \f
     :param users: список id юзеров, про которых нужно вернуть информацию
     :param categories: список id категорий, параметры которых нужно вернуть
     :return: список данных о пользователях и данных категориях
     """
-    return UsersInfoGet.model_validate(await get_users(users, categories, user, additional_data))
+    if NDJSON in request.headers.get("accept", ""):
+        chunks = await stream_users(users, categories, user, additional_data)
+        return StreamingResponse(_ndjson(chunks), media_type=NDJSON)
+    return FastJSONResponse(await get_users(users, categories, user, additional_data))
+
+
+async def _ndjson(chunks: AsyncIterator[list[dict[str, Any]]]) -> AsyncIterator[bytes]:
+    async for items in chunks:
+        yield ndjson_lines(items)
@@ -1,4 +1,8 @@
-from pydantic import constr, field_validator
+import base64
+import binascii
+import json
+
+from pydantic import conint, constr, field_validator
 
 from .base import Base
 
@@ -34,3 +38,37 @@ class UsersInfoGet(Base):
 
 class UserInfoUpdate(UserInfoGet):
     source: constr(min_length=1)
+
+
+def encode_cursor(owner_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"owner_id": owner_id}).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """Айди последнего пользователя предыдущей страницы из токена продолжения"""
+    try:
+        owner_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))["owner_id"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(owner_id, int):
+        raise ValueError("Invalid cursor")
+    return owner_id
+
+
+class UsersInfoQuery(Base):
+    users: list[int]
+    categories: list[int]
+    additional_data: list[int] = []
+    limit: conint(ge=1, le=1000) = 100
+    cursor: str | None = None
+
+    @field_validator("cursor")
+    @classmethod
+    def cursor_validator(cls, v):
+        if v is not None:
+            decode_cursor(v)
+        return v
+
+
+class UsersInfoPage(UsersInfoGet):
+    next_cursor: str | None = None
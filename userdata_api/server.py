@@ -0,0 +1,74 @@
+"""
+Запуск АПИ: один процесс uvicorn или `API_WORKERS` процессов uvicorn под управлением gunicorn.
+
+Пулы соединений с БД создаются в lifespan приложения, то есть в каждом процессе после fork,
+поэтому приложение можно импортировать заранее в главном процессе (`API_PRELOAD`)
+"""
+
+from typing import Any
+
+import uvicorn
+
+from settings import Settings, get_settings
+
+
+def uvicorn_options(settings: Settings) -> dict[str, Any]:
+    """Настройки сервера uvicorn, общие для запуска одним процессом и процессами gunicorn"""
+    return {
+        "loop": settings.API_LOOP,
+        "http": settings.API_HTTP,
+        "backlog": settings.API_BACKLOG,
+        "timeout_keep_alive": settings.API_KEEPALIVE,
+        "limit_concurrency": settings.API_LIMIT_CONCURRENCY,
+    }
+
+
+def gunicorn_options(settings: Settings) -> dict[str, Any]:
+    """Настройки gunicorn. Keep-alive и очередь соединений gunicorn сам передает в uvicorn"""
+    options = {
+        "bind": f"{settings.API_HOST}:{settings.API_PORT}",
+        "workers": settings.API_WORKERS,
+        "preload_app": settings.API_PRELOAD,
+        "backlog": settings.API_BACKLOG,
+        "keepalive": settings.API_KEEPALIVE,
+    }
+    if settings.API_LOG_CONFIG:
+        options["logconfig"] = settings.API_LOG_CONFIG
+    return options
+
+
+def _worker_class(settings: Settings) -> type:
+    from uvicorn_worker import UvicornWorker
+
+    options = uvicorn_options(settings)
+    # Эти настройки процесс получает от gunicorn
+    del options["backlog"], options["timeout_keep_alive"]
+    return type("UserdataUvicornWorker", (UvicornWorker,), {"CONFIG_KWARGS": options})
+
+
+def _run_gunicorn(settings: Settings) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in gunicorn_options(settings).items():
+                self.cfg.set(key, value)
+            self.cfg.set("worker_class", _worker_class(settings))
+
+        def load(self):
+            from userdata_api.routes.base import app
+
+            return app
+
+    Application().run()
+
+
+def run(settings: Settings | None = None) -> None:
+    settings = settings or get_settings()
+    if settings.API_WORKERS > 1:
+        _run_gunicorn(settings)
+        return
+    from userdata_api.routes.base import app
+
+    log_config = {"log_config": settings.API_LOG_CONFIG} if settings.API_LOG_CONFIG else {}
+    uvicorn.run(app, host=settings.API_HOST, port=settings.API_PORT, **uvicorn_options(settings), **log_config)
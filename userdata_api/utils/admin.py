@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from fastapi_sqlalchemy import db
+from sqlalchemy import select
 
 from userdata_api.exceptions import ObjectNotFound
 from userdata_api.models.db import Info, Param, Source
+from userdata_api.models.session import db
 from userdata_api.schemas.admin import UserCardGet, UserCardUpdate
 from userdata_api.schemas.user import UserInfo, UserInfoUpdate
 
@@ -49,44 +50,44 @@ async def get_user_info(user_id: int, user: dict[str, int | list[dict[str, str |
         - is_union_member: Статус мэтчинга (из параметра "Членство в профсоюзе")
         - last_check_timestamp: Дата последней проверки
     """
-    users = db.session.query(Info).filter(Info.owner_id == user_id).first()
+    users = await db.session.scalar(select(Info).where(Info.owner_id == user_id).limit(1))
     if not users:
         raise ObjectNotFound(Info, user_id)
-    full_name = (
-        db.session.query(Info)
+    full_name = await db.session.scalar(
+        select(Info)
         .join(Info.param)
         .join(Info.source)
-        .filter(Info.owner_id == user_id, Param.name == "Полное имя")
+        .where(Info.owner_id == user_id, Param.name == "Полное имя")
         .order_by(Source.trust_level.desc())
         .order_by(Info.create_ts.desc())
-        .first()
+        .limit(1)
     )
-    is_union_member = (
-        db.session.query(Info)
+    is_union_member = await db.session.scalar(
+        select(Info)
         .join(Info.param)
         .join(Info.source)
-        .filter(Info.owner_id == user_id, Param.name == "Членство в профсоюзе")
+        .where(Info.owner_id == user_id, Param.name == "Членство в профсоюзе")
         .order_by(Source.trust_level.desc())
         .order_by(Info.create_ts.desc())
-        .first()
+        .limit(1)
     )
-    student_card_number = (
-        db.session.query(Info)
+    student_card_number = await db.session.scalar(
+        select(Info)
         .join(Info.param)
         .join(Info.source)
-        .filter(Info.owner_id == user_id, Param.name == "Номер студенческого билета")
+        .where(Info.owner_id == user_id, Param.name == "Номер студенческого билета")
         .order_by(Source.trust_level.desc())
         .order_by(Info.create_ts.desc())
-        .first()
+        .limit(1)
     )
-    union_card_number = (
-        db.session.query(Info)
+    union_card_number = await db.session.scalar(
+        select(Info)
         .join(Info.param)
         .join(Info.source)
-        .filter(Info.owner_id == user_id, Param.name == "Номер профсоюзного билета")
+        .where(Info.owner_id == user_id, Param.name == "Номер профсоюзного билета")
         .order_by(Source.trust_level.desc())
         .order_by(Info.create_ts.desc())
-        .first()
+        .limit(1)
     )
     result = {
         "user_id": user_id,
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any
+from urllib.parse import urljoin
+
+import requests
+from auth_lib.fastapi import UnionAuth
+
+from settings import get_settings
+from userdata_api.metrics import AUTH_CACHE
+
+logger = logging.getLogger(__name__)
+
+
+class SessionCache:
+    """
+    Ограниченный LRU кэш сессий по токену с временем жизни записей.
+
+    Хранится только то, что нужно ручкам: `id` и `session_scopes`. Невалидные токены тоже запоминаются,
+    но на более короткое время `negative_ttl`. Ключ - хэш токена, сами токены в памяти не хранятся.
+    Зависимости FastAPI без `async` выполняются в пуле потоков, поэтому доступ под блокировкой
+    """
+
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._items: OrderedDict[str, tuple[float, dict[str, Any] | None]] = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def key(auth_url: str, token: str) -> str:
+        return hashlib.sha256(f"{auth_url}\0{token}".encode()).hexdigest()
+
+    def get(self, key: str) -> tuple[bool, dict[str, Any] | None]:
+        """Вернуть (найдено ли, сессия или None для невалидного токена)"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return False, None
+            expires, session = item
+            if expires <= monotonic():
+                del self._items[key]
+                return False, None
+            self._items.move_to_end(key)
+        return True, session
+
+    def put(self, key: str, session: dict[str, Any] | None) -> dict[str, Any] | None:
+        """Запомнить сессию, вернуть ее в том виде, в котором она хранится в кэше"""
+        if session is not None:
+            session = {"id": session["id"], "session_scopes": session["session_scopes"]}
+        ttl = self.ttl if session is not None else self.negative_ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return session
+        with self._lock:
+            self._items[key] = (monotonic() + ttl, session)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return session
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+settings = get_settings()
+session_cache = SessionCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL, settings.AUTH_CACHE_NEGATIVE_TTL)
+
+
+# Ответы сервиса авторизации, которые однозначно означают невалидный токен. Остальные ошибки (5xx, 429)
+# говорят о недоступности сервиса, а не о токене, и не кэшируются
+INVALID_TOKEN_STATUSES = (401, 403)
+
+
+class CachedUnionAuth(UnionAuth):
+    """
+    `UnionAuth`, который не ходит в сервис авторизации за каждым запросом с тем же токеном.
+
+    Права проверяются по закэшированной сессии при каждом запросе, поэтому изменения прав
+    и отзыв токена становятся видны не позже, чем через `AUTH_CACHE_TTL` секунд.
+    Пока сервис авторизации отвечает ошибкой или не отвечает за `AUTH_TIMEOUT` секунд,
+    запросы отклоняются, но ответ не кэшируется
+    """
+
+    def _check_token(self, token: str) -> tuple[bool, dict[str, Any] | None]:
+        """Запросить сессию в сервисе авторизации, вернуть (можно ли кэшировать ответ, сессия или None)"""
+        try:
+            response = requests.get(
+                urljoin(self.auth_url, "me"),
+                headers={"Authorization": token},
+                params={"info": ["session_scopes"]},
+                timeout=settings.AUTH_TIMEOUT,
+            )
+        except requests.RequestException as e:
+            # Таймаут или обрыв соединения говорят о недоступности сервиса, а не о токене
+            logger.warning(f"Auth service is unavailable: {e}")
+            return False, None
+        if response.ok:
+            return True, response.json()
+        return response.status_code in INVALID_TOKEN_STATUSES, None
+
+    def _get_session(self, token: str | None) -> dict[str, Any] | None:
+        if not token:
+            return super()._get_session(token)
+        key = session_cache.key(self.auth_url, token)
+        found, session = session_cache.get(key)
+        if found:
+            AUTH_CACHE.labels(result="hit" if session is not None else "negative_hit").inc()
+        else:
+            AUTH_CACHE.labels(result="miss").inc()
+            cacheable, session = self._check_token(token)
+            if cacheable:
+                session = session_cache.put(key, session)
+            else:
+                AUTH_CACHE.labels(result="unavailable").inc()
+                return None
+        # Вызывающий код дописывает в сессию свои поля, кэш от этого не должен меняться
+        return dict(session) if session is not None else None
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import hashlib
+from collections.abc import Collection
+from dataclasses import dataclass, field
+from datetime import datetime
+from time import monotonic
+
+from sqlalchemy import Select, func, not_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from settings import get_settings
+from userdata_api.models.db import Category, Param, Source, ViewType
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogCategory:
+    id: int
+    name: str
+    read_scope: str | None
+    update_scope: str | None
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogParam:
+    id: int
+    name: str
+    category: CatalogCategory
+    type: ViewType
+    validation: str | None
+    changeable: bool
+    is_required: bool
+    is_public: bool
+    visible_in_user_response: bool
+    modify_ts: datetime
+
+    @property
+    def category_id(self) -> int:
+        return self.category.id
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogSource:
+    id: int
+    name: str
+    trust_level: int
+
+
+@dataclass(frozen=True, slots=True)
+class Catalog:
+    """
+    Снимок справочников: неудаленные категории, параметры и источники.
+
+    `version` - отпечаток таблиц справочников в базе, меняется при любом изменении категорий, параметров или источников
+    """
+
+    version: tuple
+    categories: dict[int, CatalogCategory]
+    params: dict[int, CatalogParam]
+    sources: dict[str, CatalogSource]
+    _params_by_name: dict[tuple[str, str], CatalogParam] = field(repr=False)
+
+    @property
+    def etag(self) -> str:
+        return hashlib.md5(repr(self.version).encode()).hexdigest()
+
+    def param(self, category_name: str, param_name: str) -> CatalogParam | None:
+        return self._params_by_name.get((category_name, param_name))
+
+    def covers(self, sources: Collection[str] = (), params: Collection[tuple[str, str]] = ()) -> bool:
+        """Есть ли в снимке все источники и параметры (категория, параметр) с такими названиями"""
+        return all(name in self.sources for name in sources) and all(key in self._params_by_name for key in params)
+
+    def trust_levels(self) -> dict[int, int]:
+        return {source.id: source.trust_level for source in self.sources.values()}
+
+
+def _version_stmt() -> Select:
+    columns = []
+    for model in (Category, Param, Source):
+        columns.append(select(func.max(model.modify_ts)).scalar_subquery())
+        columns.append(select(func.count()).select_from(model).scalar_subquery())
+    return select(*columns)
+
+
+def _load_stmts() -> tuple[Select, Select, Select]:
+    return (
+        select(Category.id, Category.name, Category.read_scope, Category.update_scope).where(not_(Category.is_deleted)),
+        select(
+            Param.id,
+            Param.name,
+            Param.category_id,
+            Param.type,
+            Param.validation,
+            Param.changeable,
+            Param.is_required,
+            Param.is_public,
+            Param.visible_in_user_response,
+            Param.modify_ts,
+        ).where(not_(Param.is_deleted)),
+        select(Source.id, Source.name, Source.trust_level).where(not_(Source.is_deleted)),
+    )
+
+
+def _build(version: tuple, category_rows: list, param_rows: list, source_rows: list) -> Catalog:
+    categories = {row["id"]: CatalogCategory(**row) for row in category_rows}
+    params = {}
+    for row in param_rows:
+        row = dict(row)
+        category = categories.get(row.pop("category_id"))
+        if category is not None:
+            params[row["id"]] = CatalogParam(**row, category=category)
+    return Catalog(
+        version=version,
+        categories=categories,
+        params=params,
+        sources={row["name"]: CatalogSource(**row) for row in source_rows},
+        _params_by_name={(param.category.name, param.name): param for param in params.values()},
+    )
+
+
+class CatalogCache:
+    """
+    Кэш справочников в памяти процесса.
+
+    Не чаще, чем раз в `ttl` секунд, сверяет отпечаток таблиц справочников с базой
+    и перечитывает их, только если отпечаток изменился. CRUD ручки вызывают `invalidate()`,
+    чтобы изменения в этом процессе были видны сразу. Другие процессы увидят изменения не позже, чем через `ttl`,
+    а новые названия - сразу: при промахе по названию `get` сверяется с базой вне очереди.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._snapshot: Catalog | None = None
+        self._checked_at: float = float("-inf")
+
+    def invalidate(self) -> None:
+        self._checked_at = float("-inf")
+
+    def _fresh(self) -> bool:
+        return self._snapshot is not None and monotonic() - self._checked_at < self.ttl
+
+    def _update(self, version: tuple) -> bool:
+        """Запомнить время сверки, вернуть True, если снимок нужно перечитать"""
+        self._checked_at = monotonic()
+        return self._snapshot is None or self._snapshot.version != version
+
+    def _get(self, session: Session) -> Catalog:
+        if self._fresh():
+            return self._snapshot
+        version = tuple(session.execute(_version_stmt()).one())
+        if self._update(version):
+            self._snapshot = _build(version, *(session.execute(stmt).mappings().all() for stmt in _load_stmts()))
+        return self._snapshot
+
+    async def _aget(self, session: AsyncSession) -> Catalog:
+        if self._fresh():
+            return self._snapshot
+        version = tuple((await session.execute(_version_stmt())).one())
+        if self._update(version):
+            self._snapshot = _build(
+                version, *[(await session.execute(stmt)).mappings().all() for stmt in _load_stmts()]
+            )
+        return self._snapshot
+
+    def get(
+        self, session: Session, *, sources: Collection[str] = (), params: Collection[tuple[str, str]] = ()
+    ) -> Catalog:
+        """
+        Снимок справочников. Если в нем нет какого-то из названий `sources` или `params`, кэш сверяется с базой сразу,
+        не дожидаясь `ttl`: источник или параметр могли только что создать в другом процессе
+        """
+        catalog = self._get(session)
+        if not catalog.covers(sources, params):
+            self.invalidate()
+            catalog = self._get(session)
+        return catalog
+
+    async def aget(
+        self, session: AsyncSession, *, sources: Collection[str] = (), params: Collection[tuple[str, str]] = ()
+    ) -> Catalog:
+        """Асинхронная версия `get`"""
+        catalog = await self._aget(session)
+        if not catalog.covers(sources, params):
+            self.invalidate()
+            catalog = await self._aget(session)
+        return catalog
+
+
+catalog_cache = CatalogCache(ttl=get_settings().CATALOG_CACHE_TTL)
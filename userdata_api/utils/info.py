@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from datetime import datetime
+
+from sqlalchemy import Insert, Update, not_, update
+from sqlalchemy.dialects.postgresql import insert
+
+from userdata_api.models.db import Info
+
+
+def upsert_info_stmt(owner_id: int, source_id: int, values: dict[int, str], *, overwrite: bool = True) -> Insert:
+    """
+    Записать значения параметров пользователя от источника одним запросом `INSERT ... ON CONFLICT`.
+
+    Опирается на частичный уникальный индекс `uq_info_owner_id_param_id_source_id`: если у источника уже есть
+    неудаленное значение параметра, оно обновляется (строка не переписывается, если значение не изменилось),
+    при `overwrite=False` существующее значение остается как есть
+
+    :param values: айди параметра -> новое значение
+    """
+    now = datetime.utcnow()
+    stmt = insert(Info).values(
+        [
+            {
+                "owner_id": owner_id,
+                "param_id": param_id,
+                "source_id": source_id,
+                "value": value,
+                "create_ts": now,
+                "modify_ts": now,
+            }
+            for param_id, value in values.items()
+        ]
+    )
+    return on_conflict_upsert(stmt, overwrite=overwrite)
+
+
+def on_conflict_upsert(stmt: Insert, *, overwrite: bool = True) -> Insert:
+    """
+    Добавить к вставке в `Info` обработку конфликта по частичному уникальному индексу
+    `uq_info_owner_id_param_id_source_id`, подходит и для `INSERT ... VALUES`, и для `INSERT ... SELECT`
+    """
+    conflict = {
+        "index_elements": [Info.owner_id, Info.param_id, Info.source_id],
+        "index_where": not_(Info.is_deleted),
+    }
+    if not overwrite:
+        return stmt.on_conflict_do_nothing(**conflict)
+    return stmt.on_conflict_do_update(
+        **conflict,
+        set_={"value": stmt.excluded.value, "modify_ts": stmt.excluded.modify_ts},
+        where=Info.value.is_distinct_from(stmt.excluded.value),
+    )
+
+
+def delete_info_stmt(owner_id: int, source_id: int, param_ids: Iterable[int]) -> Update:
+    """Мягко удалить неудаленные значения параметров пользователя от источника"""
+    return (
+        update(Info)
+        .where(
+            Info.owner_id == owner_id,
+            Info.source_id == source_id,
+            Info.param_id.in_(list(param_ids)),
+            not_(Info.is_deleted),
+        )
+        .values(is_deleted=True)
+    )
@@ -0,0 +1,26 @@
+from typing import Any
+
+import orjson
+from starlette.responses import Response
+
+
+class FastJSONResponse(Response):
+    """
+    JSON ответ из уже проверенных данных: собранные нами словари и списки сериализуются orjson сразу в байты,
+    готовые байты (например, из `TypeAdapter.dump_json`) отдаются как есть.
+
+    Если ручка возвращает `Response`, FastAPI не проверяет результат через `response_model`,
+    поэтому `response_model` у таких ручек остается только для документации
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content)
+
+
+def ndjson_lines(items: list[dict[str, Any]]) -> bytes:
+    """Сериализовать объекты в NDJSON, по объекту на строку"""
+    return b"".join(orjson.dumps(item) + b"\n" for item in items)
@@ -1,13 +1,26 @@
 from __future__ import annotations
 
-from re import search
+import hashlib
+from collections.abc import AsyncIterator, Iterable, Iterator
+from typing import Any
 
-from fastapi_sqlalchemy import db
-from sqlalchemy import not_, or_
+from sqlalchemy import ColumnElement, Row, Select, case, func, literal, not_, or_, select, true
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 
+from settings import get_settings
 from userdata_api.exceptions import Forbidden, InvalidValidation, ObjectNotFound
-from userdata_api.models.db import Category, Info, Param, Source, ViewType
-from userdata_api.schemas.user import UserInfoGet, UserInfoUpdate, UsersInfoGet
+from userdata_api.models.db import Info, Param, Source, ViewType
+from userdata_api.models.session import db, get_engine
+from userdata_api.schemas.user import (
+    UserInfoUpdate,
+    UsersInfoQuery,
+    decode_cursor,
+    encode_cursor,
+)
+
+from .catalog import Catalog, CatalogParam, catalog_cache
+from .info import delete_info_stmt, upsert_info_stmt
+from .validation import validators
 
 
 async def patch_user_info(new: UserInfoUpdate, user_id: int, user: dict[str, int | list[dict[str, str | int]]]) -> None:
@@ -26,6 +39,10 @@ async def patch_user_info(new: UserInfoUpdate, user_id: int, user: dict[str, int
 
     Для удаления информации передать None в соответствущем словаре из списка new.items
 
+    Запрос применяется целиком: права и валидация проверяются для всех элементов до записи,
+    затем значения записываются одним `INSERT ... ON CONFLICT DO UPDATE`, удаления - одним `UPDATE`
+    в одной транзакции
+
     :param new: модель запроса, в ней то на что будет изменена информация о пользователе
     :param user_id: Айди пользователя
     :param user: Сессия пользователя выполняющего запрос
@@ -49,18 +66,13 @@ async def patch_user_info(new: UserInfoUpdate, user_id: int, user: dict[str, int
         )
     if new.source == "user" and user["id"] != user_id:
         raise Forbidden("'user' source requires information own", "Требуется владение информацией")
+    catalog = await catalog_cache.aget(
+        db.session, sources=[new.source], params=[(item.category, item.param) for item in new.items]
+    )
+    source = catalog.sources.get(new.source)
+    items: dict[int, tuple[CatalogParam, str | None]] = {}
     for item in new.items:
-        param = (
-            db.session.query(Param)
-            .join(Category)
-            .filter(
-                Param.name == item.param,
-                Category.name == item.category,
-                not_(Param.is_deleted),
-                not_(Category.is_deleted),
-            )
-            .one_or_none()
-        )
+        param = catalog.param(item.category, item.param)
         if not param:
             raise ObjectNotFound(Param, item.param)
         if (
@@ -68,52 +80,174 @@ async def patch_user_info(new: UserInfoUpdate, user_id: int, user: dict[str, int
             and param.category.update_scope not in scope_names
             and not (new.source == "user" and user["id"] == user_id)
         ):
-            db.session.rollback()
             raise Forbidden(
                 f"Updating category {param.category.name=} requires {param.category.update_scope=} scope",
                 f"Обновление категории {param.category.name=} требует {param.category.update_scope=} права",
             )
-        info = (
-            db.session.query(Info)
-            .join(Source)
-            .filter(
-                Info.param_id == param.id,
+        items[param.id] = (param, item.value)
+    # Сначала проверяем весь запрос целиком, пишем в базу, только если все элементы прошли проверки
+    to_write = {param.id: value for param, value in items.values() if value is not None}
+    to_delete = [param.id for param, value in items.values() if value is None]
+    if not source:
+        if to_write:
+            raise ObjectNotFound(Source, new.source)
+        return
+    for param_id, value in to_write.items():
+        if not validators.match(catalog.params[param_id], value):
+            raise InvalidValidation(Info, "value")
+    # Неизменяемые параметры без права `userdata.info.update` можно только создать, но не перезаписать
+    guarded = (
+        [param_id for param_id in to_write if not catalog.params[param_id].changeable]
+        if "userdata.info.update" not in scope_names
+        else []
+    )
+    if guarded:
+        existing = await db.session.scalars(
+            select(Info.param_id).where(
                 Info.owner_id == user_id,
-                Source.name == new.source,
+                Info.source_id == source.id,
+                Info.param_id.in_(guarded),
                 not_(Info.is_deleted),
             )
-            .one_or_none()
         )
-        if not info and item.value is None:
-            continue
-        if not info:
-            source = Source.query(session=db.session).filter(Source.name == new.source).one_or_none()
-            if not source:
-                raise ObjectNotFound(Source, new.source)
-            if param.validation is not None and search(param.validation, item.value) is None:
-                raise InvalidValidation(Info, "value")
-            Info.create(
-                session=db.session,
-                owner_id=user_id,
-                param_id=param.id,
-                source_id=source.id,
-                value=item.value,
-            )
-            continue
-        if item.value is None:
-            info.is_deleted = True
-            db.session.flush()
-            continue
-        if not param.changeable and "userdata.info.update" not in scope_names:
-            db.session.rollback()
+        for param_id in existing:
+            param = catalog.params[param_id]
             raise Forbidden(
                 f"Param {param.name=} change requires 'userdata.info.update' scope",
                 f"Изменение {param.name=} параметра требует 'userdata.info.update' права",
             )
-        if param.validation is not None and search(param.validation, item.value) is None:
-            raise InvalidValidation(Info, "value")
-        info.value = item.value
-        db.session.flush()
+    to_upsert = {param_id: value for param_id, value in to_write.items() if param_id not in guarded}
+    to_create = {param_id: to_write[param_id] for param_id in guarded}
+    # Движок работает в AUTOCOMMIT: завершаем чтение и пишем в транзакции на соединении с обычной изоляцией
+    await db.session.commit()
+    async with db.session.begin():
+        await db.session.connection(execution_options={"isolation_level": "READ COMMITTED"})
+        if to_upsert:
+            await db.session.execute(upsert_info_stmt(user_id, source.id, to_upsert))
+        if to_create:
+            # Если значение успели создать параллельно, оставляем его: перезаписывать неизменяемый параметр нельзя
+            await db.session.execute(upsert_info_stmt(user_id, source.id, to_create, overwrite=False))
+        if to_delete:
+            await db.session.execute(delete_info_stmt(user_id, source.id, to_delete))
+
+
+def _requested_params(
+    catalog: Catalog, category_ids: list[int] | None, additional_data: list[int]
+) -> list[CatalogParam]:
+    return [
+        param
+        for param in catalog.params.values()
+        if (param.visible_in_user_response or param.id in additional_data)
+        and (category_ids is None or param.category_id in category_ids)
+    ]
+
+
+def _readable_clause(
+    params: Iterable[CatalogParam], user: dict[str, int | list[dict[str, str | int]]], *, is_single_user: bool
+) -> ColumnElement[bool]:
+    """
+    Условие на строки `Info`, которые может прочитать `user`.
+
+    Значение видно, если у категории нет `read_scope`, у запрашивающего есть этот скоуп или параметр публичный.
+    Это зависит только от параметра, поэтому проверка сводится к списку айди параметров из справочника.
+    При запросе данных одного пользователя владелец видит все свои значения
+    """
+    scope_names = {scope["name"] for scope in user["session_scopes"]}
+    readable = [
+        param.id
+        for param in params
+        if not param.category.read_scope or param.category.read_scope in scope_names or param.is_public
+    ]
+    if is_single_user:
+        return or_(Info.param_id.in_(readable), Info.owner_id == user["id"])
+    return Info.param_id.in_(readable)
+
+
+async def _raise_if_no_info(
+    catalog: Catalog, user_ids: list[int], category_ids: list[int] | None, additional_data: list[int]
+) -> None:
+    """
+    Если запрос с проверкой прав ничего не вернул, отличить пользователей без данных (404)
+    от пользователей, чьи данные запрашивающему не видны (пустой ответ)
+    """
+    params = _requested_params(catalog, category_ids, additional_data)
+    exists = await db.session.scalar(
+        select(Info.id)
+        .where(Info.owner_id.in_(user_ids), Info.param_id.in_([p.id for p in params]), not_(Info.is_deleted))
+        .limit(1)
+    )
+    if exists is None:
+        raise ObjectNotFound(Info, user_ids)
+
+
+def users_info_query(
+    catalog: Catalog,
+    user_ids: list[int],
+    category_ids: list[int] | None,
+    additional_data: list[int],
+    user: dict[str, int | list[dict[str, str | int]]] | None = None,
+    *,
+    is_single_user: bool = False,
+) -> Select:
+    """
+    Собирает запрос, который возвращает только "выигравшие" значения параметров пользователей.
+
+    Значения ранжируются оконной функцией внутри пары (владелец, параметр):
+    для `ViewType.MOST_TRUSTED` по `Source.trust_level`, затем по `Info.create_ts`,
+    для `ViewType.LAST` только по `Info.create_ts`. Для `ViewType.ALL` все значения
+    собираются в массив одной строкой.
+
+    Параметры, категории и уровни доверия источников берутся из справочника,
+    запрос читает только таблицу `info`.
+
+    Если передан `user`, права на чтение проверяются в том же запросе (см. `_readable_clause`),
+    и значения, которые запрашивающему не видны, не покидают базу.
+
+    :param catalog: Снимок справочников
+    :param user_ids: Список айди юзеров
+    :param category_ids: Список айди категорий, None - все категории
+    :param additional_data: Список айди параметров, невидимых по умолчанию, которые нужно вернуть
+    :param user: Сессия выполняющего запрос данных, None - не проверять права
+    :param is_single_user: Запрос данных одного пользователя, владелец видит все свои данные
+    :return: Запрос, строки которого содержат owner_id, param_id, values
+    """
+    params = _requested_params(catalog, category_ids, additional_data)
+    trust_levels = catalog.trust_levels()
+    trust_level = case(trust_levels, value=Info.source_id, else_=-1) if trust_levels else literal(-1)
+    rank = (
+        func.row_number()
+        .over(
+            partition_by=(Info.owner_id, Info.param_id),
+            order_by=(
+                case(
+                    (Info.param_id.in_([p.id for p in params if p.type == ViewType.MOST_TRUSTED]), trust_level),
+                    else_=0,
+                ).desc(),
+                Info.create_ts.desc(),
+                Info.id.desc(),
+            ),
+        )
+        .label("rank")
+    )
+    ranked = (
+        select(Info.id, Info.owner_id, Info.param_id, Info.value, Info.create_ts, rank)
+        .where(
+            Info.owner_id.in_(user_ids),
+            Info.param_id.in_([p.id for p in params]),
+            not_(Info.is_deleted),
+            _readable_clause(params, user, is_single_user=is_single_user) if user is not None else true(),
+        )
+        .subquery()
+    )
+    return (
+        select(
+            ranked.c.owner_id,
+            ranked.c.param_id,
+            func.array_agg(aggregate_order_by(ranked.c.value, ranked.c.create_ts, ranked.c.id)).label("values"),
+        )
+        .where(or_(ranked.c.rank == 1, ranked.c.param_id.in_([p.id for p in params if p.type == ViewType.ALL])))
+        .group_by(ranked.c.owner_id, ranked.c.param_id)
+    )
 
 
 async def get_users_info(
@@ -132,93 +266,72 @@ async def get_users_info(
     """
     if additional_data is None:
         additional_data = []
-    is_single_user = category_ids is None
-    scope_names = [scope["name"] for scope in user["session_scopes"]]
-    param_dict: dict[Param, dict[int, list[Info] | Info | None] | None] = {}
-    query: list[Info] = (
-        Info.query(session=db.session)
-        .join(Param)
-        .join(Category)
-        .filter(
-            Info.owner_id.in_(user_ids),
-            not_(Param.is_deleted),
-            not_(Category.is_deleted),
-            not_(Info.is_deleted),
-            or_(
-                Param.visible_in_user_response,
-                Param.id.in_(additional_data),
-            ),
-        )
+    catalog = await catalog_cache.aget(db.session)
+    stmt = users_info_query(catalog, user_ids, category_ids, additional_data, user, is_single_user=category_ids is None)
+    rows = (await db.session.execute(stmt)).all()
+    if not rows:
+        await _raise_if_no_info(catalog, user_ids, category_ids, additional_data)
+    return list(_response_items(catalog, rows))
+
+
+def _response_items(catalog: Catalog, rows: Iterable[Row]) -> Iterator[dict[str, str | int | None]]:
+    """Развернуть строки `users_info_query` в элементы ответа"""
+    for row in rows:
+        param = catalog.params[row.param_id]
+        for value in row.values:
+            yield {
+                "user_id": row.owner_id,
+                "category": param.category.name,
+                "param": param.name,
+                "value": value,
+            }
+
+
+async def stream_users_info(
+    user_ids: list[int],
+    category_ids: list[int],
+    user: dict[str, int | list[dict[str, str | int]]],
+    additional_data: list[int],
+) -> AsyncIterator[list[dict[str, str | int | None]]]:
+    """
+    Потоковая версия `get_users_info` для больших выгрузок.
+
+    Строки читаются серверным курсором в отдельном соединении, в памяти одновременно находится не больше
+    `USERS_STREAM_WINDOW` строк запроса. Первая порция читается до возврата итератора, поэтому
+    `ObjectNotFound` выбрасывается до начала ответа.
+
+    :return: Асинхронный итератор по порциям элементов ответа, соединение закрывается по окончании итерации
+    """
+    catalog = await catalog_cache.aget(db.session)
+    query = users_info_query(catalog, user_ids, category_ids, additional_data, user)
+    query = query.order_by(query.selected_columns.owner_id, query.selected_columns.param_id).execution_options(
+        yield_per=get_settings().USERS_STREAM_WINDOW
     )
-    if not is_single_user:
-        query = query.filter(Param.category_id.in_(category_ids))
-    infos = query.all()
-    if not infos:
-        raise ObjectNotFound(Info, user_ids)
-    result = []
-    for info in infos:
-        if (
-            info.category.read_scope
-            and info.category.read_scope not in scope_names
-            and (not is_single_user or info.owner_id != user["id"])
-            and not info.param.is_public
-        ):
-            continue
-        if info.param not in param_dict:
-            param_dict[info.param] = {}
-        if info.owner_id not in param_dict[info.param]:
-            param_dict[info.param][info.owner_id] = [] if info.param.type == ViewType.ALL else None
-        if info.param.type == ViewType.ALL:
-            param_dict[info.param][info.owner_id].append(info)
-        elif param_dict[info.param][info.owner_id] is None or (
-            (info.param.type == ViewType.LAST and info.create_ts > param_dict[info.param][info.owner_id].create_ts)
-            or (
-                info.param.type == ViewType.MOST_TRUSTED
-                and (
-                    param_dict[info.param][info.owner_id].source.trust_level < info.source.trust_level
-                    or (
-                        param_dict[info.param][info.owner_id].source.trust_level <= info.source.trust_level
-                        and info.create_ts > param_dict[info.param][info.owner_id].create_ts
-                    )
-                )
-            )
-        ):
-            """
-            Сюда он зайдет либо если параметру не соответствует никакой информации,
-            либо если встретил более релевантную.
-
-            Если у параметра отображение по доверию, то более релевантная
-            - строго больше индекс доверия/такой же индекс доверия,
-            но информация более поздняя по времени
-
-            Если у параметра отображение по времени то более релевантная - более позднаяя
-            """
-            param_dict[info.param][info.owner_id] = info
-    result = []
-    for param, user_dict in param_dict.items():
-        for owner_id, item in user_dict.items():
-            if isinstance(item, list):
-                result.extend(
-                    [
-                        {
-                            "user_id": owner_id,
-                            "category": _item.category.name,
-                            "param": param.name,
-                            "value": _item.value,
-                        }
-                        for _item in item
-                    ]
-                )
-            else:
-                result.append(
-                    {
-                        "user_id": owner_id,
-                        "category": item.category.name,
-                        "param": param.name,
-                        "value": item.value,
-                    }
-                )
-    return result
+    conn = await get_engine().connect()
+    try:
+        # Серверному курсору asyncpg нужна транзакция, движок по умолчанию работает в AUTOCOMMIT
+        await conn.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+        await conn.begin()
+        partitions = (await conn.stream(query)).partitions()
+        first = await anext(partitions, None)
+    except BaseException:
+        await conn.close()
+        raise
+    if first is None:
+        await conn.close()
+        # Данные есть, но запрашивающему не видны: пустой поток вместо 404
+        await _raise_if_no_info(catalog, user_ids, category_ids, additional_data)
+
+    async def _items() -> AsyncIterator[list[dict[str, str | int | None]]]:
+        try:
+            rows = first
+            while rows is not None:
+                yield list(_response_items(catalog, rows))
+                rows = await anext(partitions, None)
+        finally:
+            await conn.close()
+
+    return _items()
 
 
 async def get_users_info_batch(
@@ -226,9 +339,10 @@ async def get_users_info_batch(
     category_ids: list[int],
     user: dict[str, int | list[dict[str, str | int]]],
     additional_data: list[int],
-) -> UsersInfoGet:
+) -> dict[str, Any]:
     """.
-    Возвращает информацию о данных пользователей в указанных категориях
+    Возвращает информацию о данных пользователей в указанных категориях в формате `UsersInfoGet`.
+    Результат собран из проверенных данных и отдается без повторной проверки схемой
 
     :param user_ids: Список айди юзеров
     :param category_ids: Список айди необходимых категорий
@@ -236,11 +350,64 @@ async def get_users_info_batch(
     :return: Список словарей содержащих id пользователя, категорию, параметр категории и значение этого параметра у пользователя
     """
 
-    return UsersInfoGet(items=await get_users_info(user_ids, category_ids, user, additional_data))
+    return {"items": await get_users_info(user_ids, category_ids, user, additional_data)}
+
+
+async def get_users_info_page(
+    query: UsersInfoQuery, user: dict[str, int | list[dict[str, str | int]]]
+) -> dict[str, Any]:
+    """
+    Возвращает одну страницу информации о пользователях из `query.users` в формате `UsersInfoPage`.
+
+    Пагинация по `owner_id`: страница содержит данные не более чем `query.limit` пользователей с айди больше,
+    чем в `query.cursor`, поэтому стоимость запроса не зависит от длины списка и номера страницы.
+    Права на чтение проверяются так же, как в `get_users_info`, пустая страница не считается ошибкой
+
+    :param query: Тело запроса со списками пользователей и категорий и токеном продолжения
+    :param user: Сессия выполняющего запрос данных
+    :return: Элементы страницы и токен следующей страницы, None - если страница последняя
+    """
+    after = decode_cursor(query.cursor) if query.cursor is not None else None
+    user_ids = sorted({user_id for user_id in query.users if after is None or user_id > after})
+    page_ids = user_ids[: query.limit]
+    if not page_ids:
+        return {"items": [], "next_cursor": None}
+    catalog = await catalog_cache.aget(db.session)
+    stmt = users_info_query(catalog, page_ids, query.categories, query.additional_data, user)
+    stmt = stmt.order_by(stmt.selected_columns.owner_id, stmt.selected_columns.param_id)
+    rows = (await db.session.execute(stmt)).all()
+    return {
+        "items": list(_response_items(catalog, rows)),
+        "next_cursor": encode_cursor(page_ids[-1]) if len(user_ids) > len(page_ids) else None,
+    }
+
+
+async def get_user_info_etag(user_id: int, user: dict[str, int | list[dict[str, str | int]]]) -> str:
+    """
+    Версия ответа `get_user_info` для конкретного пользователя и прав запрашивающего, не читая сами значения.
+
+    Складывается из версии справочников, максимального `Info.modify_ts` и числа неудаленных записей пользователя,
+    того, является ли запрашивающий владельцем, и тех его скоупов, которые открывают чтение категорий.
+    Мягкое удаление обновляет `modify_ts`, поэтому любое изменение данных пользователя меняет версию
+
+    :param user_id: Айди пользователя
+    :param user: Сессия выполняющего запрос данных
+    :return: Слабый ETag
+    """
+    catalog = await catalog_cache.aget(db.session)
+    max_modify_ts, count = (
+        await db.session.execute(
+            select(func.max(Info.modify_ts), func.count()).where(Info.owner_id == user_id, not_(Info.is_deleted))
+        )
+    ).one()
+    read_scopes = {category.read_scope for category in catalog.categories.values() if category.read_scope}
+    scopes = sorted(read_scopes.intersection(scope["name"] for scope in user["session_scopes"]))
+    version = (catalog.version, max_modify_ts, count, user["id"] == user_id, scopes)
+    return f'W/"{hashlib.md5(repr(version).encode()).hexdigest()}"'
 
 
-async def get_user_info(user_id: int, user: dict[str, int | list[dict[str, str | int]]]) -> UserInfoGet:
-    """Возвращает информауию о пользователе в соотетствии с переданным токеном.
+async def get_user_info(user_id: int, user: dict[str, int | list[dict[str, str | int]]]) -> dict[str, Any]:
+    """Возвращает информауию о пользователе в соотетствии с переданным токеном в формате `UserInfoGet`.
 
     Пользователь может прочитать любую информацию о себе
 
@@ -254,4 +421,4 @@ async def get_user_info(user_id: int, user: dict[str, int | list[dict[str, str |
     result = await get_users_info([user_id], None, user)
     for value in result:
         del value["user_id"]
-    return UserInfoGet(items=result)
+    return {"items": result}
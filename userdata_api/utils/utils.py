@@ -9,3 +9,17 @@ def random_string(length: int = 12):
     :return: Сгенериированную строку
     """
     return "".join([random.choice(string.ascii_lowercase) for _ in range(length)])
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Проверить заголовок `If-None-Match` против текущего `etag` (слабое сравнение, RFC 9110 13.1.2)
+    :param if_none_match: значение заголовка, None - заголовка нет
+    :param etag: текущий ETag ресурса
+    :return: True, если клиенту можно ответить 304
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from re import error as ReError
+
+import regex
+
+from settings import get_settings
+
+from .catalog import CatalogParam
+
+logger = logging.getLogger(__name__)
+
+# Число символов кода после \x, \u, \U
+_ESCAPE_LENGTHS = {"x": 2, "u": 4, "U": 8}
+_QUANTIFIER = regex.compile(r"\{(\d*)(,?)(\d*)\}")
+
+
+class UnsafeRegex(ValueError):
+    """Регулярное выражение склонно к катастрофическому перебору с возвратами"""
+
+
+@dataclass(frozen=True)
+class _Repeat:
+    min: int
+    max: int | None  # None - без ограничения
+    body: list
+
+
+@dataclass(frozen=True)
+class _Group:
+    alternatives: list[list]
+    # Атомарная группа (?>...) или проверка (?=...), (?!...), (?<=...), (?<!...): перебор не возвращается внутрь,
+    # поэтому для внешнего повтора группа - обычный элемент, вложенные повторы внутри проверяются отдельно
+    atomic: bool = False
+
+
+class _Scanner:
+    """
+    Разбирает синтаксически корректное выражение в дерево из повторов `_Repeat`, групп `_Group`
+    и остальных элементов (None). Для проверки на перебор важна только вложенность повторов и групп,
+    поэтому символы, классы и экранирования не различаются.
+
+    В режиме VERBOSE (флаг `x`) пробелы и комментарии `#` вне классов пропускаются.
+    Если разбор выходит за конец выражения, выражение считается небезопасным
+    """
+
+    def __init__(self, pattern: str, verbose: bool = False):
+        self.pattern = pattern
+        self.pos = 0
+        self.verbose = verbose
+
+    def _peek(self, text: str) -> bool:
+        return self.pattern.startswith(text, self.pos)
+
+    def _char(self) -> str:
+        if self.pos >= len(self.pattern):
+            raise UnsafeRegex("Unexpected end of pattern")
+        return self.pattern[self.pos]
+
+    def _skip_to(self, char: str) -> None:
+        end = self.pattern.find(char, self.pos)
+        if end == -1:
+            raise UnsafeRegex(f"Unexpected end of pattern, expected {char!r}")
+        self.pos = end + 1
+
+    def _skip_ignored(self) -> None:
+        """Пропустить пробелы и комментарии в режиме VERBOSE"""
+        while self.verbose and self.pos < len(self.pattern):
+            if self.pattern[self.pos].isspace():
+                self.pos += 1
+            elif self._peek("#"):
+                end = self.pattern.find("\n", self.pos)
+                self.pos = len(self.pattern) if end == -1 else end + 1
+            else:
+                return
+
+    def scan(self) -> list[list]:
+        alternatives = self.parse()
+        if self.pos != len(self.pattern):
+            raise UnsafeRegex(f"Can't parse pattern at position {self.pos}")
+        return alternatives
+
+    def parse(self) -> list[list]:
+        alternatives = [[]]
+        while True:
+            self._skip_ignored()
+            if self.pos >= len(self.pattern) or self._peek(")"):
+                return alternatives
+            if self._peek("|"):
+                self.pos += 1
+                alternatives.append([])
+                continue
+            item, branch = self._item(), alternatives[-1]
+            if item is not False:
+                branch.append(self._quantified(item))
+            elif branch:
+                # Квантификатор после комментария относится к предыдущему элементу
+                branch[-1] = self._quantified(branch[-1])
+
+    def _item(self):
+        """Следующий элемент, False - элемент ничего не сопоставляет (флаги, комментарий)"""
+        start, char = self.pos, self._char()
+        self.pos += 1
+        if char == "\\":
+            escape = self._char()
+            if escape in "NpPx" and self._peek(escape + "{"):
+                self._skip_to("}")
+            elif escape in _ESCAPE_LENGTHS:
+                self.pos += 1 + _ESCAPE_LENGTHS[escape]
+            elif escape.isdigit():
+                # Восьмеричный код или номер группы, до трех цифр
+                self.pos += 1
+                while self.pos < len(self.pattern) and self.pattern[self.pos].isdigit() and self.pos - start < 4:
+                    self.pos += 1
+            else:
+                self.pos += 1
+            return None
+        if char == "[":
+            if self._peek("^"):
+                self.pos += 1
+            if self._peek("]"):
+                self.pos += 1
+            while self._char() != "]":
+                if self._peek("[:"):
+                    self._skip_to("]")
+                else:
+                    self.pos += 2 if self._peek("\\") else 1
+            self.pos += 1
+            return None
+        if char != "(":
+            return None
+        atomic, verbose = False, self.verbose
+        if self._peek("?"):
+            self.pos += 1
+            if self._peek("#"):
+                self._skip_to(")")
+                return False
+            if self._peek("P="):
+                self._skip_to(")")
+                return None
+            if self._peek("P<") or (self._peek("<") and not self._peek("<=") and not self._peek("<!")):
+                self._skip_to(">")
+            elif self._peek("("):
+                self._skip_to(")")
+            else:
+                flags_start = self.pos
+                while self._char() not in ":=!<>|)":
+                    self.pos += 1
+                if self._peek(")"):
+                    # Флаги всего выражения, учтены при создании разбора
+                    self.pos += 1
+                    return False
+                # Флаги группы (?x:...) и (?-x:...)
+                enabled, _, disabled = self.pattern[flags_start : self.pos].partition("-")
+                verbose = (verbose or "x" in enabled) and "x" not in disabled
+                atomic = self.pattern[self.pos] in "=!<>"
+                self.pos += 2 if self._peek("<") else 1
+        outer, self.verbose = self.verbose, verbose
+        group = _Group(self.parse(), atomic)
+        self.verbose = outer
+        self._char()  # parse останавливается на ")" или в конце выражения
+        self.pos += 1
+        return group
+
+    def _quantified(self, item):
+        self._skip_ignored()
+        bounds = None
+        if self._peek("*"):
+            bounds, self.pos = (0, None), self.pos + 1
+        elif self._peek("+"):
+            bounds, self.pos = (1, None), self.pos + 1
+        elif self._peek("?"):
+            bounds, self.pos = (0, 1), self.pos + 1
+        elif (match := _QUANTIFIER.match(self.pattern, self.pos)) and (match[1] or match[3]):
+            low, comma, high = match.groups()
+            bounds = (int(low or 0), int(high) if high else (None if comma else int(low)))
+            self.pos = match.end()
+        if bounds is None:
+            return item
+        if self._peek("?") or self._peek("+"):
+            self.pos += 1
+        return _Repeat(*bounds, [item])
+
+
+def _can_be_empty_or_repeated(item) -> bool:
+    """Элемент шаблона либо необязателен, либо сам по себе повторяется неограниченно"""
+    if isinstance(item, _Repeat):
+        return item.min == 0 or item.max is None
+    if isinstance(item, _Group) and not item.atomic:
+        return len(item.alternatives) == 1 and all(_can_be_empty_or_repeated(sub) for sub in item.alternatives[0])
+    return False
+
+
+def _has_unbounded_repeat(items: list) -> bool:
+    for item in items:
+        if isinstance(item, _Repeat) and (item.max is None or _has_unbounded_repeat(item.body)):
+            return True
+        if (
+            isinstance(item, _Group)
+            and not item.atomic
+            and any(_has_unbounded_repeat(branch) for branch in item.alternatives)
+        ):
+            return True
+    return False
+
+
+def _check_nested_repeats(items: list) -> None:
+    """
+    Ищет вложенные неограниченные квантификаторы вида `(a+)+`, `(\\w+\\s?)*`, `(a*b?)+`.
+
+    Повтор внутри повтора допускается, только если в теле внешнего повтора есть обязательный элемент
+    вне квантификаторов, например разделитель в `(\\w+\\.)+`
+    """
+    for item in items:
+        if isinstance(item, _Repeat):
+            if (
+                (item.max is None or item.max > 1)
+                and _has_unbounded_repeat(item.body)
+                and all(_can_be_empty_or_repeated(sub) for sub in item.body)
+            ):
+                raise UnsafeRegex(f"Nested unbounded repetition in {item.body}")
+            _check_nested_repeats(item.body)
+        elif isinstance(item, _Group):
+            for branch in item.alternatives:
+                _check_nested_repeats(branch)
+
+
+def check_pattern(pattern: str) -> regex.Pattern:
+    """
+    Проверить и скомпилировать регулярное выражение для `Param.validation`.
+
+    :raises ReError: выражение синтаксически некорректно
+    :raises UnsafeRegex: выражение склонно к катастрофическому перебору
+    """
+    try:
+        compiled = regex.compile(pattern, regex.VERSION0)
+    except regex.error as e:
+        raise ReError(str(e)) from e
+    for branch in _Scanner(pattern, verbose=bool(compiled.flags & regex.VERBOSE)).scan():
+        _check_nested_repeats(branch)
+    return compiled
+
+
+class ValidatorCache:
+    """
+    Скомпилированные регулярные выражения валидации параметров.
+
+    Для каждого параметра хранится текст выражения, из которого оно скомпилировано:
+    если текст изменился, выражение перекомпилируется.
+    Каждая проверка ограничена по времени `timeout` секунд, значение, которое не удалось проверить за это время,
+    считается невалидным
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._patterns: dict[int, tuple[str, regex.Pattern]] = {}
+
+    def compile(self, param_id: int, pattern: str | None) -> regex.Pattern | None:
+        if pattern is None:
+            self._patterns.pop(param_id, None)
+            return None
+        cached = self._patterns.get(param_id)
+        if cached is not None and cached[0] == pattern:
+            return cached[1]
+        # Выражения, сохраненные до появления проверки на безопасность, компилируем как есть,
+        # от перебора их защищает ограничение по времени
+        compiled = regex.compile(pattern, regex.VERSION0)
+        self._patterns[param_id] = (pattern, compiled)
+        return compiled
+
+    def match(self, param: CatalogParam, value: str) -> bool:
+        compiled = self.compile(param.id, param.validation)
+        if compiled is None:
+            return True
+        try:
+            return compiled.search(value, timeout=self.timeout) is not None
+        except TimeoutError:
+            logger.warning(f"Validation of param {param.id} timed out after {self.timeout}s")
+            return False
+
+
+validators = ValidatorCache(timeout=get_settings().VALIDATION_REGEX_TIMEOUT)
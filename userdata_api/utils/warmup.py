@@ -0,0 +1,78 @@
+"""
+Прогрев процесса АПИ перед приемом трафика.
+
+Первые запросы после старта платят за установку соединений с БД, компиляцию запросов SQLAlchemy,
+подготовку запросов в asyncpg и загрузку справочников. Прогрев делает все это заранее,
+а `/ready` отвечает успехом только после него
+"""
+
+import asyncio
+import logging
+
+from starlette.datastructures import State
+
+from userdata_api.exceptions import ObjectNotFound
+from userdata_api.models.session import db, get_engine
+from userdata_api.schemas.user import UsersInfoQuery
+
+from .catalog import catalog_cache
+from .user import get_user_info_etag, get_users_info, get_users_info_page
+
+logger = logging.getLogger(__name__)
+
+# Пользователь, которого нет в базе, и сессия без скоупов: запросы проходят все ветки, не возвращая данных
+_PROBE_USER_ID = 0
+_PROBE_SESSION = {"id": _PROBE_USER_ID, "session_scopes": []}
+
+
+async def open_connections(count: int) -> int:
+    """Открыть одновременно до `count` соединений пула (не больше его размера) и вернуть их в пул"""
+    engine = get_engine()
+    count = min(count, engine.pool.size())
+    results = await asyncio.gather(*(engine.connect() for _ in range(count)), return_exceptions=True)
+    connections = [result for result in results if not isinstance(result, BaseException)]
+    await asyncio.gather(*(connection.close() for connection in connections))
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return len(connections)
+
+
+async def run_hot_queries() -> None:
+    """Выполнить запросы основных ручек чтения: справочники, данные одного и нескольких пользователей, ETag"""
+    async with db():
+        catalog = await catalog_cache.aget(db.session)
+        category_ids = list(catalog.categories)
+        for ids in (None, category_ids):
+            try:
+                await get_users_info([_PROBE_USER_ID], ids, _PROBE_SESSION)
+            except ObjectNotFound:
+                pass
+        await get_user_info_etag(_PROBE_USER_ID, _PROBE_SESSION)
+        await get_users_info_page(UsersInfoQuery(users=[_PROBE_USER_ID], categories=category_ids), _PROBE_SESSION)
+
+
+async def warm_up(connections: int) -> None:
+    """
+    Открыть соединения пула и выполнить горячие запросы в `connections` параллельных сессиях,
+    чтобы подготовленные запросы asyncpg появились на каждом соединении пула
+    """
+    opened = await open_connections(connections)
+    await asyncio.gather(*(run_hot_queries() for _ in range(max(opened, 1))))
+
+
+async def warm_up_until_ready(state: State, connections: int, retry_delay: float) -> None:
+    """
+    Повторять прогрев, пока он не пройдет, затем выставить `state.ready`.
+    Готовность не снимается при временной недоступности БД, чтобы не выводить из балансировки все процессы разом
+    """
+    while True:
+        try:
+            await warm_up(connections)
+        except Exception:
+            logger.exception(f"Warmup failed, retrying in {retry_delay}s")
+            await asyncio.sleep(retry_delay)
+        else:
+            state.ready = True
+            logger.info("Warmup complete")
+            return
@@ -0,0 +1,183 @@
+"""
+Массовая загрузка исторических событий `UserLogin`, например при заполнении нового окружения
+или повторе топика с начала.
+
+Вместо применения событий по одному строки событий загружаются через COPY во временную таблицу,
+а затем сливаются в `info` несколькими запросами на пачку с той же семантикой, что у воркера (`worker/user.py`):
+для каждой тройки (пользователь, параметр, источник) побеждает последнее значение,
+непустое значение создает или обновляет запись источника, None - мягко удаляет ее
+"""
+
+import io
+import logging
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import datetime
+from time import perf_counter
+
+from event_schema.auth import UserLogin
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Connection,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    literal,
+    not_,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from settings import get_settings
+from userdata_api.models.db import Info
+from userdata_api.utils.catalog import Catalog, catalog_cache
+from userdata_api.utils.info import on_conflict_upsert
+
+from .codec import decode_events
+from .source import MessageSource
+from .user import event_names
+
+log = logging.getLogger(__name__)
+
+# Строки событий текущей пачки, очищается при фиксации транзакции
+staging = Table(
+    "backfill_info",
+    MetaData(),
+    Column("seq", BigInteger, nullable=False),
+    Column("owner_id", Integer, nullable=False),
+    Column("param_id", Integer, nullable=False),
+    Column("source_id", Integer, nullable=False),
+    Column("value", String, nullable=True),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DELETE ROWS",
+)
+
+
+@dataclass
+class BackfillStats:
+    events: int = 0
+    skipped: int = 0
+    rows: int = 0
+    upserted: int = 0
+    deleted: int = 0
+    started: float = field(default_factory=perf_counter)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / max(perf_counter() - self.started, 1e-9)
+
+    def __str__(self) -> str:
+        return (
+            f"events={self.events} skipped={self.skipped} rows={self.rows} upserted={self.upserted} "
+            f"deleted={self.deleted} elapsed={perf_counter() - self.started:.2f}s {self.rows_per_second:.0f} rows/s"
+        )
+
+
+def event_rows(events: Iterable[tuple[int, UserLogin]], catalog: Catalog, stats: BackfillStats) -> Iterator[tuple]:
+    """
+    Разложить события на строки (seq, owner_id, param_id, source_id, value) в порядке поступления.
+    События, которые воркер пропустил бы целиком (неизвестный параметр или источник), пропускаются
+    """
+    for user_id, event in events:
+        stats.events += 1
+        source = catalog.sources.get(event.source)
+        params = [catalog.param(item.category, item.param) for item in event.items]
+        if source is None or None in params:
+            stats.skipped += 1
+            continue
+        for param, item in zip(params, event.items):
+            stats.rows += 1
+            yield stats.rows, user_id, param.id, source.id, item.value
+
+
+def _copy_text(value: str | None) -> str:
+    if value is None:
+        return "\\N"
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copy_rows(session: Session, rows: Iterable[tuple]) -> None:
+    """Загрузить строки во временную таблицу одним COPY в текстовом формате"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_text(None if value is None else str(value)) for value in row) + "\n")
+    buffer.seek(0)
+    columns = ", ".join(column.name for column in staging.columns)
+    cursor = session.connection().connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {staging.name} ({columns}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+
+def merge_staged(session: Session) -> tuple[int, int]:
+    """Слить временную таблицу в `info`, вернуть число созданных или измененных и удаленных записей"""
+    latest = (
+        select(staging)
+        .distinct(staging.c.owner_id, staging.c.param_id, staging.c.source_id)
+        .order_by(staging.c.owner_id, staging.c.param_id, staging.c.source_id, staging.c.seq.desc())
+        .subquery()
+    )
+    deleted = session.execute(
+        update(Info)
+        .where(
+            Info.owner_id == latest.c.owner_id,
+            Info.param_id == latest.c.param_id,
+            Info.source_id == latest.c.source_id,
+            latest.c.value.is_(None),
+            not_(Info.is_deleted),
+        )
+        .values(is_deleted=True),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    now = datetime.utcnow()
+    upserted = session.execute(
+        on_conflict_upsert(
+            insert(Info).from_select(
+                ["owner_id", "param_id", "source_id", "value", "create_ts", "modify_ts"],
+                select(
+                    latest.c.owner_id, latest.c.param_id, latest.c.source_id, latest.c.value, literal(now), literal(now)
+                ).where(latest.c.value.is_not(None)),
+            )
+        )
+    ).rowcount
+    return upserted, deleted
+
+
+def backfill(source: MessageSource, *, chunk_size: int, connection: Connection) -> BackfillStats:
+    """
+    Загрузить все события источника. Каждая пачка до `chunk_size` сообщений применяется отдельной транзакцией,
+    поэтому прерванную загрузку можно повторить: повторное применение тех же событий ничего не меняет
+    """
+    stats = BackfillStats()
+    staging.create(connection, checkfirst=True)
+    connection.commit()
+    with Session(bind=connection) as session:
+        try:
+            for batch in source.listen_batches(chunk_size, 0):
+                with session.begin():
+                    events = [event for _, event in decode_events(batch)]
+                    sources, params = event_names(events)
+                    catalog = catalog_cache.get(session, sources=sources, params=params)
+                    copy_rows(session, event_rows(events, catalog, stats))
+                    upserted, deleted = merge_staged(session)
+                stats.upserted += upserted
+                stats.deleted += deleted
+                log.info(str(stats))
+        finally:
+            source.close()
+    return stats
+
+
+def run(source: MessageSource, chunk_size: int) -> BackfillStats:
+    engine = create_engine(str(get_settings().DB_DSN))
+    try:
+        with engine.connect() as connection:
+            return backfill(source, chunk_size=chunk_size, connection=connection)
+    finally:
+        engine.dispose()
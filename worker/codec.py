@@ -0,0 +1,124 @@
+import logging
+from functools import lru_cache
+from typing import Any, Protocol, TypeVar
+
+from event_schema.auth import UserLogin, UserLoginKey
+from pydantic import TypeAdapter, ValidationError
+
+from settings import get_settings
+
+from .dead_letter import get_dead_letter
+from .metrics import INVALID_MESSAGES
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Схемы строятся один раз при импорте, а не на каждое сообщение
+KEY_ADAPTER = TypeAdapter(UserLoginKey)
+VALUE_ADAPTER = TypeAdapter(UserLogin)
+
+
+class DecodeError(ValueError):
+    """Сообщение не удалось разобрать форматом кодека, `reason` - имя кодека для метрик и dead letter"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Message is not valid {reason}")
+        self.reason = reason
+
+
+class Codec(Protocol):
+    """Формат сообщений в топике. Проверяет сырые байты схемой, по возможности не создавая промежуточных объектов"""
+
+    name: str
+
+    def decode(self, raw: bytes | str, adapter: TypeAdapter[T]) -> T:
+        """
+        :raises DecodeError: байты не разбираются форматом
+        :raises ValidationError: сообщение не подходит под схему
+        """
+
+
+class JsonCodec:
+    name = "json"
+
+    def decode(self, raw: bytes | str, adapter: TypeAdapter[T]) -> T:
+        try:
+            return adapter.validate_json(raw)
+        except ValidationError as e:
+            if any(error["type"] == "json_invalid" for error in e.errors(include_url=False)):
+                raise DecodeError(self.name) from e
+            raise
+
+
+class MsgpackCodec:
+    name = "msgpack"
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError as e:
+            raise RuntimeError("msgpack codec requires the 'msgpack' package") from e
+        self._msgpack = msgpack
+
+    def decode(self, raw: bytes | str, adapter: TypeAdapter[T]) -> T:
+        try:
+            obj = self._msgpack.unpackb(raw)
+        except (ValueError, TypeError, self._msgpack.UnpackException) as e:
+            raise DecodeError(self.name) from e
+        return adapter.validate_python(obj)
+
+
+def make_codec(name: str) -> Codec:
+    """Создать кодек по имени из настройки `WORKER_CODEC`: `json` или `msgpack`"""
+    if name == "json":
+        return JsonCodec()
+    if name == "msgpack":
+        return MsgpackCodec()
+    raise ValueError(f"Unknown codec {name!r}, expected 'json' or 'msgpack'")
+
+
+class EventDecoder:
+    """
+    Разбирает сообщение в событие: сырые байты из брокера - кодеком сразу в модели,
+    уже разобранные объекты (например, из `FileSource`) - проверкой схемы
+    """
+
+    def __init__(self, codec: Codec):
+        self.codec = codec
+
+    def _decode(self, raw: Any, adapter: TypeAdapter[T]) -> T:
+        if raw is None:
+            raise DecodeError(self.codec.name)
+        if isinstance(raw, bytes | bytearray | str):
+            return self.codec.decode(raw, adapter)
+        return adapter.validate_python(raw)
+
+    def decode(self, key: Any, value: Any) -> tuple[int, UserLogin]:
+        """
+        :raises DecodeError: сообщение не разбирается форматом кодека
+        :raises ValidationError: сообщение не подходит под схему
+        """
+        return self._decode(key, KEY_ADAPTER).user_id, self._decode(value, VALUE_ADAPTER)
+
+
+@lru_cache
+def get_decoder() -> EventDecoder:
+    return EventDecoder(make_codec(get_settings().WORKER_CODEC))
+
+
+def decode_events(messages: list[tuple[Any, Any]]) -> list[tuple[tuple[Any, Any], tuple[int, UserLogin]]]:
+    """Разобрать сообщения в события, неразбираемые и невалидные сообщения отправить в dead letter"""
+    decoded = []
+    for message in messages:
+        try:
+            decoded.append((message, get_decoder().decode(*message)))
+            continue
+        except DecodeError as e:
+            reason = e.reason
+        except ValidationError:
+            reason = "schema"
+        INVALID_MESSAGES.labels(reason=reason).inc()
+        log.error(f"Message can't be decoded ({reason}), {message=}")
+        get_dead_letter().send(*message, reason=reason)
+    return decoded
@@ -1,39 +1,128 @@
 import logging
 from typing import Any
 
-import pydantic
-from event_schema.auth import UserLogin, UserLoginKey
+from event_schema.auth import UserLogin
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import DBAPIError, DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker
 
 from settings import get_settings
-from worker.kafka import KafkaConsumer
+from userdata_api.models.base import RaiseOnLazyLoadSession
+from userdata_api.utils.catalog import catalog_cache
 
-from .user import patch_user_info
+from .codec import decode_events
+from .dead_letter import get_dead_letter
+from .metrics import APPLY_SECONDS, RETRIES, serve
+from .parallel import ParallelApplier
+from .source import MessageSource, make_source
+from .user import apply_events, coalesce_events, event_names
 
 log = logging.getLogger(__name__)
 settings = get_settings()
-consumer = KafkaConsumer()
 
-_engine = create_engine(str(settings.DB_DSN), pool_pre_ping=True, isolation_level="AUTOCOMMIT")
-_Session = sessionmaker(bind=_engine)
+# Каждая пачка применяется одной транзакцией, поэтому без AUTOCOMMIT
+_engine = create_engine(str(settings.DB_DSN), pool_pre_ping=True, pool_size=settings.WORKER_THREADS + 1)
+_Session = sessionmaker(bind=_engine, class_=RaiseOnLazyLoadSession if settings.DB_RAISE_ON_LAZY_LOAD else Session)
+_session = _Session()  # Переиспользуется всеми пачками
+_applier = ParallelApplier(settings.WORKER_THREADS, _Session) if settings.WORKER_THREADS > 1 else None
 
 
-def process_models(key: Any, value: Any) -> tuple[UserLoginKey | None, UserLogin | None]:
-    try:
-        return UserLoginKey.model_validate(key), UserLogin.model_validate(value)
-    except pydantic.ValidationError:
-        log.error(f"Validation error occurred, {key=}, {value=}", exc_info=False)
-        return None, None
+def apply_batch(events: list[tuple[int, UserLogin]]) -> None:
+    """
+    Применить события пачки одной транзакцией или, при WORKER_THREADS > 1, по транзакции на поток.
+    При ошибке исключение пробрасывается
+    """
+    if not events:
+        return
+    with APPLY_SECONDS.time():
+        with _session.begin():
+            sources, params = event_names(events)
+            events = coalesce_events(events, catalog_cache.get(_session, sources=sources, params=params))
+        if _applier is not None:
+            _applier.apply(events)
+        else:
+            apply_events(events, session=_session)
+
+
+def process_batch(messages: list[tuple[Any, Any]]) -> None:
+    apply_batch([event for _, event in decode_events(messages)])
 
 
 def process_message(message: tuple[Any, Any]) -> None:
-    processed_k, processed_v = process_models(*message)
-    if not (processed_k and processed_v):
-        return
-    patch_user_info(processed_v, processed_k.user_id, session=_Session())
+    process_batch([message])
+
+
+def is_transient(exc: Exception) -> bool:
+    """Ошибка связана с доступностью базы, а не с содержимым пачки, и пройдет сама"""
+    if isinstance(exc, (OperationalError, InterfaceError, DisconnectionError, PoolTimeoutError)):
+        return True
+    return isinstance(exc, DBAPIError) and exc.connection_invalidated
 
 
-def process():
-    for message in consumer.listen():
-        process_message(message)
+def _apply_one_by_one(decoded: list[tuple[tuple[Any, Any], tuple[int, UserLogin]]], settled: set[int]) -> None:
+    """
+    Применить сообщения по одному, падающие отправить в dead letter. Номера разобранных сообщений добавляются
+    в `settled` и при повторе после недоступности базы пропускаются, чтобы не отправлять сообщение в dead letter дважды
+    """
+    for i, (message, event) in enumerate(decoded):
+        if i in settled:
+            continue
+        try:
+            apply_batch([event])
+        except Exception as e:
+            if is_transient(e):
+                raise
+            log.error(f"Message {message=} can't be applied", exc_info=True)
+            get_dead_letter().send(*message, reason="apply")
+        settled.add(i)
+
+
+def apply_with_retries(decoded: list[tuple[tuple[Any, Any], tuple[int, UserLogin]]], source: MessageSource) -> None:
+    """
+    Применить пачку, повторяя попытки с экспоненциальной задержкой.
+
+    Пока база недоступна, чтение источника приостановлено, а попытки повторяются без ограничения.
+    Остальные ошибки повторяются не больше `WORKER_RETRY_ATTEMPTS` раз, после чего сообщения пачки применяются
+    по одному, а падающие отправляются в dead letter. Функция возвращает управление, только когда пачка разобрана
+    """
+    events = [event for _, event in decoded]
+    one_by_one = False
+    settled: set[int] = set()
+    failures = 0
+    delay = settings.WORKER_RETRY_BASE_DELAY
+    while True:
+        try:
+            if one_by_one:
+                _apply_one_by_one(decoded, settled)
+            else:
+                apply_batch(events)
+            break
+        except Exception as e:
+            if is_transient(e):
+                RETRIES.labels(error="transient").inc()
+                log.warning(f"Database is unavailable: {e}, retrying in {delay}s")
+                source.pause()
+            elif failures < settings.WORKER_RETRY_ATTEMPTS:
+                failures += 1
+                RETRIES.labels(error="other").inc()
+                log.error(f"Batch failed, retrying in {delay}s", exc_info=True)
+            else:
+                log.error("Batch keeps failing, applying messages one by one", exc_info=True)
+                one_by_one = True
+                continue
+        source.wait(delay)
+        delay = min(delay * 2, settings.WORKER_RETRY_MAX_DELAY)
+    source.resume()
+
+
+def process(source: MessageSource | None = None) -> None:
+    """Обрабатывать сообщения источника, по умолчанию Kafka, пока он не закончится"""
+    source = source or make_source("kafka")
+    serve(settings.WORKER_METRICS_PORT)
+    try:
+        for batch in source.listen_batches(settings.KAFKA_BATCH_SIZE, settings.KAFKA_BATCH_LINGER):
+            apply_with_retries(decode_events(batch), source)
+    finally:
+        source.close()
+        get_dead_letter().close()
@@ -0,0 +1,75 @@
+import json
+import logging
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Protocol
+
+from settings import get_settings
+
+from .metrics import DEAD_LETTERS
+
+log = logging.getLogger(__name__)
+
+
+class DeadLetterSink(Protocol):
+    """
+    Куда складываются сообщения, которые воркер не смог обработать: неразбираемые, невалидные
+    или падающие при применении. `key` и `value` - разобранный JSON или сырые байты, если разобрать не удалось
+    """
+
+    def send(self, key: Any, value: Any, reason: str) -> None: ...
+
+    def close(self) -> None: ...
+
+
+def _jsonable(obj: Any) -> Any:
+    return obj.decode(errors="replace") if isinstance(obj, bytes) else obj
+
+
+class LogDeadLetter:
+    """Только записать сообщение в лог, если хранилище не настроено"""
+
+    def send(self, key: Any, value: Any, reason: str) -> None:
+        DEAD_LETTERS.labels(reason=reason).inc()
+        log.error(f"Dead letter ({reason}): {key=}, {value=}")
+
+    def close(self) -> None:
+        pass
+
+
+class FileDeadLetter:
+    """
+    Дописывать сообщения в NDJSON файл в формате `FileSource`, чтобы после исправления
+    их можно было переиграть через `--source file:<путь>`
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def send(self, key: Any, value: Any, reason: str) -> None:
+        DEAD_LETTERS.labels(reason=reason).inc()
+        line = {"key": _jsonable(key), "value": _jsonable(value), "reason": reason, "ts": datetime.utcnow().isoformat()}
+        self._file.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def make_dead_letter(spec: str | None) -> DeadLetterSink:
+    """Создать хранилище по строке настройки: `file:<путь к NDJSON>`, `topic:<топик Kafka>` или None - только лог"""
+    if spec is None:
+        return LogDeadLetter()
+    if spec.startswith("file:"):
+        return FileDeadLetter(spec.removeprefix("file:"))
+    if spec.startswith("topic:"):
+        from .kafka import KafkaDeadLetter
+
+        return KafkaDeadLetter(spec.removeprefix("topic:"))
+    raise ValueError(f"Unknown dead letter sink {spec!r}, expected 'file:<path>' or 'topic:<name>'")
+
+
+@lru_cache
+def get_dead_letter() -> DeadLetterSink:
+    return make_dead_letter(get_settings().WORKER_DEAD_LETTER)
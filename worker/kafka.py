@@ -1,12 +1,22 @@
 import json
 import logging
+from time import monotonic, sleep, time
 from typing import Any, Iterator
 
-from confluent_kafka import Consumer
+from confluent_kafka import Consumer, KafkaException, Message, Producer, TopicPartition
 
 from settings import get_settings
 from userdata_api import __version__
 
+from .metrics import (
+    BATCH_SIZE,
+    DEAD_LETTERS,
+    EVENT_LATENCY_SECONDS,
+    PAUSED,
+    RECONNECTS,
+    observe_kafka_stats,
+)
+
 log = logging.getLogger(__name__)
 
 
@@ -29,7 +39,7 @@ class KafkaConsumer:
                 'auto.offset.reset': 'earliest',
                 'enable.auto.offset.store': False,
                 'stats_cb': KafkaConsumer._stats_cb,
-                'statistics.interval.ms': 1000,
+                'statistics.interval.ms': 5000,
                 "auto.commit.interval.ms": 100,
             }
         else:
@@ -44,61 +54,238 @@ class KafkaConsumer:
                 'auto.offset.reset': 'earliest',
                 'enable.auto.offset.store': False,
                 'stats_cb': KafkaConsumer._stats_cb,
-                'statistics.interval.ms': 1000,
+                'statistics.interval.ms': 5000,
                 "auto.commit.interval.ms": 100,
             }
 
     @staticmethod
     def _stats_cb(stats_json_str: str):
-        stats_json = json.loads(stats_json_str)
-        log.info('\nKAFKA Stats: {}\n'.format(stats_json))
+        observe_kafka_stats(stats_json_str)
 
-    @staticmethod
-    def _on_assign(consumer, partitions):
+    def _on_assign(self, consumer, partitions):
         log.info(f'Assignment: {partitions}')
+        if self._paused:
+            # Новые партиции, полученные во время паузы, тоже не читаем до восстановления базы
+            consumer.assign(partitions)
+            consumer.pause(partitions)
 
     def connect(self) -> None:
         self._consumer = Consumer(self.__conf)
-        self._consumer.subscribe(self.__topics, on_assign=KafkaConsumer._on_assign)
+        self._consumer.subscribe(self.__topics, on_assign=self._on_assign)
 
     def reconnect(self):
+        RECONNECTS.inc()
         del self._consumer
         self.connect()
 
     def __init__(self):
+        self._paused = False
         self.__configurate()
         self.connect()
 
     def close(self):
-        self._consumer.close()
-
-    def _listen(self) -> Iterator[tuple[Any, Any]]:
         try:
-            while True:
-                msg = self._consumer.poll(timeout=1.0)
-                if msg is None:
-                    log.debug("Message is None")
-                    continue
+            self._consumer.close()
+        except RuntimeError:
+            log.debug("Consumer is already closed")
+
+    def _consume_batch(self, size: int, linger: float) -> list[Message]:
+        """
+        Дождаться первого сообщения (не дольше секунды), затем добирать пачку не дольше `linger` секунд
+        или пока в ней не наберется `size` сообщений
+        """
+        messages = []
+        deadline = None
+        while len(messages) < size:
+            timeout = 1.0 if deadline is None else deadline - monotonic()
+            if timeout <= 0:
+                break
+            for msg in self._consumer.consume(num_messages=size - len(messages), timeout=timeout):
                 if msg.error():
                     log.error(f"Message {msg=} reading triggered: {msg.error()}, Retrying...")
                     continue
-                log.info('%% %s [%d] at offset %d\n' % (msg.topic(), msg.partition(), msg.offset()))
-                try:
-                    yield json.loads(msg.key()), json.loads(msg.value())
-                except json.JSONDecodeError:
-                    log.error("Json decode error occurred", exc_info=True)
+                messages.append(msg)
+            if deadline is None:
+                if not messages:
+                    log.debug("Batch is empty")
+                    break
+                deadline = monotonic() + linger
+        return messages
+
+    def _store_offsets(self, messages: list[Message]) -> None:
+        now = time()
+        for msg in messages:
+            try:
                 self._consumer.store_offsets(msg)
+            except KafkaException as e:
+                # Партицию могли отобрать при ребалансировке, ее сообщения перечитает новый владелец
+                log.warning(f"Offset {msg.offset()} of {msg.topic()} [{msg.partition()}] is not stored: {e}")
+                continue
+            _, timestamp = msg.timestamp()
+            if timestamp > 0:
+                EVENT_LATENCY_SECONDS.observe(max(now - timestamp / 1000, 0))
+
+    def listen_batches(self, size: int, linger: float) -> Iterator[list[tuple[Any, Any]]]:
+        """
+        Как `listen`, но отдает сообщения пачками до `size` штук, собранными не дольше `linger` секунд.
+
+        Сообщения отдаются сырыми байтами, смещения сохраняются только после того, как вызывающий код обработал
+        пачку и вернул управление. Переподключение только при фатальной ошибке librdkafka,
+        на остальных ошибках консьюмер и его партиции остаются на месте
+        """
+        try:
+            while True:
+                try:
+                    messages = self._consume_batch(size, linger)
+                except KafkaException as e:
+                    if e.args[0].fatal():
+                        log.error("Fatal consumer error occurred", exc_info=True)
+                        self.reconnect()
+                    else:
+                        log.warning(f"Consumer error occurred: {e}, retrying")
+                        sleep(1)
+                    continue
+                if not messages:
+                    continue
+                log.info(f"Batch of {len(messages)} messages")
+                BATCH_SIZE.observe(len(messages))
+                # Разбор и проверка схемы - в `decode_events`, прямо из сырых байт
+                yield [(msg.key(), msg.value()) for msg in messages]
+                self._store_offsets(messages)
+        except KeyboardInterrupt:
+            log.warning("Worker stopped by user")
+            exit(0)
         finally:
             log.info("Consumer closed")
             self.close()
 
-    def listen(self) -> Iterator[tuple[Any, Any]]:
-        while 1:
-            try:
-                yield from self._listen()
-            except Exception:
-                log.error("Error occurred", exc_info=True)
-                self.reconnect()
-            except KeyboardInterrupt:
-                log.warning("Worker stopped by user")
-                exit(0)
+    def pause(self) -> None:
+        """Приостановить чтение всех назначенных партиций, не покидая группу"""
+        if not self._paused:
+            self._paused = True
+            PAUSED.set(1)
+            self._consumer.pause(self._consumer.assignment())
+
+    def resume(self) -> None:
+        """
+        Возобновить чтение всех назначенных партиций. `wait` приостанавливает партиции, из которых успел прочитать,
+        и без `pause`, поэтому возобновляются все партиции, а не только после `pause`
+        """
+        self._paused = False
+        PAUSED.set(0)
+        self._consumer.resume(self._consumer.assignment())
+
+    def wait(self, seconds: float) -> None:
+        """
+        Подождать `seconds` секунд, продолжая опрашивать брокер: иначе после `max.poll.interval.ms`
+        консьюмер выкинут из группы и начнется ребалансировка
+        """
+        deadline = monotonic() + seconds
+        while (timeout := deadline - monotonic()) > 0:
+            first: dict[tuple[str, int], int] = {}
+            for msg in self._consumer.consume(num_messages=100, timeout=min(timeout, 1.0)):
+                if not msg.error():
+                    first.setdefault((msg.topic(), msg.partition()), msg.offset())
+            # Сообщения не должны приходить во время паузы, но если пришли - вернуться к ним и прочитать позже
+            for (topic, partition), offset in first.items():
+                self._consumer.seek(TopicPartition(topic, partition, offset))
+                self._consumer.pause([TopicPartition(topic, partition)])
+
+
+class KafkaRangeSource:
+    """
+    Прочитать топик с смещения `start` (по умолчанию с начала) в каждой партиции до конца на момент создания
+    и остановиться. Консьюмер не входит в группу и не сохраняет смещения, поэтому не мешает работающему воркеру
+    """
+
+    def __init__(self, topic: str, start: int | None = None):
+        settings = get_settings()
+        conf = {"bootstrap.servers": settings.KAFKA_DSN, "enable.auto.commit": False}
+        if __version__ != "dev":
+            conf |= {
+                'sasl.mechanisms': "PLAIN",
+                'security.protocol': "SASL_PLAINTEXT",
+                'sasl.username': settings.KAFKA_LOGIN,
+                'sasl.password': settings.KAFKA_PASSWORD,
+            }
+        self.topic = topic
+        self._consumer = Consumer(conf)
+        self._ends: dict[int, int] = {}
+        assignment = []
+        for partition in self._consumer.list_topics(topic, timeout=10).topics[topic].partitions:
+            low, high = self._consumer.get_watermark_offsets(TopicPartition(topic, partition), timeout=10)
+            begin = low if start is None else max(start, low)
+            if begin < high:
+                self._ends[partition] = high
+                assignment.append(TopicPartition(topic, partition, begin))
+        log.info(f"Reading {topic} up to {self._ends}")
+        self._consumer.assign(assignment)
+
+    def _finish(self, partition: int) -> None:
+        del self._ends[partition]
+        self._consumer.pause([TopicPartition(self.topic, partition)])
+
+    def listen_batches(self, size: int, linger: float) -> Iterator[list[tuple[Any, Any]]]:
+        while self._ends:
+            batch = []
+            for msg in self._consumer.consume(num_messages=size, timeout=1.0):
+                if msg.error():
+                    log.error(f"Message {msg=} reading triggered: {msg.error()}, Retrying...")
+                    continue
+                end = self._ends.get(msg.partition())
+                if end is None or msg.offset() >= end:
+                    continue
+                batch.append((msg.key(), msg.value()))
+                if msg.offset() + 1 >= end:
+                    self._finish(msg.partition())
+            if not batch:
+                # Последние смещения могут быть заняты маркерами транзакций или удалены компактификацией
+                positions = self._consumer.position([TopicPartition(self.topic, p) for p in self._ends])
+                for position in positions:
+                    if position.offset >= self._ends[position.partition]:
+                        self._finish(position.partition)
+                continue
+            BATCH_SIZE.observe(len(batch))
+            yield batch
+
+    def pause(self) -> None:
+        pass
+
+    def resume(self) -> None:
+        pass
+
+    def wait(self, seconds: float) -> None:
+        sleep(seconds)
+
+    def close(self) -> None:
+        self._consumer.close()
+
+
+class KafkaDeadLetter:
+    """Отправлять сообщения, которые не удалось обработать, в отдельный топик Kafka, причина - в заголовке `reason`"""
+
+    def __init__(self, topic: str):
+        settings = get_settings()
+        conf = {"bootstrap.servers": settings.KAFKA_DSN}
+        if __version__ != "dev":
+            conf |= {
+                'sasl.mechanisms': "PLAIN",
+                'security.protocol': "SASL_PLAINTEXT",
+                'sasl.username': settings.KAFKA_LOGIN,
+                'sasl.password': settings.KAFKA_PASSWORD,
+            }
+        self.topic = topic
+        self._producer = Producer(conf)
+
+    def send(self, key: Any, value: Any, reason: str) -> None:
+        DEAD_LETTERS.labels(reason=reason).inc()
+        self._producer.produce(
+            self.topic,
+            key=key if isinstance(key, bytes | None) else json.dumps(key).encode(),
+            value=value if isinstance(value, bytes | None) else json.dumps(value).encode(),
+            headers={"reason": reason},
+        )
+        self._producer.poll(0)
+
+    def close(self) -> None:
+        self._producer.flush(10)
@@ -0,0 +1,48 @@
+import json
+import logging
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+log = logging.getLogger(__name__)
+
+EVENTS = Counter("userdata_worker_events", "События, полученные воркером", ["result"])
+ITEMS = Counter("userdata_worker_items", "Изменения параметров в полученных событиях")
+COALESCED_ITEMS = Counter(
+    "userdata_worker_coalesced_items",
+    "Изменения параметров, не дошедшие до базы: их перезаписало более позднее событие той же пачки",
+)
+INVALID_MESSAGES = Counter("userdata_worker_invalid_messages", "Сообщения, не прошедшие разбор", ["reason"])
+RECONNECTS = Counter("userdata_worker_reconnects", "Переподключения к Kafka после ошибки")
+BATCH_SIZE = Histogram(
+    "userdata_worker_batch_size", "Размер пачки сообщений", buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+)
+APPLY_SECONDS = Histogram("userdata_worker_apply_seconds", "Время применения пачки к базе")
+EVENT_LATENCY_SECONDS = Histogram(
+    "userdata_worker_event_latency_seconds",
+    "Время от записи сообщения в Kafka до сохранения смещения после его применения",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+DEAD_LETTERS = Counter("userdata_worker_dead_letters", "Сообщения, отправленные в dead letter", ["reason"])
+RETRIES = Counter("userdata_worker_retries", "Повторные попытки применить пачку", ["error"])
+PAUSED = Gauge("userdata_worker_paused", "1, если чтение партиций приостановлено до восстановления базы")
+CONSUMER_LAG = Gauge("userdata_worker_consumer_lag", "Отставание консьюмера по партиции", ["topic", "partition"])
+
+
+def observe_kafka_stats(stats_json_str: str) -> None:
+    """Обновить метрики из статистики librdkafka (`stats_cb`), остальное в статистике не интересно"""
+    stats = json.loads(stats_json_str)
+    CONSUMER_LAG.clear()
+    for topic, topic_stats in stats.get("topics", {}).items():
+        for partition, partition_stats in topic_stats.get("partitions", {}).items():
+            lag = partition_stats.get("consumer_lag", -1)
+            # Партиция -1 служебная, отрицательное отставание - еще не известно
+            if partition != "-1" and lag >= 0:
+                CONSUMER_LAG.labels(topic=topic, partition=partition).set(lag)
+
+
+def serve(port: int | None) -> None:
+    """Поднять HTTP ручку с метриками в формате Prometheus в отдельном потоке"""
+    if port is None:
+        return
+    start_http_server(port)
+    log.info(f"Metrics are served at :{port}/metrics")
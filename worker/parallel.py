@@ -0,0 +1,48 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable
+
+from event_schema.auth import UserLogin
+from sqlalchemy.orm import Session
+
+from .user import apply_events
+
+log = logging.getLogger(__name__)
+
+
+class ParallelApplier:
+    """
+    Применяет события пачки в `workers` потоках, у каждого потока своя сессия и свое соединение с базой.
+
+    События распределяются по потокам по `user_id`, поэтому события одного пользователя всегда применяются
+    одним потоком в исходном порядке, а разные пользователи - параллельно. `apply` возвращает управление,
+    только когда все потоки закончили, так что смещения пачки сохраняются не раньше, чем применены все ее события
+    """
+
+    def __init__(self, workers: int, session_factory: Callable[[], Session]):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="userdata-worker")
+        self._sessions = [session_factory() for _ in range(workers)]
+
+    def shard(self, user_id: int) -> int:
+        return user_id % self.workers
+
+    def apply(self, events: list[tuple[int, UserLogin]]) -> None:
+        shards: list[list[tuple[int, UserLogin]]] = [[] for _ in range(self.workers)]
+        for user_id, event in events:
+            shards[self.shard(user_id)].append((user_id, event))
+        futures = [
+            self._executor.submit(apply_events, shard, session=session)
+            for shard, session in zip(shards, self._sessions)
+            if shard
+        ]
+        wait(futures)
+        # Успешно примененные потоки уже зафиксированы, при ошибке пачка придет заново и применится повторно,
+        # это безопасно: событие задает итоговое значение параметра, а не изменение
+        for future in futures:
+            future.result()
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        for session in self._sessions:
+            session.close()
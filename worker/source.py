@@ -0,0 +1,104 @@
+import json
+import logging
+from itertools import islice
+from time import sleep
+from typing import Any, Iterable, Iterator, Protocol
+
+from .dead_letter import get_dead_letter
+from .metrics import BATCH_SIZE, INVALID_MESSAGES
+
+log = logging.getLogger(__name__)
+
+
+class MessageSource(Protocol):
+    """
+    Источник сообщений воркера: отдает пачки кортежей (key, value) - сырые байты сообщения
+    или уже разобранные объекты, их разбирает `EventDecoder`
+    """
+
+    def listen_batches(self, size: int, linger: float) -> Iterator[list[tuple[Any, Any]]]: ...
+
+    def pause(self) -> None:
+        """Не отдавать новые сообщения, пока база недоступна"""
+
+    def resume(self) -> None: ...
+
+    def wait(self, seconds: float) -> None:
+        """Подождать между повторными попытками, не теряя связи с источником"""
+
+    def close(self) -> None: ...
+
+
+class MemorySource:
+    """
+    Источник из готового списка сообщений, например для тестов.
+
+    Пачки собираются без ожидания, итерация заканчивается, когда сообщения закончились
+    """
+
+    def __init__(self, messages: Iterable[tuple[Any, Any]]):
+        self._messages = iter(messages)
+
+    def listen_batches(self, size: int, linger: float) -> Iterator[list[tuple[Any, Any]]]:
+        while batch := list(islice(self._messages, size)):
+            BATCH_SIZE.observe(len(batch))
+            yield batch
+
+    def pause(self) -> None:
+        pass
+
+    def resume(self) -> None:
+        pass
+
+    def wait(self, seconds: float) -> None:
+        sleep(seconds)
+
+    def close(self) -> None:
+        pass
+
+
+class FileSource(MemorySource):
+    """
+    Повтор сообщений из NDJSON файла, по одному объекту `{"key": ..., "value": ...}` на строку.
+
+    Позволяет прогнать путь обработки сообщений без брокера и замерить его пропускную способность
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, encoding="utf-8")
+        super().__init__(self._read())
+
+    def _read(self) -> Iterator[tuple[Any, Any]]:
+        for lineno, line in enumerate(self._file, 1):
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+                yield message["key"], message["value"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                INVALID_MESSAGES.labels(reason="json").inc()
+                log.error(f"Json decode error occurred at {self.path}:{lineno}")
+                get_dead_letter().send(None, line.encode(), reason="json")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def make_source(spec: str) -> MessageSource:
+    """
+    Создать источник по строке из командной строки: `kafka`, `file:<путь к NDJSON>`
+    или `topic:<топик>[:<смещение>]` - прочитать топик со смещения (по умолчанию с начала) до текущего конца
+    """
+    if spec == "kafka":
+        from .kafka import KafkaConsumer
+
+        return KafkaConsumer()
+    if spec.startswith("file:"):
+        return FileSource(spec.removeprefix("file:"))
+    if spec.startswith("topic:"):
+        from .kafka import KafkaRangeSource
+
+        topic, _, start = spec.removeprefix("topic:").partition(":")
+        return KafkaRangeSource(topic, int(start) if start else None)
+    raise ValueError(f"Unknown message source {spec!r}, expected 'kafka', 'file:<path>' or 'topic:<name>[:<offset>]'")
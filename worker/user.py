@@ -1,63 +1,104 @@
 import logging
+from collections.abc import Iterable
 
 import sqlalchemy.orm
 from event_schema.auth import UserLogin
-from sqlalchemy import not_
 
-from userdata_api.models.db import Category, Info, Param, Source
+from userdata_api.utils.catalog import Catalog, catalog_cache
+from userdata_api.utils.info import delete_info_stmt, upsert_info_stmt
+
+from .metrics import COALESCED_ITEMS, EVENTS, ITEMS
 
 log = logging.getLogger(__name__)
 
 
 def patch_user_info(new: UserLogin, user_id: int, *, session: sqlalchemy.orm.Session) -> None:
+    """
+    Применить событие к информации пользователя.
+
+    Событие применяется целиком или не применяется вовсе: все параметры и источник проверяются до записи,
+    значения записываются одним upsert без предварительного чтения.
+    Транзакцией управляет вызывающий код, функция ее не фиксирует и не откатывает
+    """
+    catalog = catalog_cache.get(
+        session, sources=[new.source], params=[(item.category, item.param) for item in new.items]
+    )
+    source = catalog.sources.get(new.source)
+    values: dict[int, str | None] = {}
     for item in new.items:
-        param = (
-            session.query(Param)
-            .join(Category)
-            .filter(
-                Param.name == item.param,
-                Category.name == item.category,
-                not_(Param.is_deleted),
-                not_(Category.is_deleted),
-            )
-            .one_or_none()
-        )
+        param = catalog.param(item.category, item.param)
         if not param:
-            session.rollback()
             log.error(f"Param {item.param=} not found")
             return
-        info = (
-            session.query(Info)
-            .join(Source)
-            .filter(
-                Info.param_id == param.id,
-                Info.owner_id == user_id,
-                Source.name == new.source,
-                not_(Info.is_deleted),
-            )
-            .one_or_none()
-        )
-        if not info and item.value is None:
-            continue
-        if not info:
-            source = Source.query(session=session).filter(Source.name == new.source).one_or_none()
-            if not source:
-                session.rollback()
-                log.warning(f"Source {new.source=} not found")
-                return
-            Info.create(
-                session=session,
-                owner_id=user_id,
-                param_id=param.id,
-                source_id=source.id,
-                value=item.value,
-            )
-            continue
-        if item.value is not None:
-            info.value = item.value
-            session.flush()
+        values[param.id] = item.value
+    to_write = {param_id: value for param_id, value in values.items() if value is not None}
+    to_delete = [param_id for param_id, value in values.items() if value is None]
+    if not source:
+        if to_write:
+            log.warning(f"Source {new.source=} not found")
+        return
+    if to_write:
+        session.execute(upsert_info_stmt(user_id, source.id, to_write))
+    if to_delete:
+        session.execute(delete_info_stmt(user_id, source.id, to_delete))
+
+
+def apply_events(events: list[tuple[int, UserLogin]], *, session: sqlalchemy.orm.Session) -> None:
+    """Применить события одной транзакцией"""
+    with session.begin():
+        for user_id, event in events:
+            patch_user_info(event, user_id, session=session)
+
+
+def event_names(events: Iterable[tuple[int, UserLogin]]) -> tuple[set[str], set[tuple[str, str]]]:
+    """Названия источников и параметров (категория, параметр), которые упоминаются в событиях"""
+    sources, params = set(), set()
+    for _, event in events:
+        sources.add(event.source)
+        params.update((item.category, item.param) for item in event.items)
+    return sources, params
+
+
+def coalesce_events(events: list[tuple[int, UserLogin]], catalog: Catalog) -> list[tuple[int, UserLogin]]:
+    """
+    Схлопнуть события пачки: для каждой пары (пользователь, источник) одно событие,
+    в котором для каждого (категория, параметр) остается значение из последнего по порядку события.
+
+    События, которые `patch_user_info` все равно пропустила бы (неизвестный параметр или источник),
+    отбрасываются до схлопывания, чтобы не утянуть за собой корректные изменения из других событий.
+    Справочник должен быть получен с названиями из `event_names`, чтобы только что созданные
+    параметры и источники не считались неизвестными.
+    Порядок событий внутри пачки соответствует порядку в партиции, поэтому последнее значение - самое новое
+    """
+    merged: dict[tuple[int, str], dict[tuple[str, str], str | None]] = {}
+    for user_id, event in events:
+        ITEMS.inc(len(event.items))
+        if any(catalog.param(item.category, item.param) is None for item in event.items):
+            log.error(f"Event for {user_id=} from {event.source=} has unknown params, skipped")
+            EVENTS.labels(result="skipped").inc()
             continue
-        if item.value is None:
-            info.is_deleted = True
-            session.flush()
+        if event.source not in catalog.sources:
+            if any(item.value is not None for item in event.items):
+                log.warning(f"Source {event.source=} not found")
+            EVENTS.labels(result="skipped").inc()
             continue
+        EVENTS.labels(result="accepted").inc()
+        values = merged.setdefault((user_id, event.source), {})
+        for item in event.items:
+            key = (item.category, item.param)
+            if key in values:
+                COALESCED_ITEMS.inc()
+            values[key] = item.value
+    return [
+        (
+            user_id,
+            UserLogin(
+                source=source,
+                items=[
+                    {"category": category, "param": param, "value": value}
+                    for (category, param), value in values.items()
+                ],
+            ),
+        )
+        for (user_id, source), values in merged.items()
+    ]